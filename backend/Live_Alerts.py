@@ -1,27 +1,9 @@
 import os
 import requests
 import datetime
-from twilio.rest import Client
-from dotenv import load_dotenv
-
-# Load env variables
-load_dotenv()
+import ai_agent  # noqa: F401  loads the .env file (once per process)
 
 API_KEY = os.getenv("VISUAL_CROSSING_API_KEY")
-TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
-TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-TWILIO_NUMBER = os.getenv("TWILIO_NUMBER")
-
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-
-def send_sms(to_number: str, message: str) -> bool:
-    try:
-        msg = client.messages.create(body=message, from_=TWILIO_NUMBER, to=to_number)
-        print(f"✅ SMS sent! SID: {msg.sid}")
-        return True
-    except Exception as e:
-        print(f"❌ Failed to send SMS: {e}")
-        return False
 
 def rain_alert_for_pesticide(location: str, rain_threshold: float = 1.0):
     today = datetime.date.today()
@@ -1,20 +1,74 @@
+import asyncio
 import os
 import re
 import json
-import time
-from dotenv import load_dotenv
-import google.generativeai as genai
 
-# Load environment variables
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+from advisory_cache import AdvisoryCache, cache_key
+from ai_agent.llm import gateway
+from ai_agent.registry import registry
+
+# Bump whenever the prompt or the HTML template changes, so old cache entries are not served
+PROMPT_VERSION = "1"
+
+def _advisory_cache():
+    return AdvisoryCache(
+        os.getenv("ADVISORY_CACHE_DB", "advisory_cache.db"),
+        ttl=float(os.getenv("ADVISORY_CACHE_TTL", str(30 * 24 * 3600))),
+        max_entries=int(os.getenv("ADVISORY_CACHE_MAX_ENTRIES", "50000")),
+    )
+
+
+# Opened by the registry like the other heavy resources (STARTUP_MODE: eager, lazy or prewarm)
+registry.register("advisory_cache", _advisory_cache)
+
+ADVISORY_MODEL = "gemini-1.5-flash"
+
+def advisory_version(input_data: dict):
+    """
+    Returns: what an advisory response is determined by, for its ETag: the advisory cache key
+    (normalized triple + PROMPT_VERSION), the model and the echoed input. A regenerated advisory
+    for the same key counts as the same representation.
+    """
+    key = cache_key(input_data.get("pesticide"), input_data.get("crop"), input_data.get("disease"), PROMPT_VERSION)
+    return [key, ADVISORY_MODEL, input_data]
 
 def generate_advisory(input_data: dict):
     """
-    Generates bilingual pesticide advisory (JSON + HTML) using Gemini.
-    Adds default alternatives for 'Framer' crops.
+    Returns the bilingual pesticide advisory (JSON + HTML) for the input triple,
+    from the advisory cache when possible, otherwise generated with Gemini.
     """
-    prompt = f"""
+    cached = registry.get("advisory_cache").get_or_generate(input_data, PROMPT_VERSION, lambda: _generate(input_data))
+    return {
+        "input": input_data,
+        "ai_response": cached["ai_response"],
+        "html": cached["html"]
+    }
+
+async def agenerate_advisory(input_data: dict):
+    """Async variant of generate_advisory for the ASGI service (non-blocking Gemini call on a miss)."""
+    async def generate():
+        raw_output = await gateway.agenerate(ADVISORY_MODEL, build_prompt(input_data))
+        return render_advisory(raw_output)
+
+    if registry.is_loaded("advisory_cache"):
+        advisory_cache = registry.get("advisory_cache")
+    else:  # first use in lazy mode: open the SQLite file off the event loop
+        advisory_cache = await asyncio.to_thread(registry.get, "advisory_cache")
+    cached = await advisory_cache.aget_or_generate(input_data, PROMPT_VERSION, generate)
+    return {
+        "input": input_data,
+        "ai_response": cached["ai_response"],
+        "html": cached["html"]
+    }
+
+def _generate(input_data: dict):
+    """Generates bilingual pesticide advisory (JSON + HTML) using Gemini."""
+    # Quota, concurrency and retries are handled by the shared LLM gateway
+    raw_output = gateway.generate(ADVISORY_MODEL, build_prompt(input_data))
+    return render_advisory(raw_output)
+
+def build_prompt(input_data: dict) -> str:
+    return f"""
     You are an agricultural advisor.
 
     Inputs:
@@ -56,20 +110,13 @@ def generate_advisory(input_data: dict):
     }}
     """
 
-    model = genai.GenerativeModel("gemini-1.5-flash")
-
-    # Retry logic for stability
-    for attempt in range(3):
-        try:
-            response = model.generate_content(prompt)
-            break
-        except Exception as e:
-            if attempt == 2:
-                raise
-            time.sleep(2)
-
+def render_advisory(raw_output: str):
+    """
+    Parses Gemini's JSON and builds the bilingual HTML report.
+    Adds default alternatives for 'Framer' crops.
+    """
     # Clean Gemini output
-    raw_output = response.text.strip()
+    raw_output = raw_output.strip()
     raw_output = re.sub(r"```(?:json)?", "", raw_output).strip()
 
     try:
@@ -124,7 +171,6 @@ def generate_advisory(input_data: dict):
     """
 
     return {
-        "input": input_data,
         "ai_response": data,
         "html": html
     }
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from ai_agent.cache import SingleFlight
+
+# Last-access times of hits are kept in memory and written in one batch (best effort: a crash
+# only loses LRU ordering) instead of an UPDATE + commit on every read
+ACCESS_FLUSH_EVERY = 100  # pending keys
+ACCESS_FLUSH_INTERVAL = 30.0  # seconds
+
+
+def normalize(value) -> str:
+    return " ".join(str(value or "").strip().lower().split())
+
+
+def cache_key(pesticide, crop, disease, prompt_version: str) -> str:
+    raw = "\x1f".join([normalize(pesticide), normalize(crop), normalize(disease), prompt_version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AdvisoryCache:
+    """
+    Persistent SQLite cache of generated advisories keyed by the normalized
+    (pesticide, crop, disease) triple and the prompt version.
+    Entries expire after `ttl` seconds; beyond `max_entries` / `max_bytes` the least recently
+    used entries are evicted. Concurrent misses for one key share a single generation.
+    get()/put() are blocking SQLite calls: the async path runs them in a worker thread.
+    """
+
+    def __init__(self, path: str, ttl: float = 30 * 24 * 3600, max_entries: int = 50000,
+                 max_bytes: int = 512 * 2**20):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "generations": 0, "coalesced": 0}
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+        self._async_inflight = {}
+        self._touched = {}  # key -> last access not yet written
+        self._flushed_at = time.time()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS advisories (
+                key TEXT PRIMARY KEY,
+                pesticide TEXT,
+                crop TEXT,
+                disease TEXT,
+                prompt_version TEXT NOT NULL,
+                ai_response TEXT NOT NULL,
+                html TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_advisories_access ON advisories(last_access);
+        """)
+        self._conn.commit()
+
+    def get(self, key: str):
+        """Returns: {"ai_response": dict, "html": str} or None on miss/expiry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ai_response, html, created_at FROM advisories WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[2] + self.ttl < now:
+                self._conn.execute("DELETE FROM advisories WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats["expired"] += 1
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= ACCESS_FLUSH_EVERY or now - self._flushed_at >= ACCESS_FLUSH_INTERVAL:
+                self._flush_access()
+                self._conn.commit()
+        return {"ai_response": json.loads(row[0]), "html": row[1]}
+
+    def _flush_access(self):
+        """Writes the pending last-access times (caller holds the lock and commits)."""
+        if self._touched:
+            self._conn.executemany("UPDATE advisories SET last_access = ? WHERE key = ?",
+                                   [(at, key) for key, at in self._touched.items()])
+            self._touched.clear()
+        self._flushed_at = time.time()
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT created_at FROM advisories WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] + self.ttl >= time.time()
+
+    def put(self, key: str, input_data: dict, prompt_version: str, ai_response: dict, html: str):
+        payload = json.dumps(ai_response, ensure_ascii=False)
+        size = len(payload.encode("utf-8")) + len(html.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO advisories VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize(input_data.get("pesticide")), normalize(input_data.get("crop")),
+                 normalize(input_data.get("disease")), prompt_version, payload, html, size, now, now))
+            self._touched.pop(key, None)
+            self._flush_access()  # eviction must see recent hits
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM advisories").fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            excess = max(count - self.max_entries, 1)
+            rows = self._conn.execute(
+                "SELECT key, size FROM advisories ORDER BY last_access LIMIT ?", (excess,)).fetchall()
+            if not rows:
+                break
+            self._conn.executemany("DELETE FROM advisories WHERE key = ?", [(k,) for k, _ in rows])
+            self.stats["evictions"] += len(rows)
+            count -= len(rows)
+            total -= sum(size for _, size in rows)
+
+    def get_or_generate(self, input_data: dict, prompt_version: str, generate):
+        """
+        Returns the cached {"ai_response", "html"} for the input triple, or calls
+        `generate()` (which must return the same shape) once per key on a miss.
+        """
+        key = cache_key(input_data.get("pesticide"), input_data.get("crop"), input_data.get("disease"),
+                        prompt_version)
+        cached = self.get(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+
+        self.stats["misses"] += 1
+        leader = []
+
+        def load():
+            leader.append(True)
+            # A concurrent call may have stored it while we were queued
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            self.stats["generations"] += 1
+            result = generate()
+            self.put(key, input_data, prompt_version, result["ai_response"], result["html"])
+            return result
+
+        result = self._inflight.do(key, load)
+        if not leader:
+            self.stats["coalesced"] += 1
+        return result
+
+    async def aget_or_generate(self, input_data: dict, prompt_version: str, agenerate):
+        """asyncio variant of get_or_generate: `agenerate` is a coroutine function, concurrent misses await one task."""
+        key = cache_key(input_data.get("pesticide"), input_data.get("crop"), input_data.get("disease"),
+                        prompt_version)
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+
+        self.stats["misses"] += 1
+        task = self._async_inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            async def load():
+                try:
+                    self.stats["generations"] += 1
+                    result = await agenerate()
+                    await asyncio.to_thread(self.put, key, input_data, prompt_version,
+                                            result["ai_response"], result["html"])
+                    return result
+                finally:
+                    self._async_inflight.pop(key, None)
+
+            task = asyncio.ensure_future(load())
+            self._async_inflight[key] = task
+        return await asyncio.shield(task)
+
+    def info(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM advisories").fetchone()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": entries,
+            "bytes": size,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,4 @@
+# The one place .env is read: every backend module imports from ai_agent first
+from dotenv import load_dotenv
+
+load_dotenv()
@@ -0,0 +1,137 @@
+import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+
+from ai_agent.pesticide import rain_alert_for_pesticide
+from ai_agent.irrigation import check_irrigation
+from ai_agent.metrics import propagate
+from ai_agent.rules import evaluate as evaluate_rules
+from ai_agent.utils import send_sms
+from ai_agent.weather import get_daily_precip, normalize_location
+
+ALERT_WORKERS = int(os.getenv("ALERT_WORKERS", "16"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "16"))
+ALERT_DEADLINE = float(os.getenv("ALERT_DEADLINE", "12"))  # seconds for all checks of one request
+
+# (id, type, title, check function, error prefix)
+ALERT_CHECKS = [
+    ("1", "pesticide", "Pesticide Rain Alert", rain_alert_for_pesticide, "❌ Error checking pesticide alert"),
+    ("2", "irrigation", "Irrigation Alert", check_irrigation, "❌ Error checking irrigation"),
+]
+
+# Bounded pools shared by all requests, so a burst of requests cannot spawn unbounded threads
+check_pool = ThreadPoolExecutor(max_workers=ALERT_WORKERS, thread_name_prefix="alert-check")
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="alert-batch")
+
+
+def make_notification(alert_id, alert_type, title, flag, message):
+    return {
+        "id": alert_id,
+        "type": alert_type,
+        "priority": "high" if flag else "low",
+        "title": title,
+        "message": message,
+        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "actionRequired": flag,
+        "isRead": False
+    }
+
+
+def run_alert_checks(location: str, deadline: float = ALERT_DEADLINE):
+    """
+    Fetches the weather of `location` once (cached, coalesced) on the check pool, waiting at most
+    `deadline` seconds, then runs every alert check on that one result (CPU only).
+    Returns: (notifications: list, sms_messages: list) — notifications keep the ALERT_CHECKS order,
+    sms_messages holds the messages of the checks that completed.
+    """
+    future = check_pool.submit(propagate(get_daily_precip), location)
+    try:
+        weather = future.result(timeout=deadline)
+    except FuturesTimeoutError:
+        future.cancel()
+        return evaluate_location(location, weather_error=TimeoutError(f"timed out after {deadline:g}s"))
+    except Exception as e:
+        return evaluate_location(location, weather_error=e)
+    return evaluate_location(location, weather=weather)
+
+
+def evaluate_location(location: str, weather=None, weather_error: Exception = None, crop: str = None, region: str = None):
+    """
+    Runs every alert check for `location` one after another in the calling thread, all on one
+    get_daily_precip() result, fetched here unless the caller passes it as `weather` (or the
+    fetch failure as `weather_error`), so a location costs at most one upstream call.
+    `crop` and `region` select the per-crop/region rule overrides.
+    Returns: (notifications: list, sms_messages: list)
+    """
+    if weather is None and weather_error is None:
+        try:
+            weather = get_daily_precip(location)
+        except Exception as e:
+            weather_error = e
+    notifications = []
+    sms_messages = []
+    for alert_id, alert_type, title, check, error_prefix in ALERT_CHECKS:
+        try:
+            if weather_error is not None:
+                flag, message = False, f"❌ Weather API error: {weather_error}"
+            else:
+                flag, message = check(location, weather=weather, crop=crop, region=region)
+        except Exception as e:
+            notifications.append(make_notification(alert_id, alert_type, title, False, f"{error_prefix}: {e}"))
+            continue
+        notifications.append(make_notification(alert_id, alert_type, title, flag, message))
+        sms_messages.append(message)
+    return notifications, sms_messages
+
+
+def evaluate_locations(weathers, contexts=None):
+    """
+    Vectorized evaluate_location() for many locations whose weather is already fetched.
+    `weathers` maps location -> get_daily_precip() result (or the Exception its fetch raised);
+    `contexts` optionally maps location -> {"crop", "region"} for rule overrides.
+    Returns: {location: notifications}
+    """
+    results = evaluate_rules(weathers, contexts=contexts, alert_types=[t for _, t, _, _, _ in ALERT_CHECKS])
+    return {
+        location: [make_notification(alert_id, alert_type, title, *checks[alert_type])
+                   for alert_id, alert_type, title, _, _ in ALERT_CHECKS]
+        for location, checks in results.items()
+    }
+
+
+def run_batch(entries):
+    """
+    Evaluates alerts for many {location, phone_number, sms} entries.
+    Entries are grouped by normalized location, each distinct location is evaluated once on
+    the bounded batch pool, and at most 2 * BATCH_WORKERS locations are in flight at a time.
+    Yields: (entry_index, entry, notifications, sms_messages) as each location completes.
+    """
+    groups = {}
+    for index, entry in enumerate(entries):
+        groups.setdefault(normalize_location(entry["location"]), []).append(index)
+
+    pending = iter(groups.values())
+    in_flight = {}
+
+    def submit_next():
+        indexes = next(pending, None)
+        if indexes is not None:
+            location = entries[indexes[0]]["location"]
+            in_flight[batch_pool.submit(propagate(evaluate_location), location)] = indexes
+
+    for _ in range(2 * BATCH_WORKERS):
+        submit_next()
+
+    while in_flight:
+        future = next(as_completed(in_flight))
+        indexes = in_flight.pop(future)
+        submit_next()
+        notifications, sms_messages = future.result()
+        for index in indexes:
+            yield index, entries[index], notifications, sms_messages
+
+
+def send_sms_async(to_number: str, messages):
+    """Queues the messages in the durable SMS outbox (a local insert); its workers deliver them."""
+    for message in messages:
+        send_sms(to_number, message)
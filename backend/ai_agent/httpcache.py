@@ -0,0 +1,277 @@
+"""
+Conditional responses and compression for the deterministic endpoints.
+
+- etag(*parts) is a weak ETag over the versions of everything a response is built from
+  (dataset content hashes, model artifact, prompt version) plus the normalized request key.
+  Handlers compute it before doing any work: a request whose If-None-Match matches is answered
+  304 with no body, otherwise the 200 gets ETag + Cache-Control. /location-info, /recommendations
+  and /api/generate-advisory are POST lookups without side effects, so they get the 304 a GET
+  would (not the 412 RFC 9110 prescribes for state-changing methods).
+- Bodies of at least HTTP_COMPRESS_MIN_BYTES are compressed with brotli (when the optional
+  `brotli` package is installed) or gzip, as the client's Accept-Encoding allows. Streamed
+  responses (NDJSON batches, SSE) are passed through untouched.
+- Bytes not sent thanks to 304s and to compression are counted in info() and on /metrics.
+
+HTTP_CACHE_ENABLED=0 turns the validators off, HTTP_COMPRESSION_ENABLED=0 the compression.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from ai_agent.metrics import http_bytes_saved
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+ENABLED = os.getenv("HTTP_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+COMPRESSION_ENABLED = os.getenv("HTTP_COMPRESSION_ENABLED", "1").lower() not in ("0", "false", "no")
+COMPRESS_MIN_BYTES = int(os.getenv("HTTP_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("HTTP_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("HTTP_BROTLI_QUALITY", "5"))
+MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "300"))  # seconds; data-backed lookups
+ADVISORY_MAX_AGE = int(os.getenv("HTTP_ADVISORY_MAX_AGE", str(24 * 3600)))
+
+# Preferred first when the client accepts both with the same q-value
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "text/html", "text/plain", "text/css")
+
+# Body size last sent per ETag, so a 304 can be credited with the bytes it saved
+_SIZES_MAX = 10000
+_sizes = {}
+_sizes_lock = threading.Lock()  # Flask serves requests on many threads
+
+stats = {"tagged": 0, "not_modified": 0, "not_modified_bytes": 0,
+         "compressed": 0, "compress_in_bytes": 0, "compress_out_bytes": 0}
+
+
+# ---------------------------
+# Validators
+# ---------------------------
+def etag(*parts) -> str:
+    """Returns: a weak ETag (W/"...") hashing the JSON of `parts`; same for every Content-Encoding."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return 'W/"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def matches(if_none_match: str, tag: str) -> bool:
+    """Weak comparison of `tag` against an If-None-Match header value ("*" or a list of ETags)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = tag[2:] if tag.startswith("W/") else tag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def cache_headers(tag: str, max_age: int = MAX_AGE):
+    # private: answers may depend on the caller's own query; Vary because the body may be compressed
+    return {"ETag": tag, "Cache-Control": f"private, max-age={max_age}", "Vary": "Accept-Encoding"}
+
+
+def not_modified(request_headers, tag: str) -> bool:
+    """Returns: True when the request's If-None-Match matches `tag` (counts the bytes saved)."""
+    if not ENABLED or not matches(request_headers.get("If-None-Match", ""), tag):
+        return False
+    saved = _sizes.get(tag, 0)
+    stats["not_modified"] += 1
+    stats["not_modified_bytes"] += saved
+    http_bytes_saved.inc("not_modified", amount=saved)
+    return True
+
+
+def tag_response(response, tag: str, max_age: int = MAX_AGE):
+    """Adds ETag + Cache-Control to a 200 Flask or Starlette response. Returns: the response"""
+    if ENABLED and response.status_code == 200:
+        for name, value in cache_headers(tag, max_age).items():
+            response.headers[name] = value
+        stats["tagged"] += 1
+    return response
+
+
+def _remember(tag: str, size: int):
+    with _sizes_lock:
+        if _sizes.pop(tag, None) is None and len(_sizes) >= _SIZES_MAX:
+            _sizes.pop(next(iter(_sizes)), None)  # oldest first
+        _sizes[tag] = size
+
+
+# ---------------------------
+# Compression
+# ---------------------------
+def choose_encoding(accept_encoding: str):
+    """Returns: "br", "gzip" or None (identity) for an Accept-Encoding header value."""
+    if not accept_encoding:
+        return None
+    q = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[name.strip().lower()] = weight
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        weight = q.get(encoding, q.get("*", 0.0))
+        if weight > best_q:
+            best, best_q = encoding, weight
+    return best
+
+
+def compressible(content_type: str) -> bool:
+    return (content_type or "").split(";")[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _encode(body: bytes, encoding):
+    """Returns: the compressed body, or None when it is too small, not asked for or not smaller."""
+    if not COMPRESSION_ENABLED or encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return None
+    compressed = compress(body, encoding)
+    if len(compressed) >= len(body):
+        return None
+    stats["compressed"] += 1
+    stats["compress_in_bytes"] += len(body)
+    stats["compress_out_bytes"] += len(compressed)
+    http_bytes_saved.inc(encoding, amount=len(body) - len(compressed))
+    return compressed
+
+
+def info():
+    compression_saved = stats["compress_in_bytes"] - stats["compress_out_bytes"]
+    return {
+        "enabled": ENABLED,
+        "compression": {"enabled": COMPRESSION_ENABLED, "min_bytes": COMPRESS_MIN_BYTES, "encodings": list(ENCODINGS)},
+        **stats,
+        "bytes_saved": stats["not_modified_bytes"] + compression_saved,
+    }
+
+
+# ---------------------------
+# Flask integration
+# ---------------------------
+def flask_not_modified(tag: str, max_age: int = MAX_AGE):
+    """Returns: an empty 304 (with the validators) when If-None-Match matches `tag`, else None."""
+    from flask import Response, request
+
+    if not not_modified(request.headers, tag):
+        return None
+    return Response(status=304, headers=cache_headers(tag, max_age))
+
+
+def init_flask(app):
+    """Compresses eligible responses and records the size sent for each ETag."""
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        if response.direct_passthrough or response.is_streamed or response.status_code in (204, 304) \
+                or response.status_code < 200 or "Content-Encoding" in response.headers \
+                or not compressible(response.content_type):
+            return response
+        body = response.get_data()
+        encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+        compressed = _encode(body, encoding)
+        if compressed is not None:
+            response.set_data(compressed)
+            response.headers["Content-Encoding"] = encoding
+        if len(body) >= COMPRESS_MIN_BYTES:
+            response.vary.add("Accept-Encoding")
+        if "ETag" in response.headers:
+            _remember(response.headers["ETag"], len(compressed if compressed is not None else body))
+        return response
+
+
+# ---------------------------
+# ASGI integration
+# ---------------------------
+def asgi_not_modified(request, tag: str, max_age: int = MAX_AGE):
+    """Returns: an empty 304 (with the validators) when If-None-Match matches `tag`, else None."""
+    from starlette.responses import Response
+
+    if not not_modified(request.headers, tag):
+        return None
+    return Response(status_code=304, headers=cache_headers(tag, max_age))
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware: holds the response start until the first body message, then compresses
+    single-message bodies. Responses sent in several messages (streams) pass through unchanged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for key, value in scope.get("headers", []):
+            if key.lower() == b"accept-encoding":
+                accept = value.decode("latin-1")
+        held = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                held.append(message)
+                return
+            if message["type"] != "http.response.body" or not held:
+                await send(message)
+                return
+            start = held.pop()
+            if message.get("more_body", False):
+                await send(start)
+                await send(message)
+                return
+            start, message = self._finish(start, message, accept)
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _finish(start, message, accept: str):
+        """Returns: (start, body message), compressed when eligible."""
+        status = start["status"]
+        headers = [(k.lower(), v) for k, v in start.get("headers", [])]
+        names = {k for k, _ in headers}
+        content_type = next((v.decode("latin-1") for k, v in headers if k == b"content-type"), "")
+        body = message.get("body", b"")
+        if status < 200 or status in (204, 304) or b"content-encoding" in names or not compressible(content_type):
+            return start, message
+
+        encoding = choose_encoding(accept)
+        compressed = _encode(body, encoding)
+        if compressed is not None:
+            headers = [(k, v) for k, v in headers if k != b"content-length"]
+            headers += [(b"content-length", str(len(compressed)).encode()),
+                        (b"content-encoding", encoding.encode())]
+            message = dict(message, body=compressed)
+        if len(body) >= COMPRESS_MIN_BYTES:
+            vary = [v for k, v in headers if k == b"vary"]
+            if not any(b"accept-encoding" in v.lower() for v in vary):
+                headers = [(k, v) for k, v in headers if k != b"vary"]
+                headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+        etag_value = next((v.decode("latin-1") for k, v in headers if k == b"etag"), None)
+        if etag_value is not None:
+            _remember(etag_value, len(message.get("body", b"")))
+        return dict(start, headers=headers), message
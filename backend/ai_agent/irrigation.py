@@ -1,30 +1,18 @@
-import requests
-import datetime
-import os
-from dotenv import load_dotenv
+from ai_agent.rules import evaluate_one
+from ai_agent.weather import get_precip_history, PAST_DAYS
 
-load_dotenv()
-API_KEY = os.getenv("VISUAL_CROSSING_API_KEY")
-
-def check_irrigation(location: str):
+def check_irrigation(location: str, weather=None, crop: str = None, region: str = None):
     """
     Checks the last 10 days of precipitation to decide if irrigation is needed.
+    `weather` is an already fetched get_daily_precip() result; when omitted the lookback is
+    answered from the local precipitation history (only new days are fetched).
+    The rule itself ("irrigation" in ai_agent/rules.py) is shared with the vectorized sweep;
+    `crop` and `region` select its per-crop/region overrides.
     Returns: (irrigation_needed: bool, message: str)
     """
-    url = f"https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/{location}?key={API_KEY}&include=days&unitGroup=metric&elements=datetime,precip"
-
     try:
-        res = requests.get(url, timeout=10)
-        res.raise_for_status()
-        data = res.json()
+        weather = weather or {"past": get_precip_history(location, PAST_DAYS), "forecast": []}
     except Exception as e:
         return False, f"❌ Weather API error: {e}"
 
-    days = data.get("days", [])
-    last_10_days = days[-10:] if len(days) >= 10 else days
-
-    irrigation_needed = all(d.get("precip", 0) < 1 for d in last_10_days)
-    message = (f"💧 Irrigation Alert: No rain in last 10 days at {location}. Consider irrigating crops."
-               if irrigation_needed else
-               f"✅ Irrigation not required. Recent rain sufficient at {location}.")
-    return irrigation_needed, message
+    return evaluate_one(location, weather, "irrigation", crop=crop, region=region)
@@ -0,0 +1,309 @@
+import asyncio
+import os
+import threading
+import time
+
+from ai_agent.metrics import span
+from ai_agent.ratelimit import TokenBucket, backoff_delay
+from ai_agent.registry import registry
+
+try:
+    from httpx import TransportError  # what the google-genai SDK raises on timeouts / dropped connections
+except ImportError:
+    TransportError = ConnectionError
+
+# HTTP status of an upstream google.genai APIError: 429 RESOURCE_EXHAUSTED, 503 UNAVAILABLE,
+# 504 DEADLINE_EXCEEDED. Everything else (bad request, auth, safety blocks) fails at once.
+RETRYABLE_STATUS = (429, 503, 504)
+RETRYABLE_EXCEPTIONS = (TimeoutError, ConnectionError, TransportError)
+NO_QUOTA_RETRY_AFTER = 60.0  # seconds; GEMINI_RPM=0 never refills the bucket
+
+
+class LLMUnavailable(Exception):
+    """Raised instead of waiting when Gemini cannot answer now. `status` is the HTTP status to return."""
+    status = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class RateLimited(LLMUnavailable):
+    """Our quota, concurrency or queue limit is saturated, or Gemini answered 429."""
+    status = 429
+
+
+class UpstreamUnavailable(LLMUnavailable):
+    """Gemini kept failing with 503/504 or transport errors for the whole retry budget."""
+    status = 503
+
+
+def upstream_status(error: Exception):
+    """Returns: the HTTP status of an upstream error (APIError.code, or an httpx response's), else None."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+
+class LLMGateway:
+    """
+    Single entry point for Gemini calls from every module.
+    - token bucket matched to the requests-per-minute quota
+    - semaphore bounding concurrent upstream calls
+    - fast-fail with a retry-after hint when the queue is too long or the wait too large
+    - jittered exponential backoff on upstream 429/503/504 and transport errors, within the
+      same wait budget; a 429 that persists surfaces as RateLimited, the rest as UpstreamUnavailable
+    so request threads never sleep for tens of seconds.
+    """
+
+    def __init__(self, rpm: float = 15, burst: float = 5, max_concurrency: int = 4,
+                 max_queue: int = 32, max_wait: float = 5.0, max_retries: int = 2):
+        self.bucket = TokenBucket(rate=rpm / 60.0, capacity=burst)
+        self.max_concurrency = max_concurrency
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._async_semaphore = None  # created on first async call, inside the running loop
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self._client = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0, "errors": 0, "retries": 0, "rejected": 0,
+            "queue_depth": 0, "max_queue_depth": 0,
+            "wait_ms_total": 0.0, "wait_ms_max": 0.0,
+            "streams": 0, "ttft_ms_total": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            rpm=float(os.getenv("GEMINI_RPM", "15")),
+            burst=float(os.getenv("GEMINI_BURST", "5")),
+            max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+            max_queue=int(os.getenv("GEMINI_MAX_QUEUE", "32")),
+            max_wait=float(os.getenv("GEMINI_MAX_WAIT", "5")),
+            max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "2")),
+        )
+
+    @property
+    def client(self):
+        """google.genai client, created on first use (a missing key fails that call, not start-up)."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if not os.getenv("GEMINI_API_KEY"):
+                        raise RuntimeError("Missing GEMINI_API_KEY. Please add it to your .env file.")
+                    from google import genai
+                    # GEMINI_BASE_URL points the SDK at a proxy or the local fake used by bench_load.py
+                    base_url = os.getenv("GEMINI_BASE_URL")
+                    self._client = genai.Client(
+                        api_key=os.getenv("GEMINI_API_KEY"),
+                        http_options={"base_url": base_url} if base_url else None,
+                    )
+        return self._client
+
+    def _retry_after(self):
+        if self.bucket.rate <= 0:
+            return NO_QUOTA_RETRY_AFTER
+        return self.bucket.wait_time() + self.stats["queue_depth"] / self.bucket.rate
+
+    def _admit(self, deadline):
+        """Waits for a concurrency slot and a quota token, or raises RateLimited."""
+        if not self.semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise RateLimited("LLM busy, too many concurrent requests", self._retry_after())
+        wait = self.bucket.reserve(max_wait=max(0.0, deadline - time.monotonic()))
+        if wait is None:
+            self.semaphore.release()
+            raise RateLimited("LLM quota exhausted, try again later", self._retry_after())
+        if wait:
+            time.sleep(wait)
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.stats[name] += amount
+
+    def _retry_delay(self, error: Exception, attempt: int, deadline: float) -> float:
+        """Returns the backoff before the next attempt, or raises when `error` must not be retried."""
+        self._count(errors=1)
+        status = upstream_status(error)
+        if status not in RETRYABLE_STATUS and not (status is None and isinstance(error, RETRYABLE_EXCEPTIONS)):
+            raise error
+        delay = backoff_delay(attempt)
+        if attempt == self.max_retries or time.monotonic() + delay > deadline:
+            if status == 429:
+                raise RateLimited(f"LLM quota exhausted: {error}", self._retry_after() + delay) from error
+            raise UpstreamUnavailable(f"LLM unavailable: {error}", delay) from error
+        self._count(retries=1)
+        return delay
+
+    def _enter_queue(self):
+        with self._lock:
+            if self.stats["queue_depth"] >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise RateLimited("LLM queue full, try again later", self._retry_after())
+            self.stats["queue_depth"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.stats["queue_depth"])
+
+    def _leave_queue(self):
+        with self._lock:
+            self.stats["queue_depth"] -= 1
+
+    def _record_wait(self, started: float):
+        waited_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self.stats["wait_ms_total"] += waited_ms
+            self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], waited_ms)
+            self.stats["calls"] += 1
+
+    def call(self, fn):
+        """Runs `fn()` (one upstream LLM request) under the quota, concurrency and wait limits."""
+        self._enter_queue()
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self._admit(deadline)
+                except RateLimited:
+                    self._count(rejected=1)
+                    raise
+                self._record_wait(started)
+                try:
+                    return fn()
+                except Exception as e:
+                    error = e
+                finally:
+                    self.semaphore.release()
+
+                time.sleep(self._retry_delay(error, attempt, deadline))
+        finally:
+            self._leave_queue()
+
+    def generate(self, model: str, contents) -> str:
+        """Returns the response text of a non-streaming generate_content call."""
+        def request():
+            with span("gemini"):
+                return self.client.models.generate_content(model=model, contents=contents).text
+        return self.call(request)
+
+    def stream(self, model: str, contents):
+        """
+        Starts a streaming generate_content call and waits for its first chunk.
+        Admission, quota and retries cover the request up to that chunk (so a failed start is
+        retried like a normal call, and a refusal raises LLMUnavailable here, before the caller
+        has sent anything); the rest of the text is then relayed as it arrives.
+        Returns: an iterator of response text chunks
+        """
+        started = time.monotonic()
+
+        def start():
+            with span("gemini.first_chunk"):
+                chunks = iter(self.client.models.generate_content_stream(model=model, contents=contents))
+                return next(chunks, None), chunks
+
+        first, chunks = self.call(start)
+        self._count(streams=1, ttft_ms_total=(time.monotonic() - started) * 1000)
+        return self._relay(first, chunks)
+
+    @staticmethod
+    def _relay(first, chunks):
+        if first is None:
+            return
+        if first.text:
+            yield first.text
+        for chunk in chunks:
+            if chunk.text:
+                yield chunk.text
+
+    # ---------------------------
+    # asyncio variants (ASGI service)
+    # ---------------------------
+    async def _aadmit(self, deadline):
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.wait_for(self._async_semaphore.acquire(), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise RateLimited("LLM busy, too many concurrent requests", self._retry_after())
+        wait = self.bucket.reserve(max_wait=max(0.0, deadline - time.monotonic()))
+        if wait is None:
+            self._async_semaphore.release()
+            raise RateLimited("LLM quota exhausted, try again later", self._retry_after())
+        if wait:
+            await asyncio.sleep(wait)
+
+    async def acall(self, fn):
+        """Like call(), but awaits `fn()` and waits with asyncio.sleep instead of blocking a thread."""
+        self._enter_queue()
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await self._aadmit(deadline)
+                except RateLimited:
+                    self._count(rejected=1)
+                    raise
+                self._record_wait(started)
+                try:
+                    return await fn()
+                except Exception as e:
+                    error = e
+                finally:
+                    self._async_semaphore.release()
+
+                await asyncio.sleep(self._retry_delay(error, attempt, deadline))
+        finally:
+            self._leave_queue()
+
+    async def agenerate(self, model: str, contents) -> str:
+        async def request():
+            with span("gemini"):
+                response = await self.client.aio.models.generate_content(model=model, contents=contents)
+            return response.text
+        return await self.acall(request)
+
+    async def astream(self, model: str, contents):
+        """Returns: an async iterator of response text chunks; same admission rules as stream()."""
+        started = time.monotonic()
+
+        async def start():
+            with span("gemini.first_chunk"):
+                chunks = (await self.client.aio.models.generate_content_stream(model=model, contents=contents)).__aiter__()
+                try:
+                    return await chunks.__anext__(), chunks
+                except StopAsyncIteration:
+                    return None, chunks
+
+        first, chunks = await self.acall(start)
+        self._count(streams=1, ttft_ms_total=(time.monotonic() - started) * 1000)
+        return self._arelay(first, chunks)
+
+    @staticmethod
+    async def _arelay(first, chunks):
+        if first is None:
+            return
+        if first.text:
+            yield first.text
+        async for chunk in chunks:
+            if chunk.text:
+                yield chunk.text
+
+    def info(self):
+        with self._lock:
+            stats = dict(self.stats)
+        calls = stats["calls"]
+        streams = stats["streams"]
+        return {
+            **stats,
+            "wait_ms_avg": round(stats["wait_ms_total"] / calls, 1) if calls else 0.0,
+            "ttft_ms_avg": round(stats["ttft_ms_total"] / streams, 1) if streams else 0.0,
+            "tokens_per_minute": self.bucket.rate * 60,
+        }
+
+
+gateway = LLMGateway.from_env()
+# Optional: a missing GEMINI_API_KEY fails the Gemini endpoints, not start-up
+registry.register("gemini", lambda: gateway.client, required=False)
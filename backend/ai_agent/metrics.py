@@ -0,0 +1,293 @@
+"""
+In-process metrics and request tracing.
+
+- Latency histograms and counters per route and per upstream call, rendered in the
+  Prometheus text format on /metrics.
+- Every request gets a trace ID (taken from an incoming X-Request-ID, else generated) returned
+  in X-Trace-Id. Span timings are returned in a Server-Timing header when the client sends
+  X-Debug-Trace: 1 or TRACE_DEBUG=1 is set.
+
+METRICS_ENABLED=0 turns everything off: span() returns a shared no-op context manager and
+no request hooks are installed.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+TRACE_DEBUG = os.getenv("TRACE_DEBUG", "0").lower() in ("1", "true", "yes")
+
+# Seconds; covers cache hits (sub-ms) up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+# ---------------------------
+# Metric types
+# ---------------------------
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, (list(c), s, n)) for labels, (c, s, n) in self._series.items())
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+http_latency = Histogram("http_request_duration_seconds", "Request latency by route (until the response headers)",
+                         ("method", "route", "status"))
+http_requests = Counter("http_requests_total", "Requests by route and status", ("method", "route", "status"))
+upstream_latency = Histogram("upstream_call_duration_seconds", "Latency of calls to upstreams and heavy steps",
+                             ("upstream",))
+upstream_errors = Counter("upstream_errors_total", "Failed upstream calls by exception type", ("upstream", "error"))
+http_bytes_saved = Counter("http_response_bytes_saved_total",
+                           "Response bytes not sent, by reason (not_modified, gzip, br)", ("reason",))
+
+REGISTRY = [http_latency, http_requests, upstream_latency, upstream_errors, http_bytes_saved]
+
+
+def render() -> str:
+    """Returns: all metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ---------------------------
+# Tracing
+# ---------------------------
+class Trace:
+    def __init__(self, trace_id: str = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.spans = []  # (name, duration_s); list.append is safe from worker threads
+
+    def server_timing(self, total: float = None) -> str:
+        """Returns: Server-Timing header value, one entry per span plus the total."""
+        parts = [f"{name.replace('.', '-')};dur={duration * 1000:.1f}" for name, duration in self.spans]
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+def current_trace():
+    return _trace.get()
+
+
+def start_trace(trace_id: str = None):
+    """Returns: (trace, token); pass the token to end_trace."""
+    trace = Trace(trace_id)
+    return trace, _trace.set(trace)
+
+
+def end_trace(token):
+    _trace.reset(token)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+@contextmanager
+def _span(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        # Not BaseException: a closed generator (GeneratorExit) or a cancelled task
+        # (CancelledError) is the caller going away, not the upstream failing
+        upstream_errors.inc(name, type(e).__name__)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        upstream_latency.observe(duration, name)
+        trace = _trace.get()
+        if trace is not None:
+            trace.spans.append((name, duration))
+
+
+def span(name: str):
+    """Times the enclosed block as upstream `name` (and as a span of the current trace)."""
+    return _span(name) if ENABLED else _NOOP
+
+
+def propagate(fn):
+    """Wraps fn so it runs in the caller's context (trace) when submitted to a thread pool."""
+    if not ENABLED:
+        return fn
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def _wants_debug(headers) -> bool:
+    return TRACE_DEBUG or headers.get("X-Debug-Trace", "").lower() in ("1", "true", "yes")
+
+
+# ---------------------------
+# Flask integration
+# ---------------------------
+def init_flask(app):
+    """Installs per-request trace + route metrics hooks on a Flask app (no-op when disabled)."""
+    if not ENABLED:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start():
+        g.trace, g.trace_token = start_trace(request.headers.get("X-Request-ID"))
+
+    @app.after_request
+    def _finish(response):
+        trace = g.pop("trace", None)
+        if trace is None:
+            return response
+        duration = time.perf_counter() - trace.started
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        status = str(response.status_code)
+        http_latency.observe(duration, request.method, route, status)
+        http_requests.inc(request.method, route, status)
+        response.headers["X-Trace-Id"] = trace.trace_id
+        if _wants_debug(request.headers):
+            response.headers["Server-Timing"] = trace.server_timing(duration)
+        return response
+
+    @app.teardown_request
+    def _reset(exc):
+        token = g.pop("trace_token", None)
+        if token is not None:
+            try:
+                end_trace(token)
+            except ValueError:  # token created in another context (streamed responses)
+                pass
+
+
+# ---------------------------
+# ASGI integration
+# ---------------------------
+def _route_template(scope) -> str:
+    """Returns: the matched route's path template ("/items/{id}"), never the raw path, or "unmatched"."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Older Starlette does not expose the matched route: look its template up by endpoint
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        for candidate in getattr(scope.get("app"), "routes", ()):
+            if getattr(candidate, "endpoint", None) is endpoint:
+                return candidate.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-request trace + route metrics, headers added at response start."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1").title(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        trace, token = start_trace(headers.get("X-Request-Id"))
+        debug = _wants_debug(headers)
+        recorded = []
+
+        def observe(code):
+            # Like the Flask hooks, latency is measured until the response headers
+            if recorded:
+                return
+            recorded.append(code)
+            route = _route_template(scope)
+            duration = time.perf_counter() - trace.started
+            http_latency.observe(duration, scope["method"], route, str(code))
+            http_requests.inc(scope["method"], route, str(code))
+            return duration
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                duration = observe(message["status"])
+                extra = [(b"x-trace-id", trace.trace_id.encode())]
+                if debug:
+                    extra.append((b"server-timing", trace.server_timing(duration).encode()))
+                message = dict(message, headers=list(message.get("headers", [])) + extra)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            observe(500)
+            end_trace(token)
@@ -0,0 +1,396 @@
+"""
+Durable SMS outbox.
+
+send_sms() only inserts the message into a local SQLite queue; a small pool of worker threads
+delivers it through Twilio's REST API over one pooled HTTP session, at most TWILIO_MPS
+messages per second. The same (phone, message) pair queued again within SMS_DEDUPE_WINDOW
+seconds is dropped, failures are retried with jittered backoff, and queued messages survive
+a restart.
+
+The TWILIO_MPS token bucket lives in each process: several processes sharing one outbox file
+each send at up to TWILIO_MPS, so divide the account's limit between them.
+
+Run from the backend folder:
+    python -m ai_agent.outbox stats
+    python -m ai_agent.outbox run              # deliver in this process until Ctrl+C
+    python -m ai_agent.outbox requeue-failed
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ai_agent.metrics import span
+from ai_agent.ratelimit import TokenBucket, backoff_delay
+from ai_agent.registry import registry
+from ai_agent.utils import mask_phone
+
+DB_PATH = os.getenv("SMS_OUTBOX_DB", "sms_outbox.db")
+SMS_WORKERS = int(os.getenv("SMS_WORKERS", "4"))
+TWILIO_MPS = float(os.getenv("TWILIO_MPS", "1"))  # messages per second per account
+TWILIO_BURST = float(os.getenv("TWILIO_BURST", "5"))
+DEDUPE_WINDOW = float(os.getenv("SMS_DEDUPE_WINDOW", str(6 * 3600)))  # seconds
+MAX_ATTEMPTS = int(os.getenv("SMS_MAX_ATTEMPTS", "5"))
+BATCH_SIZE = int(os.getenv("SMS_BATCH_SIZE", "10"))  # messages claimed per worker round trip
+DRAIN_TIMEOUT = float(os.getenv("SMS_DRAIN_TIMEOUT", "5"))  # seconds spent delivering at exit
+SEND_TIMEOUT = 10
+# Seconds after which a 'sending' row from a crashed worker is retried. A live worker refreshes
+# claimed_at right before each send, so only one send (SEND_TIMEOUT) has to fit in it.
+STALE_CLAIM = 120
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryError(Exception):
+    def __init__(self, message: str, retryable: bool):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def dedupe_key(phone_number: str, message: str) -> str:
+    raw = "\x1f".join([" ".join(phone_number.split()), message.strip()])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Outbox:
+    """
+    SQLite-backed SMS queue with a delivery worker pool.
+    Rows move pending -> sending -> sent, or back to pending (retry) until `max_attempts`,
+    then failed. Claims are atomic, so several processes may share one outbox file.
+    """
+
+    def __init__(self, path: str = DB_PATH, account_sid: str = None, auth_token: str = None,
+                 from_number: str = None, base_url: str = "https://api.twilio.com",
+                 workers: int = SMS_WORKERS, rate: float = TWILIO_MPS, burst: float = TWILIO_BURST,
+                 dedupe_window: float = DEDUPE_WINDOW, max_attempts: int = MAX_ATTEMPTS,
+                 batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.base_url = base_url.rstrip("/")
+        self.workers = workers
+        self.dedupe_window = dedupe_window
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        # Twilio's throughput limits are per account, so is the bucket
+        self.buckets = {account_sid: TokenBucket(rate, burst)}
+        self.stats = {"queued": 0, "deduplicated": 0, "sent": 0, "retries": 0, "failed": 0,
+                      "send_ms_total": 0.0}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # stats are bumped from every worker thread
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                phone_number TEXT NOT NULL,
+                message TEXT NOT NULL,
+                dedupe_key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                claimed_at REAL,
+                sent_at REAL,
+                sid TEXT,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+            CREATE INDEX IF NOT EXISTS idx_outbox_dedupe ON outbox(dedupe_key, created_at);
+        """)
+
+    @classmethod
+    def from_env(cls):
+        from ai_agent.utils import TWILIO_ACCOUNT_SID, TWILIO_API_BASE_URL, TWILIO_AUTH_TOKEN, TWILIO_NUMBER
+        return cls(DB_PATH, TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_NUMBER, TWILIO_API_BASE_URL)
+
+    # ---------------------------
+    # Queue
+    # ---------------------------
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, phone_number: str, message: str):
+        """
+        Queues one SMS unless the same (phone, message) was queued within the dedupe window.
+        Returns: the outbox id, or None when it was deduplicated
+        """
+        key = dedupe_key(phone_number, message)
+        now = time.time()
+
+        def insert(conn):
+            duplicate = conn.execute(
+                "SELECT 1 FROM outbox WHERE dedupe_key = ? AND created_at >= ? AND status != 'failed' LIMIT 1",
+                (key, now - self.dedupe_window)).fetchone()
+            if duplicate:
+                return None
+            return conn.execute(
+                "INSERT INTO outbox (phone_number, message, dedupe_key, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, 'pending', ?, ?)",
+                (phone_number, message, key, now, now)).lastrowid
+
+        outbox_id = self._transaction(insert)
+        if outbox_id is None:
+            self._count("deduplicated")
+        else:
+            self._count("queued")
+            self._wakeup.set()
+        return outbox_id
+
+    def _claim(self):
+        """Marks up to batch_size due messages as sending. Returns: [(id, phone, message, attempts, claimed_at)]"""
+        now = time.time()
+
+        def claim(conn):
+            # Rows left in 'sending' by a crashed worker become due again after STALE_CLAIM
+            conn.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending' AND claimed_at < ?",
+                         (now - STALE_CLAIM,))
+            return conn.execute(
+                "UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id IN ("
+                "  SELECT id FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?"
+                "  ORDER BY next_attempt_at, id LIMIT ?"
+                ") RETURNING id, phone_number, message, attempts, claimed_at",
+                (now, now, self.batch_size)).fetchall()
+
+        return self._transaction(claim)
+
+    def _refresh_claim(self, outbox_id: int, claimed_at: float):
+        """
+        Renews this worker's claim right before the send.
+        Returns: the new claimed_at, or None when the row was reclaimed by another worker meanwhile
+        """
+        now = time.time()
+        updated = self._transaction(lambda conn: conn.execute(
+            "UPDATE outbox SET claimed_at = ? WHERE id = ? AND status = 'sending' AND claimed_at = ?",
+            (now, outbox_id, claimed_at)).rowcount)
+        return now if updated else None
+
+    def _next_due_in(self) -> float:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()
+        return max(0.0, row[0] - time.time()) if row and row[0] is not None else None
+
+    def _count(self, name: str, amount=1, **more):
+        with self._stats_lock:
+            self.stats[name] += amount
+            for other, value in more.items():
+                self.stats[other] += value
+
+    def _mark_sent(self, outbox_id: int, sid: str, send_ms: float = 0.0):
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE outbox SET status = 'sent', sent_at = ?, sid = ?, attempts = attempts + 1 WHERE id = ?",
+            (time.time(), sid, outbox_id)))
+        # Together, so send_ms_avg never divides a total by a count from another moment
+        self._count("sent", send_ms_total=send_ms)
+
+    def _mark_failed(self, outbox_id: int, attempts: int, error: DeliveryError):
+        attempts += 1
+        if error.retryable and attempts < self.max_attempts:
+            status, due = "pending", time.time() + backoff_delay(attempts, base=2.0, cap=300.0)
+            self._count("retries")
+        else:
+            status, due = "failed", time.time()
+            self._count("failed")
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+            (status, attempts, due, str(error)[:500], outbox_id)))
+
+    # ---------------------------
+    # Delivery
+    # ---------------------------
+    def deliver(self, phone_number: str, message: str) -> str:
+        """
+        Sends one SMS through Twilio's Messages API on the pooled session.
+        Returns: the message SID
+        Raises: DeliveryError (retryable for network errors, 429 and 5xx)
+        """
+        if not (self.account_sid and self.auth_token and self.from_number):
+            raise DeliveryError("Missing TWILIO_ACCOUNT_SID / TWILIO_AUTH_TOKEN / TWILIO_NUMBER", retryable=False)
+        url = f"{self.base_url}/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        try:
+            with span("twilio"):
+                res = self.session.post(
+                    url,
+                    data={"Body": message, "From": self.from_number, "To": phone_number},
+                    auth=(self.account_sid, self.auth_token),
+                    timeout=SEND_TIMEOUT,
+                )
+        except requests.RequestException as e:
+            raise DeliveryError(f"Twilio request failed: {e}", retryable=True)
+        if res.status_code >= 400:
+            # Twilio errors may quote the number; the text ends up in logs and in last_error
+            body = res.text[:200].replace(phone_number, mask_phone(phone_number))
+            raise DeliveryError(f"Twilio {res.status_code}: {body}",
+                                retryable=res.status_code == 429 or res.status_code >= 500)
+        # Accepted: an unreadable body must not make the message go out again
+        try:
+            return res.json().get("sid")
+        except (ValueError, AttributeError):
+            logger.warning("Twilio %s with an unreadable body, treating SMS as sent", res.status_code)
+            return None
+
+    def _send(self, row):
+        outbox_id, phone_number, message, attempts, claimed_at = row
+        self.buckets[self.account_sid].acquire()
+        # The token bucket may have waited long enough for another worker to take the row over
+        if self._refresh_claim(outbox_id, claimed_at) is None:
+            logger.info("SMS %s was reclaimed by another worker, skipping", outbox_id)
+            return
+        started = time.monotonic()
+        try:
+            sid = self.deliver(phone_number, message)
+        except DeliveryError as e:
+            logger.warning("SMS %s to %s failed (attempt %d): %s", outbox_id, mask_phone(phone_number), attempts + 1, e)
+            self._mark_failed(outbox_id, attempts, e)
+            return
+        self._mark_sent(outbox_id, sid, (time.monotonic() - started) * 1000)
+        logger.info("SMS %s sent, SID %s", outbox_id, sid)
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                batch = self._claim()
+            except sqlite3.Error:
+                logger.exception("SMS outbox claim failed")
+                batch = []
+            if not batch:
+                # Sleep until a message is queued or the next retry is due
+                self._wakeup.clear()
+                due_in = self._next_due_in()
+                self._wakeup.wait(timeout=1.0 if due_in is None else min(max(due_in, 0.05), 1.0))
+                continue
+            for row in batch:
+                try:
+                    self._send(row)
+                except Exception as e:
+                    # Keep the worker alive; unexpected errors are retried like transient ones
+                    logger.exception("SMS %s delivery crashed", row[0])
+                    try:
+                        self._mark_failed(row[0], row[3], DeliveryError(f"{type(e).__name__}: {e}", retryable=True))
+                    except Exception:
+                        # Left in 'sending', the row is picked up again after STALE_CLAIM
+                        logger.exception("SMS %s could not be marked failed", row[0])
+
+    def start(self):
+        """Starts the delivery workers (idempotent). Returns: self"""
+        if not self._threads:
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._worker, name=f"sms-outbox-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            # Short-lived scripts get a chance to deliver what they queued
+            atexit.register(self.drain, DRAIN_TIMEOUT)
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def drain(self, timeout: float = DRAIN_TIMEOUT) -> bool:
+        """Waits until nothing is due or in flight. Returns: True if the queue drained in time"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                busy = self._conn.execute(
+                    "SELECT COUNT(*) FROM outbox WHERE status = 'sending' "
+                    "OR (status = 'pending' AND next_attempt_at <= ?)", (time.time(),)).fetchone()[0]
+            if not busy:
+                return True
+            self._wakeup.set()
+            time.sleep(0.05)
+        return False
+
+    def requeue_failed(self) -> int:
+        """Gives every failed message a fresh set of attempts. Returns: rows requeued"""
+        count = self._transaction(lambda conn: conn.execute(
+            "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'failed'",
+            (time.time(),)).rowcount)
+        self._wakeup.set()
+        return count
+
+    def info(self):
+        with self._lock:
+            by_status = dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM outbox WHERE status IN ('pending', 'sending')").fetchone()[0]
+        with self._stats_lock:
+            stats = dict(self.stats)
+        sent = stats["sent"]
+        return {
+            "queue": by_status,
+            "oldest_pending_s": round(time.time() - oldest, 1) if oldest else 0.0,
+            **{k: v for k, v in stats.items() if k != "send_ms_total"},
+            "send_ms_avg": round(stats["send_ms_total"] / sent, 1) if sent else 0.0,
+            "workers": len(self._threads),
+            "messages_per_second": self.buckets[self.account_sid].rate,
+            "dedupe_window_s": self.dedupe_window,
+        }
+
+
+registry.register("sms_outbox", lambda: Outbox.from_env().start())
+
+
+def get_outbox():
+    """The process-wide outbox, created and started on first use."""
+    return registry.get("sms_outbox")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durable SMS outbox")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Show queue and delivery stats")
+    sub.add_parser("run", help="Deliver queued messages until interrupted")
+    sub.add_parser("requeue-failed", help="Retry every failed message")
+    args = parser.parse_args()
+
+    outbox = Outbox.from_env()
+    if args.command == "stats":
+        print(json.dumps(outbox.info(), indent=2))
+    elif args.command == "requeue-failed":
+        print(f"✅ {outbox.requeue_failed()} message(s) requeued")
+    elif args.command == "run":
+        outbox.start()
+        try:
+            while True:
+                time.sleep(60)
+                print(json.dumps(outbox.info()))
+        except KeyboardInterrupt:
+            outbox.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Local daily-precipitation history per normalized location (SQLite).
+
+Observed days stop changing a couple of days after the fact, so once a day is older than
+PRECIP_FINAL_LAG_DAYS it is marked final and never requested from Visual Crossing again.
+The last few (not yet final) days are re-fetched at most once per PRECIP_REFRESH_TTL.
+The weather layer asks missing_since() for the first day it still has to fetch, stores
+what it fetched with upsert(), and answers lookbacks with history().
+"""
+import datetime
+import os
+import sqlite3
+import threading
+
+from ai_agent.registry import registry
+
+DB_PATH = os.getenv("PRECIP_DB", "precip_history.db")
+FINAL_LAG_DAYS = int(os.getenv("PRECIP_FINAL_LAG_DAYS", "2"))
+REFRESH_TTL = float(os.getenv("PRECIP_REFRESH_TTL", os.getenv("WEATHER_CACHE_TTL", "1800")))  # seconds
+
+
+class PrecipStore:
+    def __init__(self, path: str = DB_PATH, final_lag_days: int = FINAL_LAG_DAYS, refresh_ttl: float = REFRESH_TTL):
+        self.path = path
+        self.final_lag_days = final_lag_days
+        self.refresh_ttl = refresh_ttl
+        self.stats = {"days_stored": 0, "lookups": 0, "complete": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS daily_precip (
+                location_key TEXT NOT NULL,
+                day TEXT NOT NULL,
+                precip REAL,
+                final INTEGER NOT NULL,
+                fetched_at TEXT NOT NULL,
+                PRIMARY KEY (location_key, day)
+            ) WITHOUT ROWID;
+        """)
+        self._conn.commit()
+
+    def is_final(self, day: datetime.date, today: datetime.date) -> bool:
+        return day <= today - datetime.timedelta(days=self.final_lag_days)
+
+    def missing_since(self, location_key: str, start: datetime.date, today: datetime.date):
+        """
+        Returns: the first day in [start, today) that is missing, or stored as not final and older
+        than refresh_ttl; None when the whole range can be answered locally.
+        """
+        self.stats["lookups"] += 1
+        fresh_since = (datetime.datetime.now() - datetime.timedelta(seconds=self.refresh_ttl)).isoformat(timespec="seconds")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day FROM daily_precip WHERE location_key = ? AND day >= ? AND day < ? "
+                "AND (final = 1 OR fetched_at >= ?)",
+                (location_key, start.isoformat(), today.isoformat(), fresh_since)).fetchall()
+        known = {row[0] for row in rows}
+        day = start
+        while day < today:
+            if day.isoformat() not in known:
+                return day
+            day += datetime.timedelta(days=1)
+        self.stats["complete"] += 1
+        return None
+
+    def upsert(self, location_key: str, days, today: datetime.date):
+        """Stores observed days (before `today`) from a timeline payload; final rows are never overwritten."""
+        fetched_at = datetime.datetime.now().isoformat(timespec="seconds")
+        rows = []
+        for d in days:
+            day = d.get("datetime", "")
+            if not day or day >= today.isoformat():
+                continue
+            final = self.is_final(datetime.date.fromisoformat(day), today)
+            rows.append((location_key, day, d.get("precip"), int(final), fetched_at))
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO daily_precip (location_key, day, precip, final, fetched_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (location_key, day) DO UPDATE SET "
+                "precip = excluded.precip, final = excluded.final, fetched_at = excluded.fetched_at "
+                "WHERE daily_precip.final = 0",
+                rows)
+            self._conn.commit()
+        self.stats["days_stored"] += len(rows)
+        return len(rows)
+
+    def history(self, location_key: str, start: datetime.date, today: datetime.date):
+        """Returns: [{"datetime", "precip"}] for the stored days in [start, today), oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day, precip FROM daily_precip WHERE location_key = ? AND day >= ? AND day < ? ORDER BY day",
+                (location_key, start.isoformat(), today.isoformat())).fetchall()
+        return [{"datetime": day, "precip": precip} for day, precip in rows]
+
+    def info(self):
+        with self._lock:
+            locations, days, final = self._conn.execute(
+                "SELECT COUNT(DISTINCT location_key), COUNT(*), COALESCE(SUM(final), 0) FROM daily_precip").fetchone()
+        return {"locations": locations, "days": days, "final_days": final, **self.stats}
+
+
+registry.register("precip_store", lambda: PrecipStore())
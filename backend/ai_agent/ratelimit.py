@@ -0,0 +1,63 @@
+import math
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Client-side token bucket: `rate` tokens per second, bursts up to `capacity`.
+    reserve() books a token and tells the caller how long to wait for it, so callers can
+    refuse instead of sleeping when the wait would be too long.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait(self) -> float:
+        """Seconds until one whole token is available (inf when rate is 0 and the burst is spent)."""
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate if self.rate > 0 else math.inf
+
+    def reserve(self, max_wait: float = None):
+        """
+        Takes one token, possibly going into debt. Returns the seconds to wait before using it,
+        or None (nothing reserved) when that wait would exceed `max_wait`.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = self._wait()
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def wait_time(self) -> float:
+        """Seconds until the next token is available (without reserving it)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._wait()
+
+    def acquire(self, max_wait: float = None) -> bool:
+        """Blocks until a token is available. Returns False without waiting if that exceeds `max_wait`."""
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait:
+            time.sleep(wait)
+        return True
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2**attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
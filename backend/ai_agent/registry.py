@@ -0,0 +1,195 @@
+"""
+Shared registry of heavy resources (datasets, model, indexes, SDK clients).
+
+Each resource is registered with a factory and built once, on first use, by whichever thread
+needs it first; concurrent callers wait for that single build. STARTUP_MODE chooses when the
+backend builds them:
+    eager    - at start-up, before the first request is served (default, fails fast: start()
+               raises when a required resource cannot be built)
+    lazy     - on first use only (fastest cold start)
+    prewarm  - lazily, plus one background thread building everything right after start-up
+
+A factory that fails is not cached: the error is raised to the caller and the next get()
+tries again (e.g. once a missing key has been configured).
+"""
+import logging
+import os
+import threading
+import time
+
+STARTUP_MODES = ("eager", "lazy", "prewarm")
+
+logger = logging.getLogger(__name__)
+
+
+class Registry:
+    def __init__(self):
+        self._factories = {}
+        self._values = {}
+        self._locks = {}
+        self._optional = set()
+        self._lock = threading.Lock()
+        self.timings = {}  # name -> seconds spent in the factory
+        self.errors = {}   # name -> last factory error
+
+    def register(self, name: str, factory, required: bool = True):
+        """
+        Registers `factory()` as the builder of `name` (replaces any earlier, unbuilt factory).
+        A resource that is not `required` may fail in eager mode without stopping start-up.
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+            if required:
+                self._optional.discard(name)
+            else:
+                self._optional.add(name)
+
+    def get(self, name: str):
+        """Returns: the resource, building it first if needed."""
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        with self._locks[name]:
+            if name in self._values:
+                return self._values[name]
+            started = time.perf_counter()
+            try:
+                value = self._factories[name]()
+            except Exception as e:
+                self.errors[name] = f"{type(e).__name__}: {e}"
+                raise
+            self.timings[name] = time.perf_counter() - started
+            self.errors.pop(name, None)
+            self._values[name] = value
+            return value
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._values
+
+    def reset(self, name: str):
+        """Drops a built resource so the next get() rebuilds it."""
+        with self._locks[name]:
+            self._values.pop(name, None)
+
+    def warm(self, names=None):
+        """
+        Builds `names` (default: everything registered) in registration order.
+        Errors are recorded and logged, not raised, so one missing key does not stop the rest.
+        Returns: {name: error} for the resources that failed
+        """
+        failed = {}
+        for name in names or list(self._factories):
+            try:
+                self.get(name)
+            except Exception as e:
+                failed[name] = e
+                logger.error("%s failed to initialize: %s", name, e)
+        return failed
+
+    def prewarm(self, names=None):
+        """Starts warm() on a daemon thread. Returns: the thread"""
+        thread = threading.Thread(target=self.warm, args=(names,), name="registry-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def start(self, mode: str = None, names=None):
+        """
+        Applies STARTUP_MODE (or `mode`) to the registered resources.
+        Raises: RuntimeError in eager mode when a resource failed to build, so the service does not start
+        """
+        mode = (mode or os.getenv("STARTUP_MODE", "eager")).lower()
+        if mode not in STARTUP_MODES:
+            raise ValueError(f"STARTUP_MODE must be one of {', '.join(STARTUP_MODES)}, got '{mode}'")
+        if mode == "eager":
+            failed = {name: e for name, e in self.warm(names).items() if name not in self._optional}
+            if failed:
+                details = "; ".join(f"{name}: {type(e).__name__}: {e}" for name, e in failed.items())
+                raise RuntimeError(f"❌ Resources failed to initialize (STARTUP_MODE=eager): {details}")
+        elif mode == "prewarm":
+            self.prewarm(names)
+        return mode
+
+    def info(self):
+        return {
+            name: {
+                "loaded": name in self._values,
+                "init_ms": round(self.timings[name] * 1000, 1) if name in self.timings else None,
+                "error": self.errors.get(name),
+            }
+            for name in self._factories
+        }
+
+
+registry = Registry()
+
+
+# ---------------------------
+# Start-up profile
+# ---------------------------
+_PROFILE_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter() - started
+from ai_agent.registry import registry
+registry.warm()
+total = time.perf_counter() - started
+print("@@PROFILE@@" + json.dumps({{"import_s": imported, "total_s": total, "resources": registry.info()}}))
+"""
+
+
+def profile_startup(module: str, mode: str = "lazy", top: int = 15):
+    """
+    Imports `module` in a fresh interpreter with `python -X importtime` and STARTUP_MODE=mode,
+    then builds every registered resource, and prints where the time went:
+    the slowest top-level imports (cumulative) and the init time of each resource.
+    Returns: the parsed report dict
+    """
+    import json
+    import subprocess
+    import sys
+
+    env = dict(os.environ, STARTUP_MODE=mode)
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [backend_dir, env.get("PYTHONPATH")]))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROFILE_CHILD.format(module=module)],
+        env=env, capture_output=True, text=True,
+    )
+    report = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("@@PROFILE@@"):
+            report = json.loads(line[len("@@PROFILE@@"):])
+    if report is None:
+        raise RuntimeError(f"Start-up profile failed:\n{proc.stderr[-2000:]}")
+
+    # "import time: self [us] | cumulative | imported package", children listed before their
+    # parent and indented two more spaces: collect the direct imports preceding `module`
+    imports, children = [], []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative) / 1e6, name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                imports = children
+            children = []
+    imports.sort(reverse=True)
+    report["imports"] = {name: round(seconds, 4) for seconds, name in imports[:top]}
+    report["mode"] = mode
+
+    print(f"⏱ Start-up profile of '{module}' (STARTUP_MODE={mode})")
+    print(f"  import {module}: {report['import_s'] * 1000:8.1f} ms")
+    for name, seconds in report["imports"].items():
+        print(f"    {name:<32} {seconds * 1000:8.1f} ms")
+    print("  resources (first use):")
+    for name, item in report["resources"].items():
+        state = f"{item['init_ms']:8.1f} ms" if item["init_ms"] is not None else f"  failed: {item['error']}"
+        print(f"    {name:<32} {state}")
+    print(f"  import + all resources: {report['total_s'] * 1000:8.1f} ms")
+    return report
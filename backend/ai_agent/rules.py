@@ -0,0 +1,314 @@
+"""
+Vectorized alert rules.
+
+Daily precipitation of many locations is loaded into (locations × days) NumPy matrices, one for
+the observed past (right-aligned, most recent day last) and one for the forecast (left-aligned,
+today first); days a location does not have are NaN. Each rule is then evaluated for every
+location in one pass, and only the messages are formatted per location.
+
+A rule is a dict:
+    series      "past" or "forecast"
+    kind        "threshold"        flag when any day has precip >= threshold
+                "consecutive_dry"  flag when `days` days in a row have precip < threshold
+                                   (days missing from the series count as dry)
+                "rolling_sum"      flag when any `days`-day sum is >= threshold (op "above")
+                                   or < threshold (op "below")
+    window      days of the series looked at (past: the most recent ones; None: all of it)
+    threshold, days, op
+    flag_message, clear_message   str.format templates with {location}, {window}, {days},
+                                  {threshold}, {count}, {value} and {day_list}
+
+DEFAULT_RULES reproduce the original pesticide and irrigation checks. ALERT_RULES_FILE may
+point to a JSON file overriding them globally, per region and per crop (most specific wins):
+    {"defaults": {"irrigation": {"window": 7, "days": 7}},
+     "region": {"pune": {"pesticide": {"threshold": 2.5}}},
+     "crop": {"rice": {"irrigation": {"kind": "rolling_sum", "op": "below", "threshold": 20}}}}
+The region defaults to the normalized location. Past windows longer than weather.PAST_DAYS
+need a get_precip_history() lookback instead of get_daily_precip().
+
+Run from the backend folder:
+    python -m ai_agent.rules --locations 100000
+"""
+import argparse
+import datetime
+import json
+import os
+import time
+
+import numpy as np
+
+from ai_agent.metrics import end_trace, span, start_trace
+from ai_agent.weather import FORECAST_DAYS, PAST_DAYS, normalize_location
+
+RULES_FILE = os.getenv("ALERT_RULES_FILE")
+
+DEFAULT_RULES = {
+    "pesticide": {
+        "series": "forecast",
+        "kind": "threshold",
+        "threshold": 1.0,
+        "window": None,
+        "flag_message": "🌧 Rain expected on {count} day(s): {day_list}.\n❌ Do NOT spray pesticides.",
+        "clear_message": "✅ No significant rain expected → Safe to spray pesticides in next {window} days.",
+    },
+    "irrigation": {
+        "series": "past",
+        "kind": "consecutive_dry",
+        "threshold": 1.0,
+        "window": PAST_DAYS,
+        "days": PAST_DAYS,
+        "flag_message": "💧 Irrigation Alert: No rain in last {window} days at {location}. Consider irrigating crops.",
+        "clear_message": "✅ Irrigation not required. Recent rain sufficient at {location}.",
+    },
+}
+
+
+def load_overrides(path: str = RULES_FILE):
+    """
+    Returns: the parsed ALERT_RULES_FILE ({} when unset), with the region keys normalized like
+    locations and the crop keys lowercased, the way rules_for() looks them up.
+    """
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        overrides = json.load(f)
+    if "region" in overrides:
+        overrides["region"] = {normalize_location(region): rules for region, rules in overrides["region"].items()}
+    if "crop" in overrides:
+        overrides["crop"] = {crop.lower(): rules for crop, rules in overrides["crop"].items()}
+    return overrides
+
+
+OVERRIDES = load_overrides()
+_resolved = {}
+
+
+def rules_for(crop: str = None, region: str = None):
+    """Returns: {alert_type: rule} after applying the default, region and crop overrides."""
+    # Only regions/crops that have overrides get their own entry, so locations share rule dicts
+    crop = (crop or "").lower()
+    crop = crop if crop in OVERRIDES.get("crop", {}) else None
+    region = normalize_location(region) if region else None
+    region = region if region in OVERRIDES.get("region", {}) else None
+    key = (crop, region)
+    rules = _resolved.get(key)
+    if rules is None:
+        layers = [OVERRIDES.get("defaults", {}),
+                  OVERRIDES.get("region", {}).get(region or "", {}),
+                  OVERRIDES.get("crop", {}).get(crop or "", {})]
+        rules = {}
+        for alert_type, rule in DEFAULT_RULES.items():
+            rule = dict(rule)
+            for layer in layers:
+                rule.update(layer.get(alert_type, {}))
+            rules[alert_type] = rule
+        _resolved[key] = rules
+    return rules
+
+
+# ---------------------------
+# Matrices
+# ---------------------------
+def _matrix(series, align: str):
+    """
+    Returns: (values, lengths) where values is a float (len(series) × longest) matrix,
+    left- or right-aligned, NaN where a location has no day. A None precip counts as 0 mm.
+    """
+    lengths = np.fromiter((len(days) for days in series), dtype=np.int64, count=len(series))
+    width = int(lengths.max()) if len(series) else 0
+    flat = np.fromiter((d.get("precip") or 0 for days in series for d in days), dtype=float,
+                       count=int(lengths.sum()))
+    values = np.full((len(series), width), np.nan)
+    columns = np.arange(width)
+    mask = columns < lengths[:, None] if align == "left" else columns >= (width - lengths)[:, None]
+    values[mask] = flat
+    return values, lengths
+
+
+def _window(values, window, align: str):
+    """Returns: the columns a rule looks at, NaN-padded to `window` columns."""
+    if window is None:
+        return values
+    if values.shape[1] < window:
+        pad = np.full((values.shape[0], window - values.shape[1]), np.nan)
+        return np.hstack([values, pad] if align == "left" else [pad, values])
+    return values[:, :window] if align == "left" else values[:, values.shape[1] - window:]
+
+
+# ---------------------------
+# Rule kinds: (window values, rule) -> (flag, value, hit per day or None)
+# ---------------------------
+def _threshold(x, rule):
+    hit = x >= rule["threshold"]  # NaN compares False
+    return hit.any(axis=1), hit.sum(axis=1), hit
+
+
+def _consecutive_dry(x, rule):
+    dry = ~(x >= rule["threshold"])
+    run = np.zeros(x.shape[0], dtype=np.int64)
+    longest = np.zeros(x.shape[0], dtype=np.int64)
+    for column in dry.T:
+        run = (run + 1) * column
+        np.maximum(longest, run, out=longest)
+    return longest >= rule.get("days", x.shape[1]), longest, None
+
+
+def _rolling_sum(x, rule):
+    days = min(rule.get("days", x.shape[1]), x.shape[1]) or 1
+    cumulative = np.zeros((x.shape[0], x.shape[1] + 1))
+    np.cumsum(np.nan_to_num(x), axis=1, out=cumulative[:, 1:])
+    sums = cumulative[:, days:] - cumulative[:, :-days]
+    if rule.get("op", "above") == "below":
+        value = sums.min(axis=1)
+        return value < rule["threshold"], value, None
+    value = sums.max(axis=1)
+    return value >= rule["threshold"], value, None
+
+
+KINDS = {"threshold": _threshold, "consecutive_dry": _consecutive_dry, "rolling_sum": _rolling_sum}
+
+
+# ---------------------------
+# Evaluation
+# ---------------------------
+def _day_lists(days_of, rows, x, hits, flags, align: str, labels):
+    """
+    Returns: {i: 'Oct 17 (2.5 mm), ...'} for the flagged rows i of a pass, built only from the
+    hit cells (np.nonzero, grouped by row); `labels` memoizes the date formatting.
+    """
+    r, c = np.nonzero(hits & flags[:, None])
+    if not len(r):
+        return {}
+    width = x.shape[1]
+    parts = []
+    for i, column, mm in zip(r.tolist(), c.tolist(), x[r, c].tolist()):
+        days = days_of[rows[i]]
+        # Column 0 of the window is day 0 (forecast) or day len - width (past) of this location's series
+        date = days[column if align == "left" else len(days) - width + column]["datetime"]
+        label = labels.get(date)
+        if label is None:
+            label = labels[date] = datetime.date.fromisoformat(date).strftime("%b %d")
+        parts.append(f"{label} ({mm:.1f} mm)")
+    # nonzero() is row-major, so each row's hits are one contiguous run
+    starts = np.flatnonzero(np.r_[True, r[1:] != r[:-1]]).tolist()
+    ends = starts[1:] + [len(parts)]
+    return {row: ", ".join(parts[start:end]) for row, start, end in zip(r[starts].tolist(), starts, ends)}
+
+
+def evaluate(weathers, contexts=None, alert_types=None, rule_overrides=None):
+    """
+    Evaluates the alert rules for many locations at once.
+    `weathers` maps location -> get_daily_precip() result, or the Exception its fetch raised.
+    `contexts` optionally maps location -> {"crop", "region"} for the per-crop/region overrides,
+    `rule_overrides` ({alert_type: {param: value}}) is applied last, to every location.
+    Returns: {location: {alert_type: (flag, message)}}
+    """
+    contexts = contexts or {}
+    results = {location: {} for location in weathers}
+    ok = [location for location, weather in weathers.items() if not isinstance(weather, Exception)]
+    for location, weather in weathers.items():
+        if isinstance(weather, Exception):
+            for alert_type in alert_types or DEFAULT_RULES:
+                results[location][alert_type] = (False, f"❌ Weather API error: {weather}")
+    if not ok:
+        return results
+
+    with span("rules.load"):
+        series = {
+            "past": [weathers[location].get("past", []) for location in ok],
+            "forecast": [weathers[location].get("forecast", []) for location in ok],
+        }
+        matrices = {name: _matrix(days, "right" if name == "past" else "left") for name, days in series.items()}
+
+        # rules_for() hands out shared dicts, so rows with the same overrides group by identity
+        groups = {}
+        for row, location in enumerate(ok):
+            context = contexts.get(location, {})
+            rules = rules_for(context.get("crop"), context.get("region") or location)
+            groups.setdefault(id(rules), (rules, []))[1].append(row)
+
+    passes = []  # (alert_type, rule, rows, window values, flags, counts, hits)
+    with span("rules.evaluate"):
+        for alert_type in alert_types or DEFAULT_RULES:
+            for rules, rows in groups.values():
+                rule = rules[alert_type]
+                if rule_overrides and alert_type in rule_overrides:
+                    rule = {**rule, **rule_overrides[alert_type]}
+                align = "right" if rule["series"] == "past" else "left"
+                values = matrices[rule["series"]][0]
+                if len(rows) < len(ok):
+                    values = values[rows]
+                x = _window(values, rule.get("window"), align)
+                flags, counts, hits = KINDS[rule["kind"]](x, rule)
+                passes.append((alert_type, rule, rows, x, flags, counts, hits))
+
+    with span("rules.messages"):
+        labels = {}
+        for alert_type, rule, rows, x, flags, counts, hits in passes:
+            fields = {
+                "window": rule.get("window") or (FORECAST_DAYS if rule["series"] == "forecast" else PAST_DAYS),
+                "days": rule.get("days"),
+                "threshold": rule["threshold"],
+            }
+            day_lists = {}
+            if hits is not None:
+                align = "right" if rule["series"] == "past" else "left"
+                day_lists = _day_lists(series[rule["series"]], rows, x, hits, flags, align, labels)
+            flag_message, clear_message = rule["flag_message"], rule["clear_message"]
+            for i, (row, flag, count) in enumerate(zip(rows, flags.tolist(), counts.tolist())):
+                location = ok[row]
+                template = flag_message if flag else clear_message
+                message = template.format(location=location, count=int(count), value=count,
+                                          day_list=day_lists.get(i, ""), **fields)
+                results[location][alert_type] = (flag, message)
+    return results
+
+
+def evaluate_one(location: str, weather, alert_type: str, crop: str = None, region: str = None, **rule_overrides):
+    """Returns: (flag, message) of one rule for one location (the single-location checks use this)."""
+    overrides = {alert_type: rule_overrides} if rule_overrides else None
+    contexts = {location: {"crop": crop, "region": region}}
+    return evaluate({location: weather}, contexts=contexts, alert_types=[alert_type],
+                    rule_overrides=overrides)[location][alert_type]
+
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def _synthetic(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    today = datetime.date.today()
+    past_days = [(today - datetime.timedelta(days=PAST_DAYS - i)).isoformat() for i in range(PAST_DAYS)]
+    forecast_days = [(today + datetime.timedelta(days=i)).isoformat() for i in range(FORECAST_DAYS + 1)]
+    shape = (n, PAST_DAYS + FORECAST_DAYS + 1)
+    rain = np.where(rng.random(shape) < 0.1, rng.choice([0.4, 2.5, 8.0, 20.0], size=shape), 0.0)
+    return {
+        f"location {i}": {
+            "past": [{"datetime": d, "precip": p} for d, p in zip(past_days, rain[i, :PAST_DAYS].tolist())],
+            "forecast": [{"datetime": d, "precip": p} for d, p in zip(forecast_days, rain[i, PAST_DAYS:].tolist())],
+        }
+        for i in range(n)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the vectorized alert rules on synthetic locations")
+    parser.add_argument("--locations", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    weathers = _synthetic(args.locations, args.seed)
+    trace, token = start_trace()
+    started = time.perf_counter()
+    results = evaluate(weathers)
+    elapsed = time.perf_counter() - started
+    end_trace(token)
+    flagged = {t: sum(r[t][0] for r in results.values()) for t in DEFAULT_RULES}
+    print(f"✅ {args.locations} locations evaluated in {elapsed * 1000:.1f} ms "
+          f"({elapsed / max(args.locations, 1) * 1e6:.2f} µs/location), flagged: {flagged}")
+    for name, duration in trace.spans:
+        print(f"  {name:<16} {duration * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Background alert sweep for subscribed farmers.
+
+Run from the backend folder:
+    python -m ai_agent.scheduler add --location Pune --phone +9190000000 --types pesticide,irrigation --crop rice
+    python -m ai_agent.scheduler list
+    python -m ai_agent.scheduler sweep            # one sweep now
+    python -m ai_agent.scheduler run --interval 3600
+"""
+import argparse
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import as_completed
+
+from ai_agent.alerts import ALERT_CHECKS, BATCH_WORKERS, batch_pool, evaluate_locations, send_sms_async
+from ai_agent.weather import get_daily_precip, normalize_location
+
+DB_PATH = os.getenv("SUBSCRIPTIONS_DB", "subscriptions.db")
+SWEEP_INTERVAL = float(os.getenv("SWEEP_INTERVAL", "3600"))  # seconds
+ALERT_TYPES = [alert_type for _, alert_type, _, _, _ in ALERT_CHECKS]
+
+logger = logging.getLogger(__name__)
+
+last_sweep = {}
+
+
+def connect(path: str = DB_PATH):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            location TEXT NOT NULL,
+            location_key TEXT NOT NULL,
+            phone_number TEXT NOT NULL,
+            alert_types TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            crop TEXT,
+            region TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_location ON subscriptions(location_key);
+        CREATE TABLE IF NOT EXISTS alert_state (
+            subscription_id INTEGER NOT NULL,
+            alert_type TEXT NOT NULL,
+            flag INTEGER NOT NULL,
+            message TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (subscription_id, alert_type)
+        );
+    """)
+    # Databases created before crop/region existed get the columns (NULL: no per-crop/region rules)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(subscriptions)")}
+    for column in ("crop", "region"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE subscriptions ADD COLUMN {column} TEXT")
+    conn.commit()
+    return conn
+
+
+# ---------------------------
+# Subscription store
+# ---------------------------
+def add_subscription(conn, location: str, phone_number: str, alert_types=None, crop: str = None, region: str = None):
+    """
+    `crop` and `region` select the per-crop/region overrides of ALERT_RULES_FILE for this
+    subscription; the region defaults to the normalized location.
+    Returns: the subscription id
+    """
+    alert_types = alert_types or ALERT_TYPES
+    unknown = set(alert_types) - set(ALERT_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown alert types: {', '.join(sorted(unknown))}")
+    cur = conn.execute(
+        "INSERT INTO subscriptions (location, location_key, phone_number, alert_types, created_at, crop, region) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (location, normalize_location(location), phone_number, ",".join(alert_types),
+         datetime.datetime.now().isoformat(timespec="seconds"),
+         crop.strip().lower() if crop and crop.strip() else None,
+         normalize_location(region) if region and region.strip() else None),
+    )
+    conn.commit()
+    return cur.lastrowid
+
+
+def remove_subscription(conn, subscription_id: int):
+    conn.execute("DELETE FROM alert_state WHERE subscription_id = ?", (subscription_id,))
+    cur = conn.execute("DELETE FROM subscriptions WHERE id = ?", (subscription_id,))
+    conn.commit()
+    return cur.rowcount > 0
+
+
+def list_subscriptions(conn):
+    return conn.execute(
+        "SELECT id, location, phone_number, alert_types, crop, region, created_at FROM subscriptions ORDER BY id"
+    ).fetchall()
+
+
+# ---------------------------
+# Sweep
+# ---------------------------
+def _fetch(location: str):
+    started = time.monotonic()
+    weather = get_daily_precip(location)
+    return weather, time.monotonic() - started
+
+
+def sweep(conn, send: bool = True, scheduled_at: float = None):
+    """
+    Evaluates every subscription once, grouped by normalized location, and queues an SMS
+    for each alert whose flag changed since the previous sweep (first sweep: only raised alerts).
+    Weather is fetched once per location on the batch pool; the rules then run vectorized, one pass
+    per distinct (crop, region) of the subscriptions, so each gets its per-crop/region overrides.
+    Returns: metrics dict for the sweep.
+    """
+    started_wall = time.time()
+    started = time.monotonic()
+
+    groups = {}
+    for sub_id, location, location_key, phone_number, alert_types, crop, region in conn.execute(
+            "SELECT id, location, location_key, phone_number, alert_types, crop, region FROM subscriptions"):
+        groups.setdefault(location_key, {"location": location, "subs": []})["subs"].append(
+            (sub_id, phone_number, alert_types.split(","), (crop, region)))
+
+    previous = {(sub_id, alert_type): bool(flag) for sub_id, alert_type, flag in
+                conn.execute("SELECT subscription_id, alert_type, flag FROM alert_state")}
+
+    metrics = {
+        "started_at": datetime.datetime.fromtimestamp(started_wall).isoformat(timespec="seconds"),
+        "lag_s": round(max(0.0, started_wall - scheduled_at), 3) if scheduled_at else 0.0,
+        "subscriptions": sum(len(g["subs"]) for g in groups.values()),
+        "locations": len(groups),
+        "locations_failed": 0,
+        "state_changes": 0,
+        "sms_queued": 0,
+        "max_location_s": 0.0,
+        "rules_s": 0.0,
+    }
+
+    pending = iter(groups.values())
+    in_flight = {}
+
+    def submit_next():
+        group = next(pending, None)
+        if group is not None:
+            in_flight[batch_pool.submit(_fetch, group["location"])] = group
+
+    for _ in range(2 * BATCH_WORKERS):
+        submit_next()
+
+    fetched = {}
+    while in_flight:
+        future = next(as_completed(in_flight))
+        group = in_flight.pop(future)
+        submit_next()
+        try:
+            weather, elapsed = future.result()
+        except Exception as e:
+            # A failed fetch skips the location instead of flipping its state
+            metrics["locations_failed"] += 1
+            logger.warning("Sweep failed for %s: %s", group["location"], e)
+            continue
+        metrics["max_location_s"] = max(metrics["max_location_s"], round(elapsed, 3))
+        fetched[group["location"]] = (group, weather)
+
+    rules_started = time.monotonic()
+    by_context = {}
+    for location, (group, weather) in fetched.items():
+        for *_, context in group["subs"]:
+            by_context.setdefault(context, {})[location] = weather
+    results = {}
+    for (crop, region), weathers in by_context.items():
+        evaluated = evaluate_locations(
+            weathers, contexts={location: {"crop": crop, "region": region} for location in weathers})
+        for location, notifications in evaluated.items():
+            results[location, crop, region] = notifications
+    metrics["rules_s"] = round(time.monotonic() - rules_started, 3)
+
+    now = datetime.datetime.now().isoformat(timespec="seconds")
+    updates = []
+    for location, (group, _) in fetched.items():
+        for sub_id, phone_number, alert_types, context in group["subs"]:
+            by_type = {n["type"]: n for n in results[(location, *context)]}
+            messages = []
+            for alert_type in alert_types:
+                notification = by_type.get(alert_type)
+                if notification is None:
+                    continue
+                flag = bool(notification["actionRequired"])
+                before = previous.get((sub_id, alert_type))
+                if before == flag:
+                    continue
+                updates.append((sub_id, alert_type, int(flag), notification["message"], now))
+                metrics["state_changes"] += 1
+                if flag or before is not None:
+                    messages.append(notification["message"])
+            if send and messages:
+                send_sms_async(phone_number, messages)
+                metrics["sms_queued"] += len(messages)
+
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO alert_state (subscription_id, alert_type, flag, message, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)", updates)
+
+    duration = time.monotonic() - started
+    metrics["duration_s"] = round(duration, 3)
+    metrics["subscriptions_per_s"] = round(metrics["subscriptions"] / duration, 1) if duration else 0.0
+    last_sweep.clear()
+    last_sweep.update(metrics)
+    logger.info("Sweep done: %s", metrics)
+    return metrics
+
+
+def run_forever(interval: float = SWEEP_INTERVAL, send: bool = True, stop_event: threading.Event = None):
+    """
+    Sweeps on a fixed cadence; a slow sweep shows up as lag on the next one instead of drift.
+    A sweep that raises is logged and the loop keeps its cadence.
+    """
+    stop_event = stop_event or threading.Event()
+    conn = connect()
+    next_run = time.time()
+    while not stop_event.is_set():
+        try:
+            sweep(conn, send=send, scheduled_at=next_run)
+        except Exception:
+            logger.exception("Sweep crashed, retrying at the next interval")
+        next_run += interval
+        # If a sweep overran whole intervals, skip them rather than sweeping back to back
+        while next_run < time.time():
+            next_run += interval
+        stop_event.wait(max(0.0, next_run - time.time()))
+
+
+def start_background(interval: float = SWEEP_INTERVAL, send: bool = True):
+    """Starts the sweep loop in a daemon thread. Returns the event that stops it."""
+    stop_event = threading.Event()
+    threading.Thread(target=run_forever, args=(interval, send, stop_event),
+                     name="alert-sweep", daemon=True).start()
+    return stop_event
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scheduled alert sweep for subscribed farmers")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    add = sub.add_parser("add", help="Add a subscription")
+    add.add_argument("--location", required=True)
+    add.add_argument("--phone", required=True)
+    add.add_argument("--types", default=",".join(ALERT_TYPES), help="Comma separated alert types")
+    add.add_argument("--crop", help="Crop for the per-crop rule overrides")
+    add.add_argument("--region", help="Region for the per-region rule overrides (default: the location)")
+
+    remove = sub.add_parser("remove", help="Remove a subscription")
+    remove.add_argument("id", type=int)
+
+    sub.add_parser("list", help="List subscriptions")
+
+    sweep_cmd = sub.add_parser("sweep", help="Run one sweep now")
+    sweep_cmd.add_argument("--no-sms", action="store_true")
+
+    run = sub.add_parser("run", help="Sweep on a fixed cadence")
+    run.add_argument("--interval", type=float, default=SWEEP_INTERVAL, help="Seconds between sweeps")
+    run.add_argument("--no-sms", action="store_true")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    conn = connect()
+
+    if args.command == "add":
+        sub_id = add_subscription(conn, args.location, args.phone, [t.strip() for t in args.types.split(",") if t.strip()],
+                                  crop=args.crop, region=args.region)
+        print(f"✅ Subscription {sub_id} added")
+    elif args.command == "remove":
+        print("✅ Removed" if remove_subscription(conn, args.id) else "⚠️ No such subscription")
+    elif args.command == "list":
+        for row in list_subscriptions(conn):
+            print(*row, sep=" | ")
+    elif args.command == "sweep":
+        sweep(conn, send=not args.no_sms)
+    elif args.command == "run":
+        run_forever(args.interval, send=not args.no_sms)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-from pesticide import rain_alert_for_pesticide
-from irrigation import check_irrigation
-from utils import send_sms
+# Run from the backend folder: python -m ai_agent.test_alerts
+from ai_agent.pesticide import rain_alert_for_pesticide
+from ai_agent.irrigation import check_irrigation
+from ai_agent.utils import send_sms
 
 # Configuration
 location = "Pune"
@@ -12,7 +13,7 @@ print(pesticide_message)
 if pesticide_alert:
     send_sms(phone_number, pesticide_message)
 
-# Irrigation alert
+# Irrigation alert (served from the same cached weather fetch)
 irrigation_needed, irrigation_message = check_irrigation(location)
 print(irrigation_message)
 if irrigation_needed:
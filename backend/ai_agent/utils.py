@@ -1,23 +1,33 @@
-from twilio.rest import Client
+import logging
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_NUMBER = os.getenv("TWILIO_NUMBER")
+TWILIO_API_BASE_URL = os.getenv("TWILIO_API_BASE_URL", "https://api.twilio.com")
+
+
+def mask_phone(phone_number: str) -> str:
+    """Returns: the number for logs, with all but the country code and last 4 digits masked."""
+    number = "".join(str(phone_number or "").split())
+    if len(number) <= 7:
+        return "*" * len(number)
+    return number[:3] + "*" * (len(number) - 7) + number[-4:]
 
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
 def send_sms(to_number: str, message: str):
     """
-    Sends SMS using Twilio.
+    Queues an SMS in the durable outbox (ai_agent/outbox.py); its workers deliver it via Twilio.
+    The same message to the same number within SMS_DEDUPE_WINDOW is sent only once.
+    Returns: True when queued (or already queued recently), False if it could not be queued.
     """
+    # Imported here: the outbox reads the Twilio settings above
+    from ai_agent.outbox import get_outbox
     try:
-        msg = client.messages.create(body=message, from_=TWILIO_NUMBER, to=to_number)
-        print(f"✅ SMS sent! SID: {msg.sid}")
+        get_outbox().enqueue(to_number, message)
         return True
-    except Exception as e:
-        print(f"❌ Failed to send SMS: {e}")
+    except Exception:
+        logger.exception("Failed to queue SMS to %s", mask_phone(to_number))
         return False
@@ -0,0 +1,186 @@
+import asyncio
+import datetime
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ai_agent.cache import TTLCache, SingleFlight
+from ai_agent.metrics import span
+from ai_agent.registry import registry
+import ai_agent.precip_store  # noqa: F401  (registers "precip_store")
+
+API_KEY = os.getenv("VISUAL_CROSSING_API_KEY")
+BASE_URL = os.getenv(
+    "VISUAL_CROSSING_BASE_URL",
+    "https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline",
+)
+
+PAST_DAYS = 10
+FORECAST_DAYS = 14
+CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "1800"))  # seconds
+REQUEST_TIMEOUT = 10
+
+# One pooled session for every Visual Crossing call (keeps TCP/TLS connections alive)
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+_cache = TTLCache(ttl=CACHE_TTL)
+_inflight = SingleFlight()
+stats = {"hits": 0, "misses": 0, "upstream_calls": 0, "days_fetched": 0}
+
+
+def normalize_location(location: str) -> str:
+    """Lowercases and collapses whitespace so 'Pune ' and 'pune' share one cache entry."""
+    return " ".join(str(location).strip().lower().split())
+
+
+def _request(location: str, start: datetime.date, end: datetime.date):
+    """Returns: (url, params) of one timeline call for the days start..end (inclusive)."""
+    url = f"{BASE_URL}/{location}/{start}/{end}"
+    params = {
+        "key": API_KEY,
+        "unitGroup": "metric",
+        "include": "days",
+        "elements": "datetime,precip",
+    }
+    return url, params
+
+
+def _window(location: str, today: datetime.date):
+    """
+    Returns: (start, end) of the timeline call for the past + forecast window. Past days already
+    final in the precipitation store are skipped, so normally only the last few days are re-fetched.
+    """
+    past_start = today - datetime.timedelta(days=PAST_DAYS)
+    start = registry.get("precip_store").missing_since(location, past_start, today) or today
+    return start, today + datetime.timedelta(days=FORECAST_DAYS)
+
+
+def _parse(payload, location: str, today: datetime.date):
+    """Stores the observed days, then answers `past` from the store and `forecast` from the payload."""
+    days = payload.get("days", [])
+    stats["days_fetched"] += len(days)
+    store = registry.get("precip_store")
+    store.upsert(location, days, today)
+    today_iso = today.isoformat()
+    return {
+        "location": location,
+        "fetched_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "past": store.history(location, today - datetime.timedelta(days=PAST_DAYS), today),
+        "forecast": [d for d in days if d.get("datetime", "") >= today_iso],
+    }
+
+
+def _get_json(url: str, params):
+    stats["upstream_calls"] += 1
+    with span("visual_crossing"):
+        res = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        res.raise_for_status()
+        return res.json()
+
+
+def _fetch(location: str, today: datetime.date):
+    url, params = _request(location, *_window(location, today))
+    return _parse(_get_json(url, params), location, today)
+
+
+def get_daily_precip(location: str):
+    """
+    Returns daily precipitation for the last 10 days and the next 14 days (today included)
+    from a single Visual Crossing timeline call.
+    Results are cached per normalized location for WEATHER_CACHE_TTL seconds and concurrent
+    requests for the same location share one in-flight fetch.
+    Returns: {"location", "fetched_at", "past": [{"datetime", "precip"}], "forecast": [...]}
+    Raises: requests exceptions on upstream failure (failures are never cached).
+    """
+    today = datetime.date.today()
+    key = (normalize_location(location), today)
+
+    cached = _cache.get(key)
+    if cached is not None:
+        stats["hits"] += 1
+        return cached
+
+    def load():
+        # Another thread may have filled the cache while we waited for the lock
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+        data = _fetch(key[0], today)
+        _cache.set(key, data)
+        return data
+
+    stats["misses"] += 1
+    return _inflight.do(key, load)
+
+
+_async_inflight = {}
+
+
+async def aget_daily_precip(location: str, client):
+    """
+    Async variant of get_daily_precip for the ASGI service, using a pooled httpx.AsyncClient.
+    Shares the same TTL cache; concurrent requests for one location await one in-flight task.
+    """
+    today = datetime.date.today()
+    key = (normalize_location(location), today)
+
+    cached = _cache.get(key)
+    if cached is not None:
+        stats["hits"] += 1
+        return cached
+
+    stats["misses"] += 1
+    task = _async_inflight.get(key)
+    if task is None:
+        async def load():
+            try:
+                # The precip store (built on first use) is SQLite: keep it off the event loop
+                url, params = _request(key[0], *await asyncio.to_thread(_window, key[0], today))
+                stats["upstream_calls"] += 1
+                with span("visual_crossing"):
+                    res = await client.get(url, params=params, timeout=REQUEST_TIMEOUT)
+                    res.raise_for_status()
+                    payload = res.json()
+                data = await asyncio.to_thread(_parse, payload, key[0], today)
+                _cache.set(key, data)
+                return data
+            finally:
+                _async_inflight.pop(key, None)
+
+        task = asyncio.ensure_future(load())
+        _async_inflight[key] = task
+    # shield: one cancelled caller must not cancel the fetch the others are waiting on
+    return await asyncio.shield(task)
+
+
+def get_precip_history(location: str, days: int):
+    """
+    Returns the observed daily precipitation of the last `days` days (today excluded), oldest first,
+    answered from the local store. Only days missing from it, or not yet final, are fetched.
+    Returns: [{"datetime", "precip"}]
+    """
+    today = datetime.date.today()
+    key = normalize_location(location)
+    start = today - datetime.timedelta(days=days)
+    store = registry.get("precip_store")
+
+    missing = store.missing_since(key, start, today)
+    if missing is not None:
+        def load():
+            # Re-check: a concurrent caller may have filled the range
+            first = store.missing_since(key, start, today)
+            if first is not None:
+                url, params = _request(key, first, today - datetime.timedelta(days=1))
+                payload = _get_json(url, params)
+                stats["days_fetched"] += len(payload.get("days", []))
+                store.upsert(key, payload.get("days", []), today)
+        _inflight.do(("history", key, today, start), load)
+    return store.history(key, start, today)
+
+
+def info():
+    store = registry.get("precip_store").info() if registry.is_loaded("precip_store") else None
+    return {**stats, "cache_entries": len(_cache), "history": store}
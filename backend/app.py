@@ -1,74 +1,72 @@
 import os
-import pandas as pd
-import pickle
-import datetime
+import sys
 import time
-from flask import Flask, request, jsonify
+import json
+import logging
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import markdown  # pip install markdown
-from dotenv import load_dotenv   # for environment variables
 
-# Load environment variables
-load_dotenv()
+# Importing ai_agent loads the .env file (once per process)
+import ai_agent  # noqa: F401
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 
 # AI Agent imports
-from ai_agent.pesticide import rain_alert_for_pesticide
-from ai_agent.irrigation import check_irrigation
-from ai_agent.utils import send_sms
-
-# Soil model (optional for irrigation predictions)
-try:
-    from realmodel import run_model
-except ImportError:
-    run_model = None  # Safe fallback if realmodel.py not present
+from ai_agent.alerts import run_alert_checks, run_batch, send_sms_async
+from ai_agent.outbox import get_outbox
+from ai_agent.weather import info as weather_info
 
 # AI Report (Gemini) import
-from Report import generate_advisory as ai_generate_advisory  
+from Report import generate_advisory as ai_generate_advisory, advisory_version
+
+# Precomputed soil predictions
+from location_index import normalize_address
+from recommendations import parse_search
+from soil import Y_COLUMNS, predict_live
+
+# Chatbot prompt/formatting
+from chat import CHAT_MODEL, BulletLines, chat_prompt, format_reply, sse
+
+# Shared Gemini gateway (rate limiting, bounded concurrency, backoff)
+from ai_agent.llm import LLMUnavailable, gateway
 
-# Gemini imports
-from google import genai
+# Latency histograms, /metrics and per-request traces
+from ai_agent import metrics
+
+# ETag / 304 and gzip/brotli for the deterministic endpoints
+from ai_agent import httpcache
+
+# Datasets, indexes, soil model and chat cache are built by the shared registry (see resources.py)
+from ai_agent.registry import registry, profile_startup
+import resources
 
 # ---------------------------
 # Initialize Flask
 # ---------------------------
 app = Flask(__name__)
 CORS(app)
+metrics.init_flask(app)
+httpcache.init_flask(app)
 
 # ---------------------------
-# Initialize Gemini Client
+# Check Gemini Configuration
 # ---------------------------
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("❌ Missing GEMINI_API_KEY. Please add it to your .env file.")
-
-gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+# A missing key only fails the Gemini endpoints (with a JSON error), not the whole service
+if not os.getenv("GEMINI_API_KEY"):
+    print("⚠️ Missing GEMINI_API_KEY. Please add it to your .env file; AI endpoints will return errors.")
 
 # ---------------------------
-# Load CSV Datasets
+# Load Datasets & Soil Model
 # ---------------------------
-df = pd.read_csv(r"D:\Smart Krishi Advisor\backend\All in One DataSetSwayam01cleaned.csv")
-df["Address"] = df["Address"].astype(str).str.lower()
-df["Region"] = df["Region"].astype(str).str.lower()
-df["Crop"] = df["Crop"].astype(str)
+# python app.py --profile-startup: import/init time breakdown in a fresh interpreter, then exit
+if __name__ == "__main__" and "--profile-startup" in sys.argv:
+    profile_startup("app", mode=os.getenv("STARTUP_MODE", "lazy"))
+    sys.exit(0)
 
-# Byproducts & companies data
-byproducts_df = pd.read_csv('indian_crops_byproducts_with_domains.csv')
-companies_df = pd.read_csv('corrected_companies_with_district.csv')
+# STARTUP_MODE=eager (default) builds everything now, lazy on first use, prewarm in the background
+STARTUP_MODE = registry.start()
 
-# ---------------------------
-# Load Soil Prediction Model
-# ---------------------------
-with open("soil_model.pkl", "rb") as f:
-    saved = pickle.load(f)
-model = saved["model"]
-encoders = saved["encoders"]
-
-y_columns = [
-    "Nitrogen - High","Nitrogen - Medium","Nitrogen - Low",
-    "Phosphorous - High","Phosphorous - Medium","Phosphorous - Low",
-    "Potassium - High","Potassium - Medium","Potassium - Low",
-    "pH - Acidic","pH - Neutral","pH - Alkaline"
-]
+y_columns = Y_COLUMNS
 
 # ---------------------------
 # Location Info Endpoint
@@ -76,33 +74,57 @@ y_columns = [
 @app.route("/location-info", methods=["POST"])
 def location_info():
     data_input = request.get_json()
-    location_input = data_input.get("location", "").strip().lower()
+    # One normalized key (case and whitespace) for every lookup below
+    location_input = normalize_address(data_input.get("location", ""))
 
     if not location_input:
         return jsonify({"error": "No location provided"}), 400
 
-    address_rows = df[df["Address"] == location_input]
-    if address_rows.empty:
-        return jsonify({
+    # Same location, soil CSV and model artifact -> same body
+    etag = httpcache.etag("location-info", resources.soil_version(), location_input)
+    not_modified = httpcache.flask_not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    entry = registry.get("location_index").get(location_input)
+    if entry is None:
+        return httpcache.tag_response(jsonify({
             "Address": location_input,
             "Region": "Unknown",
             "Crops": "No data",
             "Attributes": {k: 0 for k in y_columns}
-        })
+        }), etag)
 
-    address_enc = encoders["Address"].transform([location_input])[0]
-    region_val = encoders["Region"].transform([address_rows["Region"].iloc[0].lower()])[0]
+    model, encoders, soil_table = registry.get("soil_model").get()
+    address = entry["address"]
+    soil = soil_table.get(address)
+    if soil is None:
+        # Address missing from the precomputed table: fall back to the live model
+        region = entry["region"]
+        soil = {"Region": region, "Attributes": predict_live(model, encoders, address, region)}
 
-    predicted = model.predict([[address_enc, region_val]])[0]
-    crops = ", ".join(address_rows["Crop"].unique())
+    crops = ", ".join(entry["crops"])
 
     result = {
         "Address": location_input,
-        "Region": encoders["Region"].inverse_transform([region_val])[0],
+        "Region": soil["Region"],
         "Crops": crops if crops else "No data",
-        "Attributes": {y_columns[i]: round(predicted[i], 2) for i in range(len(y_columns))}
+        "Attributes": soil["Attributes"]
     }
-    return jsonify(result)
+    return httpcache.tag_response(jsonify(result), etag)
+
+# ---------------------------
+# Location Autocomplete Endpoint
+# ---------------------------
+@app.route("/locations/suggest", methods=["GET"])
+def suggest_locations():
+    query = request.args.get("q", "")
+    try:
+        limit = min(max(int(request.args.get("limit", 10)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    return jsonify({"query": query, "suggestions": registry.get("location_index").suggest(query, limit)})
 
 # ---------------------------
 # Unified Alerts Endpoint
@@ -117,63 +139,54 @@ def get_alerts():
     if not location:
         return jsonify({"error": "Location not provided"}), 400
 
-    notifications = []
+    notifications, sms_messages = run_alert_checks(location)
+    response = jsonify(notifications)
 
-    # Pesticide Alert
-    try:
-        pesticide_risk, pesticide_message = rain_alert_for_pesticide(location)
-        notifications.append({
-            "id": "1",
-            "type": "pesticide",
-            "priority": "high" if pesticide_risk else "low",
-            "title": "Pesticide Rain Alert",
-            "message": pesticide_message,
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "actionRequired": pesticide_risk,
-            "isRead": False
-        })
-        if send_sms_flag and phone_number:
-            send_sms(phone_number, pesticide_message)
-    except Exception as e:
-        notifications.append({
-            "id": "1",
-            "type": "pesticide",
-            "priority": "low",
-            "title": "Pesticide Rain Alert",
-            "message": f"❌ Error checking pesticide alert: {e}",
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "actionRequired": False,
-            "isRead": False
-        })
-
-    # Irrigation Alert
-    try:
-        irrigation_needed, irrigation_message = check_irrigation(location)
-        notifications.append({
-            "id": "2",
-            "type": "irrigation",
-            "priority": "high" if irrigation_needed else "low",
-            "title": "Irrigation Alert",
-            "message": irrigation_message,
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "actionRequired": irrigation_needed,
-            "isRead": False
-        })
-        if send_sms_flag and phone_number:
-            send_sms(phone_number, irrigation_message)
-    except Exception as e:
-        notifications.append({
-            "id": "2",
-            "type": "irrigation",
-            "priority": "low",
-            "title": "Irrigation Alert",
-            "message": f"❌ Error checking irrigation: {e}",
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "actionRequired": False,
-            "isRead": False
-        })
-
-    return jsonify(notifications)
+    # Queue SMS (outbox insert) after the response has been sent; outbox workers deliver it
+    if send_sms_flag and phone_number and sms_messages:
+        response.call_on_close(lambda: send_sms_async(phone_number, sms_messages))
+    return response
+
+# ---------------------------
+# Batch Alerts Endpoint
+# ---------------------------
+@app.route("/api/alerts/batch", methods=["POST"])
+def get_alerts_batch():
+    """
+    Accepts {"entries": [{location, phone_number, sms}, ...]} (or the bare list) and streams
+    one JSON line per entry as soon as its location has been evaluated:
+    {"index": 0, "location": "...", "notifications": [...]}
+    """
+    data = request.json
+    entries = data.get("entries") if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "No entries provided"}), 400
+
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not entry.get("location"):
+            return jsonify({"error": f"Location not provided for entry {i}"}), 400
+
+    def generate():
+        for index, entry, notifications, sms_messages in run_batch(entries):
+            phone_number = entry.get("phone_number")
+            if entry.get("sms", False) and phone_number and sms_messages:
+                send_sms_async(phone_number, sms_messages)
+            yield json.dumps({
+                "index": index,
+                "location": entry["location"],
+                "notifications": notifications
+            }, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+# ---------------------------
+# LLM Rate Limit Response
+# ---------------------------
+def llm_unavailable_response(e: LLMUnavailable):
+    """429 (quota) or 503 (Gemini down) with a Retry-After hint instead of holding the worker."""
+    response = jsonify({"error": str(e), "retry_after": e.retry_after})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, e.status
 
 # ---------------------------
 # AI Advisory Report Endpoint
@@ -184,17 +197,26 @@ def generate_advisory():
     pesticide = data.get("pesticide") or data.get("pesticideName")
     crop = data.get("crop") or data.get("cropType")
     disease = data.get("disease") or data.get("diseaseName")
+    input_data = {"pesticide": pesticide, "crop": crop, "disease": disease}
+
+    # Answered before the advisory cache (and Gemini) is touched
+    etag = httpcache.etag("advisory", advisory_version(input_data))
+    not_modified = httpcache.flask_not_modified(etag, httpcache.ADVISORY_MAX_AGE)
+    if not_modified is not None:
+        return not_modified
 
     try:
-        result = ai_generate_advisory({
-            "pesticide": pesticide,
-            "crop": crop,
-            "disease": disease
-        })
-        return jsonify({"report": result})
+        result = ai_generate_advisory(input_data)
+        return httpcache.tag_response(jsonify({"report": result}), etag, httpcache.ADVISORY_MAX_AGE)
+    except LLMUnavailable as e:
+        return llm_unavailable_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/generate-advisory/cache-stats", methods=["GET"])
+def advisory_cache_stats():
+    return jsonify(registry.get("advisory_cache").info())
+
 # ---------------------------
 # Gemini Farmer Chatbot Endpoint
 # ---------------------------
@@ -209,41 +231,97 @@ def chat():
     if not user_message:
         return jsonify({"error": "Message is empty"}), 400
 
-    # Force reply in Marathi with bullet points
-    prompt = (
-        f"Answer the following in **Marathi** using bullet points. "
-        f"Each point should be a complete sentence and clear for a farmer:\n\n{user_message}"
-    )
+    chat_cache = registry.get("chat_cache")
+    cached = chat_cache.lookup(user_message)
+    if cached is not None:
+        return jsonify({"reply": cached[0]})
+
+    prompt = chat_prompt(user_message)
+
+    try:
+        reply_raw = gateway.generate(CHAT_MODEL, prompt)
+    except LLMUnavailable as e:
+        return llm_unavailable_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    # Optional: Convert to proper bullet points
+    reply_formatted = format_reply(reply_raw)
+    chat_cache.add(user_message, reply_formatted)
+
+    return jsonify({"reply": reply_formatted})
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Same request as /chat, answered as Server-Sent Events:
+    "first_token" (time-to-first-token), one "line" per formatted bullet as soon as it is complete,
+    then "done" with the full reply (or "error" if the upstream fails mid-stream).
+    A refused or failed start is answered before the stream, like /chat (429/503 or 500).
+    """
+    data = request.json
+    if not data:
+        return jsonify({"error": "No data received"}), 400
+
+    user_message = data.get("message", "").strip()
+
+    if not user_message:
+        return jsonify({"error": "Message is empty"}), 400
 
-    max_retries = 3
-    retry_delay = 20
+    prompt = chat_prompt(user_message)
+    chat_cache = registry.get("chat_cache")
+    cached = chat_cache.lookup(user_message)
 
-    for attempt in range(max_retries):
+    started = time.perf_counter()
+    chunks = None
+    if cached is None:
+        try:
+            chunks = gateway.stream(CHAT_MODEL, prompt)
+        except LLMUnavailable as e:
+            return llm_unavailable_response(e)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    def generate():
+        if cached is not None:
+            yield sse("first_token", {"ttft_ms": 0.0, "cached": True})
+            for line in cached[0].split("\n"):
+                yield sse("line", {"line": line})
+            yield sse("done", {"reply": cached[0], "ttft_ms": 0.0, "total_ms": 0.0, "cached": True})
+            return
+
+        ttft_ms = None
+        bullets = BulletLines()
         try:
-            response = gemini_client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
-            )
-            reply_raw = response.text
-
-            # Optional: Convert to proper bullet points
-            lines = [line.strip() for line in reply_raw.split("\n") if line.strip()]
-            formatted_lines = []
-            for line in lines:
-                if not line.startswith("-"):
-                    formatted_lines.append(f"- {line}")
-                else:
-                    formatted_lines.append(line)
-
-            reply_formatted = "\n".join(formatted_lines)
-
-            return jsonify({"reply": reply_formatted})
+            for chunk in chunks:
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                    yield sse("first_token", {"ttft_ms": ttft_ms})
+                # Emit every line completed by this chunk, the partial tail waits for the next one
+                for line in bullets.feed(chunk):
+                    yield sse("line", {"line": line})
+            for line in bullets.flush():
+                yield sse("line", {"line": line})
         except Exception as e:
-            error_message = str(e)
-            if "RESOURCE_EXHAUSTED" in error_message and attempt < max_retries - 1:
-                time.sleep(retry_delay)
-            else:
-                return jsonify({"error": error_message}), 500
+            yield sse("error", {"error": str(e)})
+            return
+
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.debug("/chat/stream ttft %s ms, total %s ms", ttft_ms, total_ms)
+        reply_formatted = bullets.reply
+        chat_cache.add(user_message, reply_formatted)
+        yield sse("done", {"reply": reply_formatted, "ttft_ms": ttft_ms, "total_ms": total_ms})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/chat/cache-stats", methods=["GET"])
+def chat_cache_stats():
+    return jsonify(registry.get("chat_cache").info())
+
+@app.route("/api/llm/stats", methods=["GET"])
+def llm_stats():
+    return jsonify(gateway.info())
 
 # ---------------------------
 # Byproduct Companies Recommendations Endpoint
@@ -256,43 +334,60 @@ def get_recommendations():
 
     if not crop_name or not district:
         return jsonify({"error": "Crop name or district not provided"}), 400
+    try:
+        latitude, longitude, radius_km, limit, cursor = parse_search(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    crop_data = byproducts_df[byproducts_df['Crop'].str.lower() == crop_name]
-    if crop_data.empty:
-        return jsonify({"error": f"No data available for crop: {crop_name}"}), 404
-
-    useful_domains = [d.strip() for d in crop_data.iloc[0]['Useful Domains'].split(',')]
-
-    filtered_companies = companies_df[
-        (companies_df['District'].str.lower() == district) &
-        (companies_df['CompanyIndustrialClassification'].isin(useful_domains))
-    ]
-
-    top_companies = filtered_companies.head(10)
+    index = registry.get("recommendation_index")
+    etag = httpcache.etag("recommendations", index.version, crop_name, district,
+                          latitude, longitude, radius_km, limit, cursor)
+    not_modified = httpcache.flask_not_modified(etag)
+    if not_modified is not None:
+        return not_modified
 
-    recommendations = []
-    for _, row in top_companies.iterrows():
-        recommendations.append({
-            "company_name": row['CompanyName'],
-            "address": row['Registered_Office_Address'],
-            "status": row['CompanyStatus'] if 'CompanyStatus' in row else "Unknown",
-            "domain": row['CompanyIndustrialClassification'],
-            "distance": row['Distance'] if 'Distance' in row else 80,
-            "rating": row['StarRating'] if 'StarRating' in row else 4.5
-        })
+    try:
+        recommendations, origin, next_cursor = index.search(
+            crop_name, district, latitude, longitude, limit, radius_km, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if recommendations is None:
+        return jsonify({"error": f"No data available for crop: {crop_name}"}), 404
 
-    if not recommendations:
+    if not recommendations and not cursor:
         return jsonify({"message": f"No companies found in district {district} for crop {crop_name} by-products"}), 404
 
-    return jsonify({"recommendations": recommendations})
+    search = {"mode": "nearest", "origin": origin, "radius_km": radius_km} if origin else {"mode": "district"}
+    return httpcache.tag_response(
+        jsonify({"recommendations": recommendations, "search": search, "next_cursor": next_cursor}), etag)
 
 # ---------------------------
-# Test Endpoint
+# Test / Metrics Endpoints
 # ---------------------------
 @app.route("/api/test", methods=["GET"])
 def test():
     return "✅ Backend is running with Soil, Alerts, AI Advisory, Chatbot & Byproduct APIs!"
 
+@app.route("/api/sms/stats", methods=["GET"])
+def sms_stats():
+    return jsonify(get_outbox().info())
+
+@app.route("/api/weather/stats", methods=["GET"])
+def weather_stats():
+    return jsonify(weather_info())
+
+@app.route("/api/http-cache/stats", methods=["GET"])
+def http_cache_stats():
+    return jsonify(httpcache.info())
+
+@app.route("/api/startup", methods=["GET"])
+def startup_stats():
+    return jsonify({"mode": STARTUP_MODE, "resources": registry.info()})
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
 # ---------------------------
 # Run App
 # ---------------------------
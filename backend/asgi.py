@@ -0,0 +1,444 @@
+"""
+Unified async backend.
+
+Serves every endpoint of app.py (Flask) and by-product-companies.py (FastAPI) from one
+ASGI process with the same request/response shapes:
+    uvicorn asgi:app --host 127.0.0.1 --port 8000
+
+Datasets, indexes and the soil model come from the shared registry (resources.py, STARTUP_MODE),
+Visual Crossing and Gemini are reached through pooled async clients, so slow upstream calls
+never hold a worker thread, and SMS go through the durable outbox (ai_agent/outbox.py).
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from fastapi import BackgroundTasks, FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+import ai_agent  # noqa: F401  loads the .env file (once per process)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger("httpx").setLevel(logging.WARNING)  # one INFO line per pooled upstream call otherwise
+
+import resources
+from ai_agent import httpcache, metrics
+from ai_agent.alerts import ALERT_DEADLINE, BATCH_WORKERS, evaluate_location, send_sms_async
+from ai_agent.llm import LLMUnavailable, gateway
+from ai_agent.registry import profile_startup, registry
+from ai_agent.weather import aget_daily_precip, normalize_location, info as weather_info
+from chat import CHAT_MODEL, BulletLines, chat_prompt, format_reply, sse
+from Report import advisory_version, agenerate_advisory
+from location_index import normalize_address
+from recommendations import parse_search
+from soil import Y_COLUMNS, predict_live
+
+# ---------------------------
+# Shared resources
+# ---------------------------
+# python asgi.py --profile-startup: import/init time breakdown in a fresh interpreter, then exit
+if __name__ == "__main__" and "--profile-startup" in sys.argv:
+    profile_startup("asgi", mode=os.getenv("STARTUP_MODE", "lazy"))
+    sys.exit(0)
+
+STARTUP_MODE = registry.start()
+
+
+async def resource(name: str):
+    """Registry lookup that builds a not-yet-loaded resource on a thread, off the event loop."""
+    if registry.is_loaded(name):
+        return registry.get(name)
+    return await asyncio.to_thread(registry.get, name)
+
+# Pooled async HTTP client for Visual Crossing, created inside the event loop
+http = {}
+# Fire-and-forget SMS enqueue tasks are referenced here until done so they are not garbage collected
+background_tasks = set()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    http["client"] = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+        timeout=10,
+    )
+    yield
+    await http["client"].aclose()
+
+
+app = FastAPI(
+    title="Smart Krishi Advisor API",
+    description="Soil, alerts, AI advisory, chatbot and by-product recommendations",
+    version="2.0.0",
+    lifespan=lifespan,
+)
+
+# gzip/brotli for bodies above HTTP_COMPRESS_MIN_BYTES (innermost, so it sees the final body)
+app.add_middleware(httpcache.CompressionMiddleware)
+
+# Per-request trace ID, Server-Timing spans and route latency histograms
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Enable CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],   # Allow all origins (change in production)
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+class FlaskJSONResponse(JSONResponse):
+    """Renders like Flask's jsonify (NaN allowed), so both backends return identical bodies."""
+
+    def render(self, content) -> bytes:
+        return json.dumps(content, ensure_ascii=False, allow_nan=True).encode("utf-8")
+
+
+def jsonify(content, status_code: int = 200, headers=None):
+    return FlaskJSONResponse(content, status_code=status_code, headers=headers)
+
+
+async def read_json(request: Request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def llm_unavailable_response(e: LLMUnavailable):
+    """429 (quota) or 503 (Gemini down) with a Retry-After hint."""
+    return jsonify({"error": str(e), "retry_after": e.retry_after}, e.status,
+                   headers={"Retry-After": str(e.retry_after)})
+
+
+async def send_sms_all(to_number: str, messages):
+    """Queues the messages in the durable SMS outbox (SQLite insert, run off the event loop)."""
+    await asyncio.to_thread(send_sms_async, to_number, messages)
+
+
+# ---------------------------
+# Location Info Endpoints
+# ---------------------------
+@app.post("/location-info")
+async def location_info(request: Request):
+    data_input = await read_json(request) or {}
+    # One normalized key (case and whitespace) for every lookup below
+    location_input = normalize_address(data_input.get("location", ""))
+
+    if not location_input:
+        return jsonify({"error": "No location provided"}, 400)
+
+    # Same location, soil CSV and model artifact -> same body
+    await resource("soil_model")
+    etag = httpcache.etag("location-info", resources.soil_version(), location_input)
+    not_modified = httpcache.asgi_not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    entry = (await resource("location_index")).get(location_input)
+    if entry is None:
+        return httpcache.tag_response(jsonify({
+            "Address": location_input,
+            "Region": "Unknown",
+            "Crops": "No data",
+            "Attributes": {k: 0 for k in Y_COLUMNS}
+        }), etag)
+
+    model, encoders, soil_table = (await resource("soil_model")).get()
+    address = entry["address"]
+    soil = soil_table.get(address)
+    if soil is None:
+        region = entry["region"]
+        soil = {"Region": region, "Attributes": predict_live(model, encoders, address, region)}
+
+    crops = ", ".join(entry["crops"])
+    return httpcache.tag_response(jsonify({
+        "Address": location_input,
+        "Region": soil["Region"],
+        "Crops": crops if crops else "No data",
+        "Attributes": soil["Attributes"]
+    }), etag)
+
+
+@app.get("/locations/suggest")
+async def suggest_locations(q: str = "", limit: str = "10"):
+    try:
+        limit = min(max(int(limit), 1), 50)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}, 400)
+    return jsonify({"query": q, "suggestions": (await resource("location_index")).suggest(q, limit)})
+
+
+# ---------------------------
+# Alerts Endpoints
+# ---------------------------
+async def alerts_for(location: str, deadline: float = ALERT_DEADLINE):
+    """One pooled async weather fetch (cached, coalesced), then the CPU-only alert checks."""
+    try:
+        weather = await asyncio.wait_for(aget_daily_precip(location, http["client"]), deadline)
+    except asyncio.TimeoutError:
+        return evaluate_location(location, weather_error=TimeoutError(f"timed out after {deadline:g}s"))
+    except Exception as e:
+        return evaluate_location(location, weather_error=e)
+    return evaluate_location(location, weather=weather)
+
+
+@app.post("/api/alerts")
+async def get_alerts(request: Request, background: BackgroundTasks):
+    data = await read_json(request) or {}
+    location = data.get("location")
+    send_sms_flag = data.get("sms", False)
+    phone_number = data.get("phone_number", None)
+
+    if not location:
+        return jsonify({"error": "Location not provided"}, 400)
+
+    notifications, sms_messages = await alerts_for(location)
+
+    # Delivered after the response has been sent
+    if send_sms_flag and phone_number and sms_messages:
+        background.add_task(send_sms_all, phone_number, sms_messages)
+    return jsonify(notifications)
+
+
+@app.post("/api/alerts/batch")
+async def get_alerts_batch(request: Request):
+    data = await read_json(request)
+    entries = data.get("entries") if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "No entries provided"}, 400)
+
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not entry.get("location"):
+            return jsonify({"error": f"Location not provided for entry {i}"}, 400)
+
+    groups = {}
+    for index, entry in enumerate(entries):
+        groups.setdefault(normalize_location(entry["location"]), []).append(index)
+
+    async def generate():
+        pending = iter(groups.values())
+        in_flight = {}
+
+        def submit_next():
+            indexes = next(pending, None)
+            if indexes is not None:
+                in_flight[asyncio.ensure_future(alerts_for(entries[indexes[0]]["location"]))] = indexes
+
+        # Bounded window of locations in flight
+        for _ in range(2 * BATCH_WORKERS):
+            submit_next()
+
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                indexes = in_flight.pop(task)
+                submit_next()
+                notifications, sms_messages = task.result()
+                for index in indexes:
+                    entry = entries[index]
+                    phone_number = entry.get("phone_number")
+                    if entry.get("sms", False) and phone_number and sms_messages:
+                        sms_task = asyncio.ensure_future(send_sms_all(phone_number, sms_messages))
+                        background_tasks.add(sms_task)
+                        sms_task.add_done_callback(background_tasks.discard)
+                    yield json.dumps({
+                        "index": index,
+                        "location": entry["location"],
+                        "notifications": notifications
+                    }, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+# ---------------------------
+# AI Advisory Report Endpoint
+# ---------------------------
+@app.post("/api/generate-advisory")
+async def generate_advisory(request: Request):
+    data = await read_json(request) or {}
+    pesticide = data.get("pesticide") or data.get("pesticideName")
+    crop = data.get("crop") or data.get("cropType")
+    disease = data.get("disease") or data.get("diseaseName")
+    input_data = {"pesticide": pesticide, "crop": crop, "disease": disease}
+
+    # Answered before the advisory cache (and Gemini) is touched
+    etag = httpcache.etag("advisory", advisory_version(input_data))
+    not_modified = httpcache.asgi_not_modified(request, etag, httpcache.ADVISORY_MAX_AGE)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        result = await agenerate_advisory(input_data)
+        return httpcache.tag_response(jsonify({"report": result}), etag, httpcache.ADVISORY_MAX_AGE)
+    except LLMUnavailable as e:
+        return llm_unavailable_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}, 500)
+
+
+# ---------------------------
+# Gemini Farmer Chatbot Endpoints
+# ---------------------------
+@app.post("/chat")
+async def chat(request: Request):
+    data = await read_json(request)
+    if not data:
+        return jsonify({"error": "No data received"}, 400)
+
+    user_message = data.get("message", "").strip()
+
+    if not user_message:
+        return jsonify({"error": "Message is empty"}, 400)
+
+    chat_cache = await resource("chat_cache")
+    cached = chat_cache.lookup(user_message)
+    if cached is not None:
+        return jsonify({"reply": cached[0]})
+
+    try:
+        reply_raw = await gateway.agenerate(CHAT_MODEL, chat_prompt(user_message))
+    except LLMUnavailable as e:
+        return llm_unavailable_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}, 500)
+
+    reply_formatted = format_reply(reply_raw)
+    chat_cache.add(user_message, reply_formatted)
+    return jsonify({"reply": reply_formatted})
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request):
+    data = await read_json(request)
+    if not data:
+        return jsonify({"error": "No data received"}, 400)
+
+    user_message = data.get("message", "").strip()
+
+    if not user_message:
+        return jsonify({"error": "Message is empty"}, 400)
+
+    chat_cache = await resource("chat_cache")
+    cached = chat_cache.lookup(user_message)
+
+    # A refused or failed start is answered before the stream, like /chat (429/503 or 500)
+    started = time.perf_counter()
+    chunks = None
+    if cached is None:
+        try:
+            chunks = await gateway.astream(CHAT_MODEL, chat_prompt(user_message))
+        except LLMUnavailable as e:
+            return llm_unavailable_response(e)
+        except Exception as e:
+            return jsonify({"error": str(e)}, 500)
+
+    async def generate():
+        if cached is not None:
+            yield sse("first_token", {"ttft_ms": 0.0, "cached": True})
+            for line in cached[0].split("\n"):
+                yield sse("line", {"line": line})
+            yield sse("done", {"reply": cached[0], "ttft_ms": 0.0, "total_ms": 0.0, "cached": True})
+            return
+
+        ttft_ms = None
+        bullets = BulletLines()
+        try:
+            async for chunk in chunks:
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                    yield sse("first_token", {"ttft_ms": ttft_ms})
+                for line in bullets.feed(chunk):
+                    yield sse("line", {"line": line})
+            for line in bullets.flush():
+                yield sse("line", {"line": line})
+        except Exception as e:
+            yield sse("error", {"error": str(e)})
+            return
+
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        chat_cache.add(user_message, bullets.reply)
+        yield sse("done", {"reply": bullets.reply, "ttft_ms": ttft_ms, "total_ms": total_ms})
+
+    return StreamingResponse(generate(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ---------------------------
+# Byproduct Companies Recommendations Endpoint
+# ---------------------------
+@app.post("/recommendations")
+async def get_recommendations(request: Request):
+    data = await read_json(request) or {}
+    crop_name = data.get("crop_name", "").strip().lower()
+    district = data.get("district", "").strip().lower()
+
+    if not crop_name or not district:
+        return jsonify({"error": "Crop name or district not provided"}, 400)
+    try:
+        latitude, longitude, radius_km, limit, cursor = parse_search(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
+
+    index = await resource("recommendation_index")
+    etag = httpcache.etag("recommendations", index.version, crop_name, district,
+                          latitude, longitude, radius_km, limit, cursor)
+    not_modified = httpcache.asgi_not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        recommendations, origin, next_cursor = index.search(
+            crop_name, district, latitude, longitude, limit, radius_km, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
+    if recommendations is None:
+        return jsonify({"error": f"No data available for crop: {crop_name}"}, 404)
+
+    if not recommendations and not cursor:
+        return jsonify({"message": f"No companies found in district {district} for crop {crop_name} by-products"}, 404)
+
+    search = {"mode": "nearest", "origin": origin, "radius_km": radius_km} if origin else {"mode": "district"}
+    return httpcache.tag_response(
+        jsonify({"recommendations": recommendations, "search": search, "next_cursor": next_cursor}), etag)
+
+
+# ---------------------------
+# Test Endpoints
+# ---------------------------
+@app.get("/")
+async def home():
+    return {"message": "✅ FastAPI Backend is running!"}
+
+
+@app.get("/api/test")
+async def test():
+    return PlainTextResponse("✅ Backend is running with Soil, Alerts, AI Advisory, Chatbot & Byproduct APIs!")
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/api/stats")
+async def stats():
+    return jsonify({
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "llm": gateway.info(),
+        "chat_cache": registry.get("chat_cache").info() if registry.is_loaded("chat_cache") else None,
+        "advisory_cache": registry.get("advisory_cache").info() if registry.is_loaded("advisory_cache") else None,
+        "datasets": resources.dataset_report(),
+        "startup": {"mode": STARTUP_MODE, "resources": registry.info()},
+        "sms": registry.get("sms_outbox").info() if registry.is_loaded("sms_outbox") else None,
+        "weather": weather_info(),
+        "http_cache": httpcache.info(),
+    })
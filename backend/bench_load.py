@@ -0,0 +1,420 @@
+"""
+End-to-end load test for the Flask (app.py), ASGI (asgi.py) and legacy by-product recommendations
+(by-product-companies.py) backends.
+
+Starts local fakes for Visual Crossing, Gemini and Twilio (fake_upstreams.py), launches the
+backend against them in a subprocess, drives every endpoint at a fixed concurrency and reports
+throughput and p50/p95/p99 latency per endpoint. No real API is called and no real SMS is sent.
+
+Run from the backend folder:
+    python bench_load.py --target all --requests 200 --concurrency 16 --out bench.json
+    python bench_load.py --target asgi --gemini-latency 0.8 --compare bench.json
+
+The backend inherits this environment, so its own settings (e.g. GEMINI_RPM, WEATHER_CACHE_TTL)
+can be varied per run. --compare prints the change against an earlier --out file and exits with status 1 when an
+endpoint's p95 or throughput regressed by more than --threshold.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from fake_upstreams import start_fakes, upstream_env
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Command lines for each target; {port} is filled in at start
+TARGETS = {
+    "flask": [sys.executable, "-m", "flask", "--app", "app", "run",
+              "--host", "127.0.0.1", "--port", "{port}", "--with-threads", "--no-reload"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi:app",
+             "--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+    "byproducts": [sys.executable, "-m", "uvicorn", "by-product-companies:app",
+                   "--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+}
+# Polled until it answers, to time start-up
+READY_PATHS = {"flask": "/api/test", "asgi": "/api/test", "byproducts": "/"}
+TARGET_GROUPS = {"both": ["flask", "asgi"], "all": list(TARGETS)}
+
+PHONE_NUMBER = "+15550001111"  # answered by the Twilio fake
+
+
+# ---------------------------
+# Request inputs
+# ---------------------------
+def load_inputs(seed: int):
+    """
+    Sample addresses, crops and districts from the datasets the backend serves, so requests
+    hit real rows. Falls back to a few well-known values when a dataset is not available.
+    Returns: dict of input lists
+    """
+    rng = random.Random(seed)
+    inputs = {
+        "addresses": ["pune"],
+        "locations": ["Pune", "Nashik", "Nagpur", "Aurangabad", "Kolhapur"],
+        "crops": ["rice"],
+        "districts": ["pune"],
+    }
+    try:
+        import datasets
+        soil = datasets.load("soil")
+        addresses = [str(a) for a in soil["Address"].dropna().unique()]
+        inputs["addresses"] = rng.sample(addresses, min(50, len(addresses)))
+
+        crops = sorted({str(c).strip().lower() for c in datasets.load("byproducts")["Crop"].dropna()})
+        districts = sorted({str(d).strip().lower() for d in datasets.load("companies")["District"].dropna()})
+        inputs["crops"] = rng.sample(crops, min(20, len(crops)))
+        inputs["districts"] = rng.sample(districts, min(20, len(districts)))
+    except Exception as e:
+        print(f"⚠️ Using default inputs ({e})")
+    return inputs
+
+
+def build_endpoints(inputs, target: str, unique: bool, batch_size: int):
+    """
+    Returns: list of (name, method, path, body(i)) for the target.
+    With unique=True every request gets distinct text, so exact-match caches (advisory) miss.
+    """
+    def pick(values, i):
+        return values[i % len(values)]
+
+    def tag(i):
+        return f" #{i}" if unique else ""
+
+    recommendations = ("recommendations", "POST", "/recommendations",
+                       lambda i: {"crop_name": pick(inputs["crops"], i),
+                                  "district": pick(inputs["districts"], i // len(inputs["crops"]))})
+    if target == "byproducts":
+        return [("home", "GET", "/", lambda i: None), recommendations]
+
+    endpoints = [
+        ("location_info", "POST", "/location-info",
+         lambda i: {"location": pick(inputs["addresses"], i)}),
+        ("locations_suggest", "GET", "/locations/suggest",
+         lambda i: {"q": pick(inputs["addresses"], i)[:4], "limit": 10}),
+        ("alerts", "POST", "/api/alerts",
+         lambda i: {"location": pick(inputs["locations"], i), "sms": True, "phone_number": PHONE_NUMBER}),
+        ("alerts_batch", "POST", "/api/alerts/batch",
+         lambda i: {"entries": [{"location": pick(inputs["locations"], i + j)} for j in range(batch_size)]}),
+        ("generate_advisory", "POST", "/api/generate-advisory",
+         lambda i: {"pesticide": "Imidacloprid" + tag(i), "crop": "Cotton", "disease": "Aphids"}),
+        ("chat", "POST", "/chat",
+         lambda i: {"message": "How often should I water my onion crop?" + tag(i)}),
+        ("chat_stream", "POST", "/chat/stream",
+         lambda i: {"message": "When should I spray pesticide on tomatoes?" + tag(i)}),
+        recommendations,
+        ("api_test", "GET", "/api/test", lambda i: None),
+        ("metrics", "GET", "/metrics", lambda i: None),
+    ]
+    if target == "flask":
+        endpoints += [
+            ("advisory_cache_stats", "GET", "/api/generate-advisory/cache-stats", lambda i: None),
+            ("chat_cache_stats", "GET", "/chat/cache-stats", lambda i: None),
+            ("llm_stats", "GET", "/api/llm/stats", lambda i: None),
+            ("sms_stats", "GET", "/api/sms/stats", lambda i: None),
+            ("weather_stats", "GET", "/api/weather/stats", lambda i: None),
+            ("http_cache_stats", "GET", "/api/http-cache/stats", lambda i: None),
+            ("startup", "GET", "/api/startup", lambda i: None),
+        ]
+    else:
+        endpoints += [
+            ("home", "GET", "/", lambda i: None),
+            ("stats", "GET", "/api/stats", lambda i: None),
+        ]
+    return endpoints
+
+
+# ---------------------------
+# Backend process
+# ---------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_backend(target: str, env_overrides, startup_timeout: float):
+    """
+    Launches the target against the fakes and waits for its READY_PATHS entry.
+    Returns: (process, base_url, startup_seconds)
+    """
+    port = free_port()
+    cmd = [part.format(port=port) for part in TARGETS[target]]
+    env = dict(os.environ, **env_overrides)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")]))
+
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = started + startup_timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{target} exited during start-up:\n{proc.stderr.read().decode(errors='replace')[-2000:]}")
+        try:
+            if requests.get(base_url + READY_PATHS[target], timeout=1).ok:
+                # stderr is no longer needed; drain it so a chatty server never blocks on a full pipe
+                threading.Thread(target=proc.stderr.read, daemon=True).start()
+                return proc, base_url, time.perf_counter() - started
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{target} did not answer {READY_PATHS[target]} within {startup_timeout:g}s")
+
+
+def stop_backend(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ---------------------------
+# Load generation
+# ---------------------------
+def percentile(sorted_values, q: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, ttfbs, statuses, failures, wall: float):
+    latencies = sorted(latencies)
+    ttfbs = sorted(ttfbs)
+    count = len(latencies) + failures
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "requests": count,
+        "ok": sum(n for code, n in statuses.items() if int(code) < 400),
+        "failures": failures,
+        "status": dict(sorted(statuses.items())),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+        "ttfb_ms_p50": ms(percentile(ttfbs, 50)),
+    }
+
+
+def drive(base_url: str, endpoint, total: int, concurrency: int, timeout: float, warmup: int):
+    """
+    Sends `total` requests to one endpoint from `concurrency` workers, each holding a
+    keep-alive session. The body is read completely, so streaming endpoints are timed to the end.
+    Returns: summary dict
+    """
+    name, method, path, body = endpoint
+    local = threading.local()
+    lock = threading.Lock()
+    latencies, ttfbs, statuses = [], [], {}
+    failures = 0
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def one(i):
+        nonlocal failures
+        payload = body(i)
+        started = time.perf_counter()
+        try:
+            if method == "GET":
+                res = session().get(base_url + path, params=payload, timeout=timeout, stream=True)
+            else:
+                res = session().post(base_url + path, json=payload, timeout=timeout, stream=True)
+            ttfb = time.perf_counter() - started
+            for _ in res.iter_content(chunk_size=65536):
+                pass
+            elapsed = time.perf_counter() - started
+        except requests.RequestException:
+            with lock:
+                failures += 1
+            return
+        with lock:
+            latencies.append(elapsed)
+            ttfbs.append(ttfb)
+            code = str(res.status_code)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    def worker(numbers, stop_at):
+        for i in numbers:
+            if i >= stop_at:
+                return
+            one(i)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Warm-up requests (connections, lazy caches) are not counted
+        numbers = itertools.count()
+        list(pool.map(lambda _: worker(numbers, warmup), range(concurrency)))
+        latencies.clear(), ttfbs.clear(), statuses.clear()
+        failures = 0
+
+        # Measured requests continue the input sequence after the warm-up ones
+        numbers = itertools.count(warmup)
+        started = time.perf_counter()
+        list(pool.map(lambda _: worker(numbers, warmup + total), range(concurrency)))
+        wall = time.perf_counter() - started
+
+    return summarize(latencies, ttfbs, statuses, failures, wall)
+
+
+def run_target(target: str, args, fakes, inputs):
+    env = upstream_env(fakes)
+    env.update(
+        ADVISORY_CACHE_DB=os.path.join(args.workdir, f"bench_advisory_cache_{target}.db"),
+        SMS_OUTBOX_DB=os.path.join(args.workdir, f"bench_sms_outbox_{target}.db"),
+        PRECIP_DB=os.path.join(args.workdir, f"bench_precip_history_{target}.db"),
+    )
+    # Weather is fetched per request when the cache is disabled
+    if args.no_weather_cache:
+        env.update(WEATHER_CACHE_TTL="0")
+
+    proc, base_url, startup = start_backend(target, env, args.startup_timeout)
+    print(f"🚀 {target} ready on {base_url} in {startup:.2f}s")
+    results = {"startup_s": round(startup, 3), "endpoints": {}}
+    try:
+        for endpoint in build_endpoints(inputs, target, args.unique, args.batch_size):
+            name = endpoint[0]
+            if args.endpoints and name not in args.endpoints:
+                continue
+            before = {n: f.requests for n, f in fakes.items()}
+            summary = drive(base_url, endpoint, args.requests, args.concurrency, args.timeout, args.warmup)
+            summary["upstream_requests"] = {n: f.requests - before[n] for n, f in fakes.items()}
+            results["endpoints"][name] = summary
+            lat = summary["latency_ms"]
+            print(f"  {name:<22} {summary['throughput_rps'] or 0:>9.1f} req/s  "
+                  f"p50 {lat['p50'] or 0:>8.1f}  p95 {lat['p95'] or 0:>8.1f}  p99 {lat['p99'] or 0:>8.1f} ms  "
+                  f"status {summary['status']}" + (f"  failures {summary['failures']}" if summary["failures"] else ""))
+    finally:
+        stop_backend(proc)
+    return results
+
+
+# ---------------------------
+# Regression comparison
+# ---------------------------
+def compare(baseline, current, threshold: float):
+    """
+    Prints per-endpoint p95 and throughput changes.
+    Returns: list of "target/endpoint: reason" regressions beyond threshold
+    """
+    regressions = []
+    print(f"\n📊 Compared with baseline ({baseline.get('time', '?')})")
+    for target, result in current["targets"].items():
+        base_endpoints = baseline.get("targets", {}).get(target, {}).get("endpoints", {})
+        for name, summary in result["endpoints"].items():
+            base = base_endpoints.get(name)
+            if not base:
+                print(f"  {target}/{name}: new")
+                continue
+            old_p95, new_p95 = base["latency_ms"]["p95"], summary["latency_ms"]["p95"]
+            old_rps, new_rps = base["throughput_rps"], summary["throughput_rps"]
+            p95_change = (new_p95 - old_p95) / old_p95 if old_p95 and new_p95 is not None else 0.0
+            rps_change = (new_rps - old_rps) / old_rps if old_rps and new_rps is not None else 0.0
+            flag = ""
+            if p95_change > threshold:
+                regressions.append(f"{target}/{name}: p95 {old_p95} -> {new_p95} ms")
+                flag = "  ❌"
+            if rps_change < -threshold:
+                regressions.append(f"{target}/{name}: throughput {old_rps} -> {new_rps} req/s")
+                flag = "  ❌"
+            print(f"  {target}/{name:<22} p95 {p95_change:+7.1%}   throughput {rps_change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the backend against local fake upstreams")
+    parser.add_argument("--target", choices=[*TARGETS, *TARGET_GROUPS], default="all",
+                        help="one backend, both (flask + asgi) or all")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per endpoint")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--endpoints", nargs="*", help="only these endpoint names")
+    parser.add_argument("--batch-size", type=int, default=10, help="entries per /api/alerts/batch request")
+    parser.add_argument("--unique", action="store_true", help="distinct advisory/chat text per request so exact-match caches miss")
+    parser.add_argument("--no-weather-cache", action="store_true", help="run the backend with WEATHER_CACHE_TTL=0")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--workdir", default=".cache/bench", help="scratch files (advisory cache, SMS outbox and precipitation history DBs)")
+    for name, flag in [("visual_crossing", "weather"), ("gemini", "gemini"), ("twilio", "twilio")]:
+        parser.add_argument(f"--{flag}-latency", type=float, default=0.05, help=f"{name} fake latency in seconds")
+        parser.add_argument(f"--{flag}-error-rate", type=float, default=0.0, help=f"{name} fake 503 rate (0..1)")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --out")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95/throughput regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    fake_config = {
+        "visual_crossing": {"latency": args.weather_latency, "error_rate": args.weather_error_rate},
+        "gemini": {"latency": args.gemini_latency, "error_rate": args.gemini_error_rate},
+        "twilio": {"latency": args.twilio_latency, "error_rate": args.twilio_error_rate},
+    }
+    fakes = start_fakes(fake_config)
+    inputs = load_inputs(args.seed)
+
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {
+            "requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup,
+            "batch_size": args.batch_size, "unique": args.unique,
+            "no_weather_cache": args.no_weather_cache, "upstreams": fake_config,
+        },
+        "targets": {},
+    }
+    targets = TARGET_GROUPS.get(args.target, [args.target])
+    try:
+        for target in targets:
+            # Fresh scratch DBs so every target (and repeat run) starts from the same cold
+            # advisory cache, outbox and precipitation history
+            for name in ("advisory_cache", "sms_outbox", "precip_history"):
+                db = os.path.join(args.workdir, f"bench_{name}_{target}.db")
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(db + suffix):
+                        os.remove(db + suffix)
+            report["targets"][target] = run_target(target, args, fakes, inputs)
+    finally:
+        for fake in fakes.values():
+            fake.stop()
+    report["upstreams"] = {name: fake.info() for name, fake in fakes.items()}
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+            f.write("\n")
+        print(f"💾 Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print("\n❌ Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\n✅ No regressions beyond threshold")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark: per-request pandas filtering vs the precomputed RecommendationIndex.
+
+Run from the backend folder:
+    python bench_recommendations.py [--byproducts FILE] [--companies FILE] [--queries 500]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+import pandas as pd
+
+from recommendations import RecommendationIndex
+
+
+def recommend_pandas(byproducts_df, companies_df, crop_name, district):
+    """
+    The previous per-request implementation, kept here as the baseline (without its hard-coded
+    distance 80 / rating 4.5 defaults, which the index no longer returns).
+    """
+    crop_data = byproducts_df[byproducts_df['Crop'].str.lower() == crop_name]
+    if crop_data.empty:
+        return None
+
+    useful_domains = [d.strip() for d in crop_data.iloc[0]['Useful Domains'].split(',')]
+
+    filtered_companies = companies_df[
+        (companies_df['District'].str.lower() == district) &
+        (companies_df['CompanyIndustrialClassification'].isin(useful_domains))
+    ]
+
+    recommendations = []
+    for _, row in filtered_companies.head(10).iterrows():
+        recommendations.append({
+            "company_name": row.get("CompanyName", "N/A"),
+            "address": row.get("Registered_Office_Address", "N/A"),
+            "status": row.get("CompanyStatus", "Unknown"),
+            "domain": row.get("CompanyIndustrialClassification", "N/A"),
+            "distance": row.get("Distance"),
+            "rating": row.get("StarRating")
+        })
+    return recommendations
+
+
+def timed(fn, queries):
+    samples = []
+    for crop, district in queries:
+        start = time.perf_counter()
+        fn(crop, district)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[int(len(samples) * 0.95)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--byproducts", default=os.getenv("BYPRODUCTS_FILE", "indian_crops_byproducts_with_domains.csv"))
+    parser.add_argument("--companies", default=os.getenv("COMPANIES_FILE", "corrected_companies_with_district.csv"))
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    byproducts_df = pd.read_csv(args.byproducts)
+    companies_df = pd.read_csv(args.companies)
+    print(f"📦 {len(byproducts_df)} crops, {len(companies_df)} companies")
+
+    start = time.perf_counter()
+    index = RecommendationIndex(byproducts_df, companies_df)
+    build_s = time.perf_counter() - start
+
+    rng = random.Random(args.seed)
+    crops = byproducts_df["Crop"].dropna().astype(str).str.lower().unique().tolist()
+    districts = companies_df["District"].dropna().astype(str).str.lower().unique().tolist()
+    queries = [(rng.choice(crops), rng.choice(districts)) for _ in range(args.queries)]
+
+    # Both implementations must agree before their speed is compared; a geocoded CSV without a
+    # Distance column gets centroid distances from the index only
+    ignored = {"distance"} if "Distance" not in companies_df.columns and "Latitude" in companies_df.columns else set()
+    for crop, district in queries[:100]:
+        expected = recommend_pandas(byproducts_df, companies_df, crop, district)
+        actual = index.recommend(crop, district)
+        if expected is not None:
+            expected = [{k: (None if pd.isna(v) else v) for k, v in r.items() if k not in ignored} for r in expected]
+            actual = [{k: (None if pd.isna(v) else v) for k, v in r.items() if k not in ignored} for r in actual]
+        assert expected == actual, f"Mismatch for {crop} / {district}"
+
+    baseline = timed(lambda c, d: recommend_pandas(byproducts_df, companies_df, c, d), queries)
+    indexed = timed(index.recommend, queries)
+
+    print(f"⏱ Index build: {build_s * 1000:.1f} ms (once per process)")
+    for name, result in (("pandas", baseline), ("index", indexed)):
+        print(f"  {name:<7} mean {result['mean_ms']:.3f} ms | p50 {result['p50_ms']:.3f} ms | p95 {result['p95_ms']:.3f} ms")
+    print(f"🚀 Speed-up (mean): {baseline['mean_ms'] / indexed['mean_ms']:.0f}x over {len(queries)} queries")
+
+
+if __name__ == "__main__":
+    main()
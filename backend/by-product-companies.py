@@ -1,12 +1,22 @@
+"""
+Legacy by-product recommendations service:
+    uvicorn by-product-companies:app
+
+Keeps the original contract of this API: pydantic-validated {crop_name, district} (422 when a
+field is missing), and 200 with an "error" / "message" body when the crop is unknown or no company
+matches. The unified backend (asgi.py) serves the same data with paging and geo search.
+
+Only the by-product and company datasets are loaded, through the shared RecommendationIndex.
+"""
+import asyncio
+
 from fastapi import FastAPI
-from pydantic import BaseModel
-import pandas as pd
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
-import os
+from pydantic import BaseModel
 
-# Load environment variables
-load_dotenv()
+import ai_agent  # noqa: F401  loads the .env file (once per process)
+import resources  # noqa: F401  registers the dataset and index factories
+from ai_agent.registry import registry
 
 # Initialize FastAPI
 app = FastAPI(
@@ -24,57 +34,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# File paths from .env
-BYPRODUCTS_FILE = os.getenv("BYPRODUCTS_FILE", "indian_crops_byproducts_with_domains.csv")
-COMPANIES_FILE = os.getenv("COMPANIES_FILE", "corrected_companies_with_district.csv")
+# STARTUP_MODE=eager (default) loads the datasets now and refuses to start when they are missing
+registry.start(names=["byproducts_df", "companies_df", "recommendation_index"])
 
-# Load datasets globally
-try:
-    byproducts_df = pd.read_csv(BYPRODUCTS_FILE)
-    companies_df = pd.read_csv(COMPANIES_FILE)
-except Exception as e:
-    raise RuntimeError(f"❌ Error loading datasets: {e}")
 
 # Request schema
 class RecommendationRequest(BaseModel):
     crop_name: str
     district: str
 
+
 # Root endpoint
 @app.get("/")
 def home():
     return {"message": "✅ FastAPI Backend is running!"}
 
+
 # Recommendations endpoint
 @app.post("/recommendations")
-def get_recommendations(request: RecommendationRequest):
+async def get_recommendations(request: RecommendationRequest):
     crop_name = request.crop_name.strip().lower()
     district = request.district.strip().lower()
 
-    crop_data = byproducts_df[byproducts_df['Crop'].str.lower() == crop_name]
-    if crop_data.empty:
+    index = registry.get("recommendation_index") if registry.is_loaded("recommendation_index") \
+        else await asyncio.to_thread(registry.get, "recommendation_index")
+    recommendations = index.recommend(crop_name, district)
+    if recommendations is None:
         return {"error": f"No data available for crop: {crop_name}"}
 
-    useful_domains = [d.strip() for d in crop_data.iloc[0]['Useful Domains'].split(',')]
-
-    filtered_companies = companies_df[
-        (companies_df['District'].str.lower() == district) &
-        (companies_df['CompanyIndustrialClassification'].isin(useful_domains))
-    ]
-
-    top_companies = filtered_companies.head(10)
-
-    recommendations = []
-    for _, row in top_companies.iterrows():
-        recommendations.append({
-            "company_name": row.get("CompanyName", "N/A"),
-            "address": row.get("Registered_Office_Address", "N/A"),
-            "status": row.get("CompanyStatus", "Unknown"),
-            "domain": row.get("CompanyIndustrialClassification", "N/A"),
-            "distance": row.get("Distance", 80),
-            "rating": row.get("StarRating", 4.5)
-        })
-
     if not recommendations:
         return {"message": f"No companies found in district {district} for crop {crop_name} by-products"}
 
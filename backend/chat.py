@@ -0,0 +1,51 @@
+import json
+
+CHAT_MODEL = "gemini-2.5-flash"
+
+
+def chat_prompt(user_message: str) -> str:
+    # Force reply in Marathi with bullet points
+    return (
+        f"Answer the following in **Marathi** using bullet points. "
+        f"Each point should be a complete sentence and clear for a farmer:\n\n{user_message}"
+    )
+
+
+def format_bullet(line: str) -> str:
+    line = line.strip()
+    return line if line.startswith("-") else f"- {line}"
+
+
+def format_reply(reply_raw: str) -> str:
+    """Convert to proper bullet points: one '- ' line per non-empty line."""
+    return "\n".join(format_bullet(line) for line in reply_raw.split("\n") if line.strip())
+
+
+def sse(event: str, data) -> str:
+    """One Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class BulletLines:
+    """Incremental format_reply for streamed text: feed() returns every line completed so far."""
+
+    def __init__(self):
+        self.pending = ""
+        self.lines = []
+
+    def feed(self, chunk: str):
+        self.pending += chunk
+        *complete, self.pending = self.pending.split("\n")
+        new = [format_bullet(line) for line in complete if line.strip()]
+        self.lines.extend(new)
+        return new
+
+    def flush(self):
+        new = [format_bullet(self.pending)] if self.pending.strip() else []
+        self.pending = ""
+        self.lines.extend(new)
+        return new
+
+    @property
+    def reply(self) -> str:
+        return "\n".join(self.lines)
@@ -0,0 +1,160 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+
+import numpy as np
+
+# Words that change the answer however similar the rest of the question is: crops, fertilizers and
+# pesticides, units, negations, seasons and before/after. Two questions only share an answer when
+# these (and all numbers) match, which is what lets the similarity threshold admit paraphrases.
+GUARD_WORDS = frozenset("""
+wheat rice paddy sugarcane cotton soybean soyabean maize corn jowar sorghum bajra millet ragi tur
+arhar gram chickpea moong urad lentil groundnut peanut mustard sunflower onion tomato potato
+brinjal chilli chili okra cabbage cauliflower garlic ginger turmeric grapes grape pomegranate
+banana mango orange citrus papaya guava watermelon cucumber tea coffee coconut
+urea dap npk mop potash ssp zinc sulphur sulfur gypsum lime boron calcium magnesium nitrogen
+phosphorus potassium compost manure vermicompost fym neem imidacloprid chlorpyrifos mancozeb
+carbendazim glyphosate cypermethrin thiamethoxam copper
+acre hectare ha guntha bigha kg gram g quintal tonne ton litre liter ml l bag bags
+no not never dont cannot cant without avoid summer winter monsoon rainy kharif rabi zaid before after
+गहू गेहूं तांदूळ भात धान चावल ऊस गन्ना कापूस कपास सोयाबीन मका मक्का ज्वारी बाजरी तूर हरभरा चना
+भुईमूग मूंगफली कांदा प्याज टोमॅटो टमाटर बटाटा आलू मिरची हळद द्राक्षे डाळिंब केळी आंबा
+युरिया यूरिया डीएपी पोटॅश पोटाश शेणखत गोबर कंपोस्ट
+एकर हेक्टर गुंठा किलो क्विंटल लिटर
+नाही नको नये नहीं मत बिना उन्हाळा उन्हाळ्यात हिवाळा हिवाळ्यात पावसाळा पावसाळ्यात गर्मी सर्दी बरसात
+खरीप रब्बी आधी नंतर पहले पूर्व बाद
+""".split())
+_NUMBER = re.compile(r"\d+")
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, punctuation/symbols to spaces (Devanagari vowel signs are kept), collapsed whitespace."""
+    text = "".join(" " if unicodedata.category(ch)[0] in "PS" else ch for ch in str(text).lower())
+    return " ".join(text.split())
+
+
+def guard_tokens(text: str):
+    """
+    Returns: the numbers (any script, '05' == '5') and GUARD_WORDS of a question, as a sorted tuple.
+    Plural 's' is ignored ('acres' == 'acre').
+    """
+    normalized = normalize_question(text)
+    tokens = [str(int(number)) for number in _NUMBER.findall(normalized)]
+    for word in normalized.split():
+        if word not in GUARD_WORDS and word.endswith("s") and word[:-1] in GUARD_WORDS:
+            word = word[:-1]
+        if word in GUARD_WORDS:
+            tokens.append(word)
+    return tuple(sorted(tokens))
+
+
+class ChatCache:
+    """
+    In-memory near-duplicate cache for chatbot answers.
+    Questions become hashed character n-gram vectors (script independent, so Marathi, Hindi and
+    English all work offline), stored as rows of one matrix; a lookup is a single matrix-vector
+    product and the most similar entry with cosine similarity >= `threshold` and the same
+    guard_tokens() (numbers, crops, inputs, units, negations, seasons) is a hit: "1 acre" must not
+    answer "5 acre", nor "spray before rain" answer "do not spray before rain".
+    The least recently used entry is replaced when full, entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, threshold: float = 0.85, capacity: int = 1000, ttl: float = 7 * 24 * 3600,
+                 dims: int = 4096, ngram_range=(2, 4)):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self.dims = dims
+        self.ngram_range = ngram_range
+        self.vectors = np.zeros((capacity, dims), dtype=np.float32)
+        self.questions = [None] * capacity
+        self.answers = [None] * capacity
+        self.guards = [None] * capacity
+        self.created = np.zeros(capacity)
+        self.last_used = np.full(capacity, -np.inf)  # -inf marks a free slot
+        self.exact = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "exact_hits": 0, "misses": 0, "guard_rejects": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            threshold=float(os.getenv("CHAT_CACHE_THRESHOLD", "0.85")),
+            capacity=int(os.getenv("CHAT_CACHE_SIZE", "1000")),
+            ttl=float(os.getenv("CHAT_CACHE_TTL", str(7 * 24 * 3600))),
+        )
+
+    def vectorize(self, text: str):
+        vector = np.zeros(self.dims, dtype=np.float32)
+        padded = f" {normalize_question(text)} "
+        lo, hi = self.ngram_range
+        for n in range(lo, hi + 1):
+            for i in range(len(padded) - n + 1):
+                vector[zlib.crc32(padded[i:i + n].encode("utf-8")) % self.dims] += 1.0
+        np.log1p(vector, out=vector)  # sublinear tf, so repeated words do not dominate
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, question: str):
+        """Returns: (answer, similarity, matched_question) or None."""
+        key = normalize_question(question)
+        if not key:
+            return None
+        now = time.time()
+        with self._lock:
+            slot = self.exact.get(key)
+            if slot is not None and self.created[slot] + self.ttl >= now:
+                self.last_used[slot] = now
+                self.stats["exact_hits"] += 1
+                self.stats["hits"] += 1
+                return self.answers[slot], 1.0, self.questions[slot]
+
+            scores = self.vectors @ self.vectorize(question)
+            scores[(self.last_used == -np.inf) | (self.created + self.ttl < now)] = -1.0
+            candidates = np.flatnonzero(scores >= self.threshold)
+            guard = guard_tokens(question)
+            for slot in candidates[np.argsort(-scores[candidates])].tolist():
+                if self.guards[slot] == guard:
+                    self.last_used[slot] = now
+                    self.stats["hits"] += 1
+                    return self.answers[slot], float(scores[slot]), self.questions[slot]
+            if len(candidates):
+                self.stats["guard_rejects"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def add(self, question: str, answer: str):
+        key = normalize_question(question)
+        if not key or not answer:
+            return
+        vector = self.vectorize(question)
+        now = time.time()
+        with self._lock:
+            slot = self.exact.get(key)
+            if slot is None:
+                expired = np.flatnonzero(self.created + self.ttl < now)
+                slot = int(expired[0]) if len(expired) else int(np.argmin(self.last_used))
+                if self.questions[slot] is not None:
+                    self.exact.pop(normalize_question(self.questions[slot]), None)
+                    self.stats["evictions"] += 1
+            self.vectors[slot] = vector
+            self.questions[slot] = question
+            self.answers[slot] = answer
+            self.guards[slot] = guard_tokens(question)
+            self.created[slot] = now
+            self.last_used[slot] = now
+            self.exact[key] = slot
+
+    def info(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self.exact),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
@@ -1,8 +1,7 @@
 import os
-from dotenv import load_dotenv
 
-# Load secrets from .env file
-load_dotenv()
+# Importing ai_agent loads secrets from the .env file (once per process)
+import ai_agent  # noqa: F401
 
 # Google Gemini API Key
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
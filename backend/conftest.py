@@ -0,0 +1,2 @@
+# ai_agent/test_alerts.py is a manual script (real weather API + SMS), not a pytest module
+collect_ignore = ["ai_agent/test_alerts.py"]
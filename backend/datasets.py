@@ -0,0 +1,154 @@
+"""
+Columnar dataset cache.
+
+Each CSV is converted once into an Arrow IPC (Feather v2) file holding only the columns the
+services use, with categorical dtypes. Later start-ups memory-map that file instead of parsing
+the CSV. A cache entry is rebuilt when the source size/mtime changes and its content hash differs.
+"""
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+import ai_agent  # noqa: F401  loads .env before the paths below are read
+
+CACHE_DIR = os.getenv("DATASET_CACHE_DIR", ".cache/datasets")
+CACHE_VERSION = 1  # bump when a spec below changes
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # cache is optional, CSVs are parsed directly without it
+    pa = None
+
+
+def _lower(series):
+    return series.astype(str).str.lower()
+
+
+def _text(series):
+    return series.astype(str)
+
+
+# name -> source path, columns to keep (optional ones may be missing), per-column transform
+DATASETS = {
+    "soil": {
+        "path": os.getenv("SOIL_DATA_FILE", "All in One DataSetSwayam01cleaned.csv"),
+        "columns": ["Address", "Region", "Crop"],
+        "optional": [],
+        "transforms": {"Address": _lower, "Region": _lower, "Crop": _text},
+    },
+    "byproducts": {
+        "path": os.getenv("BYPRODUCTS_FILE", "indian_crops_byproducts_with_domains.csv"),
+        "columns": ["Crop", "Useful Domains"],
+        "optional": [],
+        "transforms": {},
+    },
+    "companies": {
+        "path": os.getenv("COMPANIES_FILE", "corrected_companies_with_district.csv"),
+        "columns": ["CompanyName", "Registered_Office_Address", "CompanyIndustrialClassification", "District"],
+        # Latitude/Longitude are attached offline by geocode_companies.py
+        "optional": ["CompanyStatus", "Distance", "StarRating", "Latitude", "Longitude"],
+        "transforms": {},
+    },
+}
+
+load_report = {}
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_csv(spec):
+    wanted = set(spec["columns"]) | set(spec["optional"])
+    df = pd.read_csv(spec["path"], usecols=lambda c: c in wanted)
+    missing = set(spec["columns"]) - set(df.columns)
+    if missing:
+        raise ValueError(f"{spec['path']} is missing columns: {', '.join(sorted(missing))}")
+
+    for col, transform in spec["transforms"].items():
+        df[col] = transform(df[col])
+    # Text columns become categoricals: each distinct string is stored once
+    for col in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _source_meta(spec):
+    stat = os.stat(spec["path"])
+    return {"version": CACHE_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "columns": spec["columns"] + spec["optional"]}
+
+
+def _cached(name: str, spec, cache_dir: str):
+    """Returns the cached frame, rebuilding the Arrow file when the source changed."""
+    arrow_path = os.path.join(cache_dir, f"{name}.arrow")
+    meta_path = os.path.join(cache_dir, f"{name}.json")
+    meta = _source_meta(spec)
+
+    saved = None
+    if os.path.exists(arrow_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            saved = json.load(f)
+
+    fresh = saved is not None and all(saved.get(k) == v for k, v in meta.items())
+    if not fresh and saved is not None and saved.get("version") == meta["version"] \
+            and saved.get("columns") == meta["columns"]:
+        # mtime/size changed (copy, touch): only rebuild when the content really changed
+        meta["sha256"] = _file_hash(spec["path"])
+        fresh = saved.get("sha256") == meta["sha256"]
+        if fresh:
+            _write_meta(meta_path, meta)
+
+    if fresh:
+        table = feather.read_table(arrow_path, memory_map=True)
+        return table.to_pandas(), "arrow", saved.get("sha256") or meta.get("sha256")
+
+    df = _read_csv(spec)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{arrow_path}.tmp"
+    feather.write_feather(df, tmp_path, compression="uncompressed")  # uncompressed so it can be memory-mapped
+    os.replace(tmp_path, arrow_path)
+    meta.setdefault("sha256", _file_hash(spec["path"]))
+    _write_meta(meta_path, meta)
+    return df, "csv", meta["sha256"]
+
+
+def _write_meta(path: str, meta):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+
+
+def load(name: str, cache_dir: str = CACHE_DIR):
+    """
+    Returns the DataFrame for one of DATASETS, from the Arrow cache when possible.
+    Load time, row count, source, memory and version (source content hash) are recorded
+    in `load_report[name]`.
+    """
+    spec = DATASETS[name]
+    start = time.perf_counter()
+    if pa is not None and cache_dir:
+        df, source, sha256 = _cached(name, spec, cache_dir)
+    else:
+        df, source, sha256 = _read_csv(spec), "csv", _file_hash(spec["path"])
+
+    load_report[name] = {
+        "source": source,
+        "rows": len(df),
+        "load_ms": round((time.perf_counter() - start) * 1000, 1),
+        "memory_mb": round(df.memory_usage(deep=True).sum() / 2**20, 2),
+        "version": sha256[:12],
+    }
+    r = load_report[name]
+    print(f"📦 {name}: {r['rows']} rows from {r['source']} in {r['load_ms']} ms, {r['memory_mb']} MB")
+    return df
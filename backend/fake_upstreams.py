@@ -0,0 +1,249 @@
+"""
+Local stand-ins for Visual Crossing, Gemini and Twilio, used by bench_load.py.
+
+Each fake is a threaded HTTP server with its own latency and error rate, and counts the
+requests it served. Point the backend at them with:
+    VISUAL_CROSSING_BASE_URL = <weather.url>/VisualCrossingWebServices/rest/services/timeline
+    GEMINI_BASE_URL          = <gemini.url>
+    TWILIO_API_BASE_URL      = <twilio.url>
+
+Run standalone (e.g. for manual testing) from the backend folder:
+    python fake_upstreams.py [--latency 0.2] [--error-rate 0.05]
+"""
+import argparse
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+ADVISORY_JSON = {
+    "english": {
+        "pesticide": "Imidacloprid",
+        "target_crops": ["Cotton"],
+        "dosage": "0.5 ml per litre of water",
+        "safety": ["Wear gloves and a mask", "Do not spray before rain"],
+        "alternatives": ["Neem oil"],
+    },
+    "marathi": {
+        "pesticide": "इमिडाक्लोप्रिड",
+        "target_crops": ["कापूस"],
+        "dosage": "प्रति लिटर पाण्यात ०.५ मिली",
+        "safety": ["हातमोजे आणि मास्क वापरा", "पावसापूर्वी फवारणी करू नका"],
+        "alternatives": ["कडुनिंब तेल"],
+    },
+}
+
+CHAT_LINES = [
+    "- पिकाला सकाळी किंवा संध्याकाळी पाणी द्या.",
+    "- मातीतील ओलावा तपासून सिंचनाचे नियोजन करा.",
+    "- पावसाच्या अंदाजानुसार फवारणी पुढे ढकला.",
+]
+
+
+class FakeUpstream:
+    """Threaded HTTP server with configurable latency (seconds) and error rate (0..1)."""
+
+    name = "upstream"
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                fake._serve(self)
+
+            def do_POST(self):
+                fake._serve(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def info(self):
+        return {"requests": self.requests, "errors": self.errors,
+                "latency": self.latency, "error_rate": self.error_rate}
+
+    def _serve(self, handler):
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        with self._lock:
+            self.requests += 1
+            fail = random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if fail:
+            self._send(handler, 503, "application/json", {"error": {"code": 503, "message": "fake upstream error"}})
+            return
+        self.handle(handler, urlparse(handler.path), body)
+
+    @staticmethod
+    def _send(handler, status: int, content_type: str, payload):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def handle(self, handler, url, body: bytes):
+        raise NotImplementedError
+
+
+class FakeVisualCrossing(FakeUpstream):
+    """Timeline API: /VisualCrossingWebServices/rest/services/timeline/{location}/{start}/{end}"""
+
+    name = "visual_crossing"
+
+    def handle(self, handler, url, body):
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        try:
+            location, start, end = parts[-3], parts[-2], parts[-1]
+            start = datetime.date.fromisoformat(start)
+            end = datetime.date.fromisoformat(end)
+        except (IndexError, ValueError):
+            self._send(handler, 400, "application/json", {"error": "bad timeline path"})
+            return
+
+        # Deterministic per (location, day), so repeated runs and partial ranges agree
+        days = []
+        day = start
+        while day <= end:
+            rng = random.Random(f"{location.lower()}|{day}")
+            days.append({"datetime": day.isoformat(), "precip": rng.choice([0.0, 0.0, 0.0, 0.4, 2.5, 8.0])})
+            day += datetime.timedelta(days=1)
+        self._send(handler, 200, "application/json", {"resolvedAddress": location, "days": days})
+
+
+class FakeGemini(FakeUpstream):
+    """generateContent and streamGenerateContent (?alt=sse) for any model."""
+
+    name = "gemini"
+
+    def handle(self, handler, url, body):
+        match = re.search(r"/models/([^/:]+):(generateContent|streamGenerateContent)$", url.path)
+        if not match:
+            self._send(handler, 404, "application/json", {"error": {"code": 404, "message": "unknown method"}})
+            return
+
+        try:
+            prompt = json.loads(body or b"{}")["contents"][0]["parts"][0]["text"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            prompt = ""
+        # Report.build_prompt asks for JSON; everything else is the Marathi chatbot
+        text = json.dumps(ADVISORY_JSON, ensure_ascii=False) if "JSON" in prompt else "\n".join(CHAT_LINES)
+
+        if match.group(2) == "generateContent":
+            self._send(handler, 200, "application/json", self._response(text))
+            return
+
+        chunks = [text[i:i + 40] for i in range(0, len(text), 40)]
+        stream = b"".join(
+            b"data: " + json.dumps(self._response(chunk), ensure_ascii=False).encode("utf-8") + b"\r\n\r\n"
+            for chunk in chunks
+        )
+        self._send(handler, 200, "text/event-stream", stream)
+
+    @staticmethod
+    def _response(text: str):
+        return {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+            "modelVersion": "fake",
+        }
+
+
+class FakeTwilio(FakeUpstream):
+    """POST /2010-04-01/Accounts/{sid}/Messages.json"""
+
+    name = "twilio"
+
+    def handle(self, handler, url, body):
+        match = re.search(r"/2010-04-01/Accounts/([^/]+)/Messages\.json$", url.path)
+        if not match:
+            self._send(handler, 404, "application/json", {"message": "not found", "status": 404})
+            return
+        self._send(handler, 201, "application/json", {
+            "sid": "SM" + uuid.uuid4().hex,
+            "account_sid": match.group(1),
+            "status": "queued",
+        })
+
+
+def start_fakes(config=None):
+    """
+    Starts all three fakes. config maps fake name -> {"latency": s, "error_rate": p}.
+    Returns: {name: FakeUpstream}
+    """
+    config = config or {}
+    return {
+        cls.name: cls(**config.get(cls.name, {})).start()
+        for cls in (FakeVisualCrossing, FakeGemini, FakeTwilio)
+    }
+
+
+def upstream_env(fakes):
+    """Environment variables that point the backend at the running fakes."""
+    return {
+        "VISUAL_CROSSING_BASE_URL": fakes["visual_crossing"].url + "/VisualCrossingWebServices/rest/services/timeline",
+        "VISUAL_CROSSING_API_KEY": "fake",
+        "GEMINI_BASE_URL": fakes["gemini"].url,
+        "GEMINI_API_KEY": "fake",
+        "TWILIO_API_BASE_URL": fakes["twilio"].url,
+        "TWILIO_ACCOUNT_SID": "ACfake",
+        "TWILIO_AUTH_TOKEN": "fake",
+        "TWILIO_NUMBER": "+15550000000",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run fake Visual Crossing, Gemini and Twilio servers")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    fakes = start_fakes({name: {"latency": args.latency, "error_rate": args.error_rate}
+                         for name in ("visual_crossing", "gemini", "twilio")})
+    for key, value in upstream_env(fakes).items():
+        print(f"{key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for fake in fakes.values():
+            fake.stop()
+
+
+if __name__ == "__main__":
+    main()
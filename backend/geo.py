@@ -0,0 +1,79 @@
+"""
+Offline geocoding from the bundled district centroid table (district_centroids.json).
+
+No network: a district name (or, when that is unknown, the PIN code in an address) is
+mapped to its district's approximate centroid. Used by geocode_companies.py to attach
+coordinates to the companies CSV, and at request time to place the farmer's district.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+
+CENTROIDS_FILE = os.getenv("DISTRICT_CENTROIDS_FILE",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), "district_centroids.json"))
+EARTH_RADIUS_KM = 6371.0088
+
+_PINCODE = re.compile(r"\b(\d{3})\s?\d{3}\b")
+_SUFFIX = re.compile(r"\s+(district|dist\.?|distt\.?)$")
+
+
+def normalize_district(value) -> str:
+    """'  Pune District ' -> 'pune'"""
+    name = " ".join(str(value).replace("_", " ").strip().lower().split())
+    name = re.sub(r"^(district|dist\.?)\s+", "", name)
+    return _SUFFIX.sub("", name)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class CentroidTable:
+    def __init__(self, path: str = CENTROIDS_FILE):
+        with open(path, "rb") as f:
+            raw = f.read()
+        data = json.loads(raw)
+        self.path = path
+        self.version = hashlib.sha256(raw).hexdigest()[:12]
+        self.districts = data["districts"]
+        self.aliases = data.get("aliases", {})
+        self.pincode_prefixes = data.get("pincode_prefixes", {})
+
+    def district(self, name):
+        """Returns: (lat, lon) of the district centroid, or None when the name is unknown."""
+        if name is None or (isinstance(name, float) and math.isnan(name)):
+            return None
+        key = normalize_district(name)
+        entry = self.districts.get(self.aliases.get(key, key))
+        return (entry["lat"], entry["lon"]) if entry else None
+
+    def locate(self, district=None, address=None):
+        """
+        Returns: (lat, lon, source) with source "district" or "pincode", or None.
+        The district wins; the last PIN code in the address is the fallback.
+        """
+        point = self.district(district)
+        if point is not None:
+            return point[0], point[1], "district"
+        if isinstance(address, str):
+            matches = _PINCODE.findall(address)
+            if matches:
+                point = self.district(self.pincode_prefixes.get(matches[-1]))
+                if point is not None:
+                    return point[0], point[1], "pincode"
+        return None
+
+
+_table = None
+
+
+def centroids():
+    """Returns: the shared CentroidTable (loaded on first use)."""
+    global _table
+    if _table is None:
+        _table = CentroidTable()
+    return _table
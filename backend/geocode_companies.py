@@ -0,0 +1,72 @@
+"""
+Attaches coordinates to the companies CSV from the bundled district centroid table (offline).
+
+Run from the backend folder:
+    python geocode_companies.py                                   # updates COMPANIES_FILE in place
+    python geocode_companies.py --companies in.csv --out out.csv
+
+Adds Latitude, Longitude and GeoSource ("district", "pincode" or empty) columns. Rows whose
+district is unknown keep empty coordinates and are only found by the exact district match;
+the most common unknown districts are listed so aliases can be added to district_centroids.json.
+"""
+import argparse
+import collections
+import os
+import time
+
+import pandas as pd
+
+from datasets import DATASETS
+from geo import CentroidTable, CENTROIDS_FILE
+
+
+def geocode(df, table: CentroidTable):
+    """Returns: (df with Latitude/Longitude/GeoSource, Counter of unknown districts)"""
+    addresses = df["Registered_Office_Address"] if "Registered_Office_Address" in df.columns else [None] * len(df)
+    lat, lon, source = [], [], []
+    unknown = collections.Counter()
+    by_district = {}
+    for district, address in zip(df["District"], addresses):
+        district = district if isinstance(district, str) else None
+        if district not in by_district:
+            by_district[district] = table.district(district)
+        point = by_district[district]
+        point = (*point, "district") if point is not None else table.locate(None, address)
+        if point is None:
+            unknown[district or "(missing)"] += 1
+            point = (None, None, "")
+        lat.append(point[0])
+        lon.append(point[1])
+        source.append(point[2])
+    df = df.assign(Latitude=lat, Longitude=lon, GeoSource=source)
+    return df, unknown
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attach district centroid coordinates to the companies CSV")
+    parser.add_argument("--companies", default=DATASETS["companies"]["path"])
+    parser.add_argument("--centroids", default=CENTROIDS_FILE)
+    parser.add_argument("--out", help="Output CSV (default: overwrite --companies)")
+    parser.add_argument("--top-unknown", type=int, default=15)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = pd.read_csv(args.companies, low_memory=False)
+    df, unknown = geocode(df.drop(columns=["Latitude", "Longitude", "GeoSource"], errors="ignore"),
+                          CentroidTable(args.centroids))
+
+    out = args.out or args.companies
+    tmp_path = f"{out}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, out)  # a running backend never reads a half-written file
+
+    located = df["GeoSource"].value_counts().to_dict()
+    print(f"✅ {len(df)} companies → {out} in {time.perf_counter() - start:.2f}s "
+          f"(by district: {located.get('district', 0)}, by pincode: {located.get('pincode', 0)}, "
+          f"unlocated: {sum(unknown.values())})")
+    for district, count in unknown.most_common(args.top_unknown):
+        print(f"  ⚠️ unknown district {district!r}: {count} rows")
+
+
+if __name__ == "__main__":
+    main()
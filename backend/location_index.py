@@ -0,0 +1,168 @@
+import time
+
+import numpy as np
+
+
+def normalize_address(value: str) -> str:
+    return " ".join(str(value).strip().lower().split())
+
+
+def levenshtein(a: str, b: str, max_distance: int = None) -> int:
+    """Edit distance between a and b. Stops early once every cell exceeds max_distance."""
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class Trie:
+    """Character trie over addresses for prefix autocomplete."""
+
+    _END = "\0"
+
+    def __init__(self, words=()):
+        self.root = {}
+        for word in words:
+            self.insert(word)
+
+    def insert(self, word: str):
+        node = self.root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[self._END] = True
+
+    def starts_with(self, prefix: str, limit: int = 10):
+        """Returns up to `limit` words starting with `prefix`, shortest-branch first in sorted order."""
+        node = self.root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        results = []
+        stack = [(node, prefix)]
+        while stack and len(results) < limit:
+            node, word = stack.pop()
+            if self._END in node:
+                results.append(word)
+            # reversed so the smallest character is popped first
+            for ch in sorted((c for c in node if c != self._END), reverse=True):
+                stack.append((node[ch], word + ch))
+        return results
+
+
+class NGramIndex:
+    """
+    Inverted index from character bigrams to word ids for spelling correction.
+    A word within edit distance d of the query shares at least (query bigrams - 2 * d) bigrams
+    with it, so only words passing that count (and the length filter) are edit-distance checked.
+    """
+
+    def __init__(self, words=()):
+        self.words = list(words)
+        self.lengths = np.array([len(w) for w in self.words], dtype=np.int32)
+        postings = {}
+        for word_id, word in enumerate(self.words):
+            for gram in set(self._grams(word)):
+                postings.setdefault(gram, []).append(word_id)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    @staticmethod
+    def _grams(word: str):
+        padded = f" {word} "
+        return [padded[i:i + 2] for i in range(len(padded) - 1)]
+
+    def search(self, word: str, max_distance: int):
+        """Returns: [(distance, word)] sorted by distance then word."""
+        grams = set(self._grams(word))
+        lists = [self.postings[g] for g in grams if g in self.postings]
+        min_shared = len(grams) - 2 * max_distance
+        if min_shared > 0:
+            if not lists:
+                return []
+            counts = np.bincount(np.concatenate(lists), minlength=len(self.words))
+            candidates = np.flatnonzero(counts >= min_shared)
+        else:
+            # Query too short for the bigram filter to prune anything
+            candidates = np.arange(len(self.words))
+        candidates = candidates[np.abs(self.lengths[candidates] - len(word)) <= max_distance]
+
+        results = []
+        for word_id in candidates:
+            candidate = self.words[word_id]
+            distance = levenshtein(word, candidate, max_distance)
+            if distance <= max_distance:
+                results.append((distance, candidate))
+        return sorted(results)
+
+
+class LocationIndex:
+    """
+    Built once at startup from the All-in-One dataset.
+    Maps normalized address -> row positions, dataset address, region and deduplicated crop list,
+    and serves prefix / fuzzy suggestions for autocomplete.
+    """
+
+    def __init__(self, df):
+        start = time.perf_counter()
+        self.entries = {}
+        addresses = df["Address"].map(normalize_address)
+        raw_addresses = df["Address"].to_numpy()
+        regions = df["Region"].to_numpy()
+        crops = df["Crop"].to_numpy()
+
+        # A stable sort keeps dataset order inside each address, so crops stay in first-seen order like .unique()
+        codes, uniques = addresses.factorize()
+        order = np.argsort(codes, kind="stable")
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        for positions in (np.split(order, bounds) if len(order) else []):
+            self.entries[uniques[codes[positions[0]]]] = {
+                "rows": positions,
+                "address": raw_addresses[positions[0]],  # as in the dataset: the soil table / encoder key
+                "region": regions[positions[0]],
+                "crops": list(dict.fromkeys(crops[positions])),
+            }
+
+        self.trie = Trie(self.entries)
+        self.ngrams = NGramIndex(self.entries)
+        print(f"✅ Location index built for {len(self.entries)} addresses in {time.perf_counter() - start:.2f}s")
+
+    def get(self, address: str):
+        return self.entries.get(normalize_address(address))
+
+    def suggest(self, query: str, limit: int = 10, max_distance: int = None):
+        """
+        Prefix matches first, then spelling corrections within `max_distance` edits
+        (default: 1 for short queries, 2 otherwise).
+        Returns: [{"address", "region", "match", "distance"}]
+        """
+        query = normalize_address(query)
+        if not query:
+            return []
+        if max_distance is None:
+            max_distance = 1 if len(query) <= 4 else 2
+
+        suggestions = []
+        seen = set()
+        for address in self.trie.starts_with(query, limit):
+            seen.add(address)
+            suggestions.append({"address": address, "region": self.entries[address]["region"],
+                                "match": "prefix", "distance": 0})
+
+        if len(suggestions) < limit:
+            for distance, address in self.ngrams.search(query, max_distance):
+                if address in seen:
+                    continue
+                suggestions.append({"address": address, "region": self.entries[address]["region"],
+                                    "match": "fuzzy", "distance": distance})
+                if len(suggestions) >= limit:
+                    break
+        return suggestions
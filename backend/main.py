@@ -1,57 +1,144 @@
-import pandas as pd
+"""
+Soil model training pipeline.
+
+Run from the backend folder:
+    python main.py --data "All in One DataSetSwayam01cleaned.csv"
+    python main.py --data data.csv --out soil_model.pkl --forest-dir soil_forest --n-jobs -1
+
+The cleaned dataset is cached as Parquet keyed by the source file hash, and both artifacts
+are replaced atomically so a running app.py picks up the new model without a restart.
+"""
+import argparse
+import contextlib
+import hashlib
+import os
 import pickle
+import time
+
+import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 from sklearn.ensemble import RandomForestRegressor
 
-# =========================
-# Load & preprocess data
-# =========================
-df = pd.read_csv(r"C:\Users\Hp\Pictures\Smart Krishi Advisor\backend\All in One DataSetSwayam01cleaned.csv")
+from soil import Y_COLUMNS, export_forest
+
+CLEAN_VERSION = "1"  # bump when the cleaning logic changes to invalidate cached frames
+CAT_COLS = ["Address", "Region", "Crop"]
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    yield
+    print(f"⏱ {name:<10} {time.perf_counter() - start:8.2f}s")
 
-def clean_percentage(val):
-    if isinstance(val, str) and "%" in val:
-        return float(val.replace("%", ""))  
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def clean(df):
+    """Converts '%' columns to floats and fills missing values (vectorized)."""
+    for col in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            text = df[col].astype(str)
+            if text.str.contains("%", regex=False).any():
+                df[col] = pd.to_numeric(text.str.replace("%", "", regex=False).str.strip(), errors="coerce")
+
+    num_cols = [c for c in df.columns if c not in CAT_COLS]
+    df[CAT_COLS] = df[CAT_COLS].fillna("Unknown")
+    df[num_cols] = df[num_cols].fillna(0)
+    return df
+
+
+def load_clean(data_path: str, cache_dir: str):
+    """Returns the cleaned frame, reusing the Parquet cache when the source file is unchanged."""
     try:
-        return float(val)
-    except:
-        return None
-
-# Clean all percentage columns
-for col in df.columns:
-    if df[col].dtype == object and df[col].astype(str).str.contains("%").any():
-        df[col] = df[col].apply(clean_percentage)
-
-# Fill missing values
-cat_cols = ["Address", "Region", "Crop"]
-num_cols = [c for c in df.columns if c not in cat_cols]
-
-df[cat_cols] = df[cat_cols].fillna("Unknown")
-df[num_cols] = df[num_cols].fillna(0)
-
-# Encode categorical columns
-encoders = {}
-for col in ["Address", "Region"]:
-    encoders[col] = LabelEncoder()
-    df[col] = encoders[col].fit_transform(df[col].astype(str).str.lower())  # lowercase for consistency
-
-# Features and target
-X = df[["Address", "Region"]]
-y = df[[
-    "Nitrogen - High", "Nitrogen - Medium", "Nitrogen - Low",
-    "Phosphorous - High", "Phosphorous - Medium", "Phosphorous - Low",
-    "Potassium - High", "Potassium - Medium", "Potassium - Low",
-    "pH - Acidic", "pH - Neutral", "pH - Alkaline"
-]]
-
-# Train/test split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Train model
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
-print("✅ Soil Model trained. R² Score:", model.score(X_test, y_test))
-
-# Save model
-with open("soil_model.pkl", "wb") as f:
-    pickle.dump({"model": model, "encoders": encoders}, f)
+        import pyarrow  # noqa: F401  (Parquet engine)
+    except ImportError:
+        print("⚠️ pyarrow not installed, cleaned-data cache disabled")
+        cache_dir = None
+
+    cache_path = None
+    if cache_dir:
+        key = file_hash(data_path)[:16]
+        cache_path = os.path.join(cache_dir, f"soil_clean_v{CLEAN_VERSION}_{key}.parquet")
+        if os.path.exists(cache_path):
+            print(f"📦 Using cached cleaned data: {cache_path}")
+            return pd.read_parquet(cache_path)
+
+    df = clean(pd.read_csv(data_path))
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    return df
+
+
+def save_pickle(obj, path: str):
+    """Writes to a temp file in the same folder, then renames over the old artifact."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the soil attribute model")
+    parser.add_argument("--data", default=os.getenv("SOIL_DATA_FILE", "All in One DataSetSwayam01cleaned.csv"))
+    parser.add_argument("--out", default="soil_model.pkl", help="Pickled model + encoders")
+    parser.add_argument("--forest-dir", default="soil_forest", help="Flat memory-mappable forest (empty to skip)")
+    parser.add_argument("--cache-dir", default=".cache", help="Cleaned data cache (empty to disable)")
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Cores used for training (-1 = all)")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    args = parser.parse_args()
+
+    total = time.perf_counter()
+
+    # =========================
+    # Load & preprocess data
+    # =========================
+    with stage("load+clean"):
+        df = load_clean(args.data, args.cache_dir)
+
+    # Encode categorical columns
+    with stage("encode"):
+        encoders = {}
+        for col in ["Address", "Region"]:
+            encoders[col] = LabelEncoder()
+            df[col] = encoders[col].fit_transform(df[col].astype(str).str.lower())  # lowercase for consistency
+
+        X = df[["Address", "Region"]]
+        y = df[Y_COLUMNS]
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=42)
+
+    # Train model
+    with stage("train"):
+        model = RandomForestRegressor(n_estimators=args.n_estimators, random_state=42, n_jobs=args.n_jobs)
+        model.fit(X_train, y_train)
+
+    with stage("score"):
+        score = model.score(X_test, y_test)
+    print("✅ Soil Model trained. R² Score:", score)
+
+    # Inference in the app is single-row, extra threads only add overhead there
+    model.set_params(n_jobs=None)
+
+    # Save model
+    with stage("save"):
+        save_pickle({"model": model, "encoders": encoders}, args.out)
+        if args.forest_dir:
+            export_forest(model, encoders, args.forest_dir, X=X)
+
+    print(f"⏱ {'total':<10} {time.perf_counter() - total:8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
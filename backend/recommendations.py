@@ -0,0 +1,375 @@
+import base64
+import binascii
+import hashlib
+import heapq
+import json
+import math
+import os
+from itertools import islice
+import time
+
+import numpy as np
+import pandas as pd
+
+from ai_agent.metrics import span
+from geo import EARTH_RADIUS_KM, centroids
+
+GEO_RADIUS_KM = float(os.getenv("GEO_RADIUS_KM", "150"))
+MAX_LIMIT = 100
+
+
+def _parse_weights(value: str):
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+# score = sum(weight * component), each component in [0, 1]:
+#   relevance  position of the company's domain in the crop's "Useful Domains" (first = 1)
+#   status     STATUS_SCORES of CompanyStatus
+#   rating     StarRating / 5 (UNRATED_SCORE_RATING when missing)
+#   distance   1 - km / GEO_RADIUS_KM, from the Distance column or the coordinates (district centroid);
+#              0.5 when unknown
+RANKING_WEIGHTS = _parse_weights(os.getenv("RECOMMENDATION_WEIGHTS", "relevance=1,status=1,rating=0.5,distance=0.5"))
+STATUS_SCORES = {"active": 1.0, "dormant": 0.3, "under process of striking off": 0.1}
+UNRATED_SCORE_RATING = 4.5  # ranking only; unrated companies are returned with rating null
+
+# Output field -> (CSV column, default when the column is missing).
+# Without a Distance column, district results carry the company-to-centroid km when geocoded.
+RECORD_FIELDS = {
+    "company_name": ("CompanyName", "N/A"),
+    "address": ("Registered_Office_Address", "N/A"),
+    "status": ("CompanyStatus", "Unknown"),
+    "domain": ("CompanyIndustrialClassification", "N/A"),
+    "distance": ("Distance", None),
+    "rating": ("StarRating", None),
+}
+
+
+def _native(value):
+    """numpy scalars -> plain Python values so records can be serialized as-is."""
+    return value.item() if hasattr(value, "item") else value
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def parse_search(data):
+    """
+    Reads the optional geo and paging fields of a /recommendations body.
+    Returns: (latitude or None, longitude or None, radius_km, limit, cursor or None);
+    raises ValueError when invalid.
+    """
+    lat, lon = data.get("latitude"), data.get("longitude")
+    if (lat is None) != (lon is None):
+        raise ValueError("latitude and longitude must be given together")
+    try:
+        if lat is not None:
+            lat, lon = float(lat), float(lon)
+        radius_km = float(data.get("radius_km", GEO_RADIUS_KM))
+        limit = int(data.get("limit", 10))
+    except (TypeError, ValueError):
+        raise ValueError("latitude, longitude, radius_km and limit must be numbers")
+    if lat is not None and not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("latitude/longitude out of range")
+    if radius_km <= 0 or not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"radius_km must be positive and limit between 1 and {MAX_LIMIT}")
+    cursor = data.get("cursor") or None
+    if cursor is not None and not isinstance(cursor, str):
+        raise ValueError("cursor must be a string")
+    return lat, lon, radius_km, limit, cursor
+
+
+def _encode_cursor(state) -> str:
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _decode_cursor(token: str):
+    """Returns: the cursor state; raises ValueError for anything that is not a well-formed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        state = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise ValueError("invalid cursor")
+    if not isinstance(state, dict) or state.get("m") not in ("nearest", "district"):
+        raise ValueError("invalid cursor")
+    offset = state.get("o")
+    if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+        raise ValueError("invalid cursor")
+    if state["m"] == "nearest":
+        lat, lon, radius_km = state.get("lat"), state.get("lon"), state.get("r")
+        if not (_is_number(lat) and _is_number(lon) and _is_number(radius_km)) \
+                or not (-90 <= lat <= 90 and -180 <= lon <= 180) or radius_km <= 0:
+            raise ValueError("invalid cursor")
+    return state
+
+
+def _company_km(companies_df):
+    """
+    Returns: per-row km (float array, NaN when unknown) from the Distance column, else from the
+    coordinates to the company's district centroid (where district searches start); None when
+    the CSV has neither.
+    """
+    if "Distance" in companies_df.columns:
+        return pd.to_numeric(companies_df["Distance"], errors="coerce").to_numpy(dtype=float)
+    if "Latitude" not in companies_df.columns or "Longitude" not in companies_df.columns:
+        return None
+    table = centroids()
+    districts = companies_df["District"].astype(str)
+    origins = {d: table.district(d) for d in districts.unique()}
+    lat0 = np.radians(districts.map({d: p[0] for d, p in origins.items() if p}).to_numpy(dtype=float))
+    lon0 = np.radians(districts.map({d: p[1] for d, p in origins.items() if p}).to_numpy(dtype=float))
+    lat1 = np.radians(pd.to_numeric(companies_df["Latitude"], errors="coerce").to_numpy(dtype=float))
+    lon1 = np.radians(pd.to_numeric(companies_df["Longitude"], errors="coerce").to_numpy(dtype=float))
+    a = np.sin((lat1 - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _scores(companies_df, weights, km=None):
+    """Returns: per-row score without the domain relevance part (float array); `km` as from _company_km."""
+    n = len(companies_df)
+    score = np.zeros(n)
+    if weights.get("status") and "CompanyStatus" in companies_df.columns:
+        status = companies_df["CompanyStatus"].astype(str).str.strip().str.lower()
+        score += weights["status"] * status.map(STATUS_SCORES).fillna(0.0).to_numpy(dtype=float)
+    if weights.get("rating"):
+        default = UNRATED_SCORE_RATING
+        rating = (pd.to_numeric(companies_df["StarRating"], errors="coerce").fillna(default).to_numpy(dtype=float)
+                  if "StarRating" in companies_df.columns else np.full(n, float(default)))
+        score += weights["rating"] * np.clip(rating / 5, 0, 1)
+    if weights.get("distance"):
+        if km is None:
+            km = np.full(n, np.nan)
+        closeness = 1 - np.clip(km, 0, GEO_RADIUS_KM) / GEO_RADIUS_KM
+        score += weights["distance"] * np.where(np.isnan(closeness), 0.5, closeness)
+    return score
+
+
+class RecommendationIndex:
+    """
+    Shared by the Flask and FastAPI services. Built once at load time:
+    - crop (lowercase) -> useful domains
+    - (district lowercase, domain) -> [(row position, serialized company record)] in CSV order
+      so a request is a couple of dict lookups and an ordered merge.
+    - (district, useful domains) -> row positions ranked by score (RANKING_WEIGHTS), as one
+      int32 array per pair, so any page is a slice; cursors are just offsets into it
+    - useful domains -> BallTree (haversine) over the distinct coordinates of those companies,
+      when the CSV has Latitude/Longitude (see geocode_companies.py), so a k-nearest search
+      within a radius is one tree query whatever the number of domains.
+    `version` identifies the source data; cursors issued for another version are rejected, and it
+    is part of the /recommendations ETag.
+    """
+
+    def __init__(self, byproducts_df, companies_df, version: str = None, weights=None):
+        start = time.perf_counter()
+        self.weights = weights or RANKING_WEIGHTS
+        # District centroids place the search origin, so they are part of the version too
+        fingerprint = json.dumps([version or [len(byproducts_df), len(companies_df)], sorted(self.weights.items()),
+                                  centroids().version])
+        self.version = hashlib.sha256(fingerprint.encode()).hexdigest()[:12]
+
+        self.crop_domains = {}
+        for crop, domains in zip(byproducts_df["Crop"], byproducts_df["Useful Domains"]):
+            if _is_missing(crop) or _is_missing(domains):
+                continue
+            # first row wins, like crop_data.iloc[0]
+            self.crop_domains.setdefault(str(crop).lower(), [d.strip() for d in str(domains).split(",")])
+
+        columns = {field: companies_df[col].tolist() if col in companies_df.columns else None
+                   for field, (col, _) in RECORD_FIELDS.items()}
+        has_coords = "Latitude" in companies_df.columns and "Longitude" in companies_df.columns
+        latitudes = companies_df["Latitude"].tolist() if has_coords else None
+        longitudes = companies_df["Longitude"].tolist() if has_coords else None
+
+        km = _company_km(companies_df)
+        if km is not None and "Distance" not in companies_df.columns:
+            columns["distance"] = [None if math.isnan(d) else round(d, 1) for d in km.tolist()]
+        base = _scores(companies_df, self.weights, km)
+        self.base_scores = base.tolist()
+        self.records = {}  # row position -> record
+        self.companies = {}
+        points = {}  # domain -> {(lat, lon): [(pos, record)]}
+        for pos, (district, domain) in enumerate(zip(companies_df["District"],
+                                                     companies_df["CompanyIndustrialClassification"])):
+            if _is_missing(domain):
+                continue
+            located = has_coords and not (_is_missing(latitudes[pos]) or _is_missing(longitudes[pos]))
+            if _is_missing(district) and not located:
+                continue
+            record = self.records[pos] = {
+                field: _native(values[pos]) if values is not None else RECORD_FIELDS[field][1]
+                for field, values in columns.items()
+            }
+            if not _is_missing(district):
+                self.companies.setdefault((str(district).lower(), domain), []).append((pos, record))
+            if located:
+                key = (float(latitudes[pos]), float(longitudes[pos]))
+                points.setdefault(domain, {}).setdefault(key, []).append((pos, record))
+
+        domain_sets = {tuple(dict.fromkeys(d)) for d in self.crop_domains.values()}
+        self._rank(base, domain_sets)
+
+        # Crops sharing the same useful domains share one tree; a point keeps one
+        # (domain, [(pos, record)] best first) list per domain, merged by score at query time
+        self.trees = {}  # domains tuple -> (BallTree, [[per-domain lists] per point])
+        for by_point in points.values():
+            for group in by_point.values():
+                group.sort(key=lambda item: (-self.base_scores[item[0]], item[0]))
+        if points:
+            from sklearn.neighbors import BallTree
+            for domains in domain_sets:
+                merged = {}
+                for domain in domains:
+                    for point, group in points.get(domain, {}).items():
+                        merged.setdefault(point, []).append((domain, group))
+                if merged:
+                    coords = np.radians(np.array(list(merged), dtype=float))
+                    self.trees[domains] = (BallTree(coords, metric="haversine"), list(merged.values()))
+
+        print(f"✅ Recommendation index built ({len(self.crop_domains)} crops, "
+              f"{len(self.companies)} district/domain pairs, {len(self.ranked)} ranked lists "
+              f"({self.ranked_bytes / 2**20:.1f} MB), {len(self.trees)} geo indexes) "
+              f"in {time.perf_counter() - start:.2f}s")
+
+    def _relevance(self, domains):
+        """Returns: {domain: relevance weight * relevance} for a crop's useful domains."""
+        weight = self.weights.get("relevance", 0.0)
+        return {domain: weight * (1 - i / len(domains)) for i, domain in enumerate(domains)}
+
+    def _rank(self, base, domain_sets):
+        """Precomputes self.ranked: (district, domains) -> int32 row positions, best score first."""
+        by_district = {}  # district -> {domain: positions}
+        for (district, domain), items in self.companies.items():
+            by_district.setdefault(district, {})[domain] = np.fromiter((pos for pos, _ in items), dtype=np.int64,
+                                                                       count=len(items))
+        self.ranked = {}
+        self.ranked_bytes = 0
+        for domains in domain_sets:
+            relevance = self._relevance(domains)
+            for district, per_domain in by_district.items():
+                parts = [(per_domain[d], relevance[d]) for d in domains if d in per_domain]
+                if not parts:
+                    continue
+                positions = np.concatenate([p for p, _ in parts])
+                score = base[positions] + np.concatenate([np.full(len(p), r) for p, r in parts])
+                # lexsort: last key is primary -> best score first, ties in CSV order
+                ranked = positions[np.lexsort((positions, -score))].astype(np.int32)
+                self.ranked[(district, domains)] = ranked
+                self.ranked_bytes += ranked.nbytes
+
+    def domains_for(self, crop_name: str):
+        """Returns the useful domains for a crop, or None when the crop is unknown."""
+        return self.crop_domains.get(crop_name.strip().lower())
+
+    def recommend(self, crop_name: str, district: str, limit: int = 10):
+        """
+        Returns: list of company records (same order as the CSV, at most `limit`),
+        or None when the crop is unknown.
+        """
+        with span("recommendations.filter"):
+            domains = self.domains_for(crop_name)
+            if domains is None:
+                return None
+            district = district.strip().lower()
+            lists = [self.companies[key] for key in dict.fromkeys((district, d) for d in domains)
+                     if key in self.companies]
+            merged = heapq.merge(*lists, key=lambda item: item[0])
+            return [record for _, record in islice(merged, limit)]
+
+    def page(self, crop_name: str, district: str, offset: int = 0, limit: int = 10):
+        """
+        Returns: (records ranked by score, from `offset`, at most `limit`; total), or None when
+        the crop is unknown.
+        """
+        with span("recommendations.ranked"):
+            domains = self.domains_for(crop_name)
+            if domains is None:
+                return None
+            ranked = self.ranked.get((district.strip().lower(), tuple(dict.fromkeys(domains))))
+            if ranked is None:
+                return [], 0
+            return [self.records[pos] for pos in ranked[offset:offset + limit].tolist()], len(ranked)
+
+    def nearest(self, crop_name: str, latitude: float, longitude: float, limit: int = 10,
+                radius_km: float = GEO_RADIUS_KM, offset: int = 0):
+        """
+        Returns: up to `limit` company records within `radius_km` (skipping the first `offset`),
+        nearest first, equally distant ones by score, with `distance` in km; None when the
+        crop is unknown.
+        """
+        with span("recommendations.nearest"):
+            domains = self.domains_for(crop_name)
+            if domains is None:
+                return None
+            domains = tuple(dict.fromkeys(domains))
+            entry = self.trees.get(domains)
+            if entry is None:
+                return []
+            tree, points = entry
+            relevance = self._relevance(domains)
+            # Every point holds at least one company, so offset + limit points are always enough
+            k = min(offset + limit, len(points))
+            distances, indexes = tree.query(np.radians([[latitude, longitude]]), k=k)
+            results = []
+            skip = offset
+            for distance, i in zip((distances[0] * EARTH_RADIUS_KM).tolist(), indexes[0].tolist()):
+                if distance > radius_km or len(results) >= limit:
+                    break
+                streams = [((-(self.base_scores[pos] + relevance[domain]), pos, record) for pos, record in group)
+                           for domain, group in points[i]]
+                for _, _, record in heapq.merge(*streams, key=lambda item: item[:2]):
+                    if skip:
+                        skip -= 1
+                        continue
+                    results.append(dict(record, distance=round(distance, 1)))
+                    if len(results) >= limit:
+                        break
+            return results
+
+    def search(self, crop_name: str, district: str, latitude: float = None, longitude: float = None,
+               limit: int = 10, radius_km: float = GEO_RADIUS_KM, cursor: str = None):
+        """
+        Nearest companies around the given point (default: the district centroid) when the
+        companies are geocoded, else (or when nothing is in range) the district's companies
+        ranked by score. `cursor` continues a previous search where its page ended.
+        Returns: (records or None when the crop is unknown, origin (lat, lon) or None,
+        next cursor or None); raises ValueError for a cursor of another query or dataset.
+        """
+        crop_name, district = crop_name.strip().lower(), district.strip().lower()
+        mode, offset = None, 0
+        if cursor:
+            state = _decode_cursor(cursor)
+            if state.get("v") != self.version:
+                raise ValueError("cursor expired (the data changed); start again without a cursor")
+            if state.get("c") != crop_name or state.get("d") != district:
+                raise ValueError("cursor belongs to another crop/district")
+            mode, offset = state.get("m"), state["o"]
+            if mode == "nearest":
+                latitude, longitude, radius_km = state["lat"], state["lon"], state["r"]
+
+        state = {"v": self.version, "c": crop_name, "d": district}
+        if mode != "district":
+            origin = (latitude, longitude) if latitude is not None else centroids().district(district)
+            if origin is not None and self.trees:
+                # One extra record tells whether there is a next page
+                records = self.nearest(crop_name, origin[0], origin[1], limit + 1, radius_km, offset)
+                if records is None or records or mode == "nearest":
+                    if not records or len(records) <= limit:
+                        return records, origin, None
+                    state.update(m="nearest", o=offset + limit, lat=origin[0], lon=origin[1], r=radius_km)
+                    return records[:limit], origin, _encode_cursor(state)
+
+        page = self.page(crop_name, district, offset, limit)
+        if page is None:
+            return None, None, None
+        records, total = page
+        next_cursor = _encode_cursor(dict(state, m="district", o=offset + limit)) if offset + limit < total else None
+        return records, None, next_cursor
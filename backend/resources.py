@@ -0,0 +1,77 @@
+"""
+Heavy backend resources, registered with the shared registry (ai_agent/registry.py) and built
+on first use. app.py and asgi.py fetch them with registry.get(name) inside the request handlers;
+STARTUP_MODE decides whether they are built at start-up, lazily, or pre-warmed in the background.
+
+pandas, scikit-learn and the index modules are imported inside the factories, so importing
+this module (and the apps) stays cheap.
+"""
+import os
+
+from ai_agent.registry import registry
+
+SOIL_FOREST_DIR = os.getenv("SOIL_FOREST_DIR", "soil_forest")
+SOIL_MODEL_PICKLE = os.getenv("SOIL_MODEL_PICKLE", "soil_model.pkl")
+
+
+def _dataset(name: str):
+    def load():
+        import datasets
+        return datasets.load(name)
+    return load
+
+
+def _location_index():
+    from location_index import LocationIndex
+    return LocationIndex(registry.get("soil_df"))
+
+
+def _soil_model():
+    from soil import SoilModel
+    # Flat forest arrays are memory-mapped (fast load, pages shared across workers); the pickle is the fallback.
+    # Every possible model input is known up front, so all predictions are precomputed into a table,
+    # and the whole thing is reloaded when main.py atomically replaces the artifact.
+    return SoilModel(registry.get("soil_df"), SOIL_FOREST_DIR, SOIL_MODEL_PICKLE)
+
+
+def _recommendation_index():
+    import datasets
+    from recommendations import RecommendationIndex
+    byproducts_df, companies_df = registry.get("byproducts_df"), registry.get("companies_df")
+    # Cursors stay valid across workers and restarts as long as both CSVs are unchanged
+    version = "-".join(datasets.load_report[name]["version"] for name in ("byproducts", "companies"))
+    return RecommendationIndex(byproducts_df, companies_df, version=version)
+
+
+def _chat_cache():
+    from chat_cache import ChatCache
+    return ChatCache.from_env()
+
+
+# Registration order is the (pre-)warm order
+registry.register("soil_df", _dataset("soil"))
+registry.register("location_index", _location_index)
+registry.register("soil_model", _soil_model)
+registry.register("byproducts_df", _dataset("byproducts"))
+registry.register("companies_df", _dataset("companies"))
+registry.register("recommendation_index", _recommendation_index)
+registry.register("chat_cache", _chat_cache)
+
+
+def soil_version() -> str:
+    """
+    Returns: version of what /location-info answers from (soil CSV content hash + model artifact),
+    building the soil model if needed and picking up a replaced artifact first.
+    """
+    import datasets
+    soil_model = registry.get("soil_model")
+    soil_model.get()
+    kind, stamp = soil_model.version
+    return f"{datasets.load_report['soil']['version']}-{kind}-{stamp}"
+
+
+def dataset_report():
+    """Returns: datasets.load_report, without importing pandas when nothing was loaded yet."""
+    import sys
+    datasets = sys.modules.get("datasets")
+    return datasets.load_report if datasets is not None else {}
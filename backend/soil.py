@@ -0,0 +1,349 @@
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from ai_agent.metrics import span
+
+Y_COLUMNS = [
+    "Nitrogen - High","Nitrogen - Medium","Nitrogen - Low",
+    "Phosphorous - High","Phosphorous - Medium","Phosphorous - Low",
+    "Potassium - High","Potassium - Medium","Potassium - Low",
+    "pH - Acidic","pH - Neutral","pH - Alkaline"
+]
+
+
+def _attributes(values):
+    return {Y_COLUMNS[i]: round(float(values[i]), 2) for i in range(len(Y_COLUMNS))}
+
+
+def build_soil_table(model, encoders, df):
+    """
+    Precomputes the soil prediction for every address the encoders know about.
+    The model only sees the encoded (Address, Region) pair and each address maps to the region
+    of its first dataset row, so one batched predict covers every possible request.
+    Returns: {address: {"Region": str, "Attributes": {y_column: value}}}
+    """
+    start = time.perf_counter()
+    first_rows = df.drop_duplicates("Address")
+    known_addresses = set(encoders["Address"].classes_)
+    known_regions = set(encoders["Region"].classes_)
+    first_rows = first_rows[first_rows["Address"].isin(known_addresses) & first_rows["Region"].isin(known_regions)]
+
+    if first_rows.empty:
+        return {}
+
+    addresses = first_rows["Address"].tolist()
+    regions = first_rows["Region"].tolist()
+    X = np.column_stack([
+        encoders["Address"].transform(addresses),
+        encoders["Region"].transform(regions),
+    ])
+    predicted = model.predict(X)
+
+    table = {
+        address: {"Region": region, "Attributes": _attributes(values)}
+        for address, region, values in zip(addresses, regions, predicted)
+    }
+    print(f"✅ Soil table built for {len(table)} addresses in {time.perf_counter() - start:.2f}s")
+    return table
+
+
+def predict_live(model, encoders, address: str, region: str):
+    """Runs the model for a single address (used as fallback and for consistency checks)."""
+    address_enc = encoders["Address"].transform([address])[0]
+    region_enc = encoders["Region"].transform([region])[0]
+    with span("model.predict"):
+        values = model.predict([[address_enc, region_enc]])[0]
+    return _attributes(values)
+
+
+def check_soil_table(table, model, encoders, sample_size: int = 50, seed: int = 0, reference=None):
+    """
+    Compares a random sample of table entries against live predictions of `model`, which must be
+    the sklearn estimator (not the FlatForest the table was built with), or against the sklearn
+    predictions stored at export time in `reference` ({"addresses", "regions", "values"}).
+    Returns: entries checked
+    Raises: AssertionError listing the first mismatching address.
+    """
+    if not table:
+        return 0
+    if reference is not None:
+        checked = 0
+        for address, region, values in zip(reference["addresses"], reference["regions"], reference["values"]):
+            entry = table.get(address)
+            if entry is None or entry["Region"] != region:
+                continue  # the serving dataset maps this address differently
+            expected = _attributes(values)
+            if expected != entry["Attributes"]:
+                raise AssertionError(f"Soil table mismatch for '{address}': {entry['Attributes']} != {expected}")
+            checked += 1
+        return checked
+    rng = np.random.default_rng(seed)
+    addresses = list(table)
+    sample = rng.choice(len(addresses), size=min(sample_size, len(addresses)), replace=False)
+    for i in sample:
+        address = addresses[i]
+        live = predict_live(model, encoders, address, table[address]["Region"])
+        if live != table[address]["Attributes"]:
+            raise AssertionError(f"Soil table mismatch for '{address}': {table[address]['Attributes']} != {live}")
+    return len(sample)
+
+
+# ---------------------------
+# Flattened, memory-mappable forest
+# ---------------------------
+FOREST_ARRAYS = ["feature", "threshold", "left", "right", "value", "roots"]
+FOREST_POINTER = "CURRENT"  # names the live version directory inside the forest directory
+
+
+def export_forest(model, encoders, path: str, keep: int = 2, X=None, reference_size: int = 50):
+    """
+    Writes a fitted RandomForestRegressor as flat node arrays (one .npy per array) plus the
+    encoder classes, so workers can np.load(mmap_mode="r") it instead of unpickling the trees.
+    Child indexes are global (offset by each tree's root), leaves have left == right == -1.
+
+    Each export goes to a new version directory inside `path`; the FOREST_POINTER file is then
+    replaced atomically to point at it, so readers always find a complete forest and files still
+    memory-mapped by running workers (which Windows cannot delete or rename) are left alone.
+    The `keep` most recent versions are kept, older ones are removed when nothing holds them.
+    `X` (the encoded Address/Region training pairs) adds the sklearn predictions of a sample of
+    addresses (first row each) to meta.json, which check_soil_table uses to verify loaded forests.
+    Returns: the version directory name
+    """
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        roots.append(offset)
+        features.append(tree.feature.astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float64))
+        left = tree.children_left.astype(np.int32)
+        right = tree.children_right.astype(np.int32)
+        lefts.append(np.where(left >= 0, left + offset, -1).astype(np.int32))
+        rights.append(np.where(right >= 0, right + offset, -1).astype(np.int32))
+        values.append(tree.value[:, :, 0].astype(np.float64))
+        offset += tree.node_count
+
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "value": np.concatenate(values),
+        "roots": np.array(roots, dtype=np.int32),
+        "address_classes": np.asarray(encoders["Address"].classes_).astype(str),
+        "region_classes": np.asarray(encoders["Region"].classes_).astype(str),
+    }
+
+    version = f"v{time.time_ns()}-{os.getpid()}"
+    version_path = os.path.join(path, version)
+    os.makedirs(version_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(version_path, f"{name}.npy"), array)
+    meta = {"y_columns": Y_COLUMNS, "n_trees": len(roots), "n_nodes": offset}
+    if X is not None:
+        pairs = np.unique(np.asarray(X, dtype=np.int64), axis=0)
+        pairs = pairs[np.unique(pairs[:, 0], return_index=True)[1]]
+        rng = np.random.default_rng(0)
+        pairs = pairs[rng.choice(len(pairs), size=min(reference_size, len(pairs)), replace=False)]
+        meta["reference"] = {
+            "addresses": encoders["Address"].inverse_transform(pairs[:, 0]).tolist(),
+            "regions": encoders["Region"].inverse_transform(pairs[:, 1]).tolist(),
+            # Same input type as in training (a DataFrame keeps sklearn's feature names check quiet)
+            "values": model.predict(type(X)(pairs, columns=X.columns) if hasattr(X, "columns") else pairs).tolist(),
+        }
+    with open(os.path.join(version_path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    # Switch the pointer: os.replace is atomic on POSIX and Windows
+    pointer = os.path.join(path, FOREST_POINTER)
+    with open(f"{pointer}.tmp", "w") as f:
+        f.write(version)
+    os.replace(f"{pointer}.tmp", pointer)
+
+    versions = sorted((d for d in os.listdir(path) if d.startswith("v") and os.path.isdir(os.path.join(path, d))),
+                      key=lambda d: int(d[1:].split("-")[0]))
+    for old in versions[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(path, old), ignore_errors=True)
+    print(f"✅ Flat forest exported to {version_path} ({len(roots)} trees, {offset} nodes)")
+    return version
+
+
+def forest_version(path: str):
+    """
+    Returns: the live version directory name of a forest directory, "" for a forest written
+    directly into `path` (older export layout), or None when there is no forest.
+    """
+    try:
+        with open(os.path.join(path, FOREST_POINTER)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "" if os.path.exists(os.path.join(path, "meta.json")) else None
+
+
+class FlatEncoder:
+    """Read-only stand-in for a fitted LabelEncoder backed by its sorted classes_ array."""
+
+    def __init__(self, classes):
+        self.classes_ = classes
+
+    def transform(self, values):
+        values = np.asarray(values).astype(str)
+        codes = np.searchsorted(self.classes_, values)
+        codes = np.minimum(codes, len(self.classes_) - 1)
+        unseen = self.classes_[codes] != values
+        if unseen.any():
+            raise ValueError(f"y contains previously unseen labels: {values[unseen].tolist()}")
+        return codes
+
+    def inverse_transform(self, codes):
+        return self.classes_[np.asarray(codes)]
+
+
+class FlatForest:
+    """Vectorized predictor over the arrays written by export_forest. Same outputs as model.predict."""
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.roots = np.asarray(arrays["roots"])
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)  # sklearn compares float32 features against the thresholds
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        while True:
+            left = self.left[node]
+            active = left >= 0
+            if not active.any():
+                break
+            go_left = X[rows, self.feature[node].clip(min=0)] <= self.threshold[node]
+            node = np.where(active, np.where(go_left, left, self.right[node]), node)
+
+        # Sum tree by tree like sklearn does, so the floating point result is identical
+        total = np.zeros((len(X), self.value.shape[1]))
+        for t in range(len(self.roots)):
+            total += self.value[node[:, t]]
+        return total / len(self.roots)
+
+
+def load_flat_forest(path: str, mmap: bool = True, version: str = None):
+    """
+    Loads an exported forest (memory-mapped by default, so the pages are shared between workers),
+    the live version unless `version` names one.
+    Returns: (model, encoders) usable wherever the pickled model/encoders were used.
+    """
+    path = os.path.join(path, forest_version(path) if version is None else version)
+    mode = "r" if mmap else None
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in FOREST_ARRAYS}
+    encoders = {
+        "Address": FlatEncoder(np.load(os.path.join(path, "address_classes.npy"), mmap_mode=mode)),
+        "Region": FlatEncoder(np.load(os.path.join(path, "region_classes.npy"), mmap_mode=mode)),
+    }
+    return FlatForest(arrays), encoders
+
+
+# ---------------------------
+# Hot-reloadable model holder
+# ---------------------------
+class SoilModel:
+    """
+    Holds (model, encoders, soil table) and reloads them when main.py replaces the artifact.
+    Prefers the flat forest directory, falls back to the pickle. The artifact is checked at
+    most every `check_interval` seconds; a new one is loaded and its table built on a background
+    thread while requests keep getting the previous model, which is then swapped out in one step.
+    A failed reload keeps serving the previous model.
+    """
+
+    def __init__(self, df, forest_dir: str = "soil_forest", pickle_path: str = "soil_model.pkl",
+                 check_interval: float = 5.0):
+        self.df = df
+        self.forest_dir = forest_dir
+        self.pickle_path = pickle_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._reload_thread = None
+        self._failed_version = None  # not retried until the artifact changes again
+        self._current = self._load(self._artifact_version())  # (version, (model, encoders, table))
+
+    def _artifact_version(self):
+        """Returns: ("forest", version directory) — or the meta.json mtime for the older layout — else ("pickle", mtime)."""
+        version = forest_version(self.forest_dir)
+        if version:
+            return ("forest", version)
+        if version == "":
+            return ("forest", os.stat(os.path.join(self.forest_dir, "meta.json")).st_mtime_ns)
+        return ("pickle", os.stat(self.pickle_path).st_mtime_ns)
+
+    def _load(self, version):
+        """Returns: (version, (model, encoders, table)) built from the artifact `version` names."""
+        kind, stamp = version
+        if kind == "forest":
+            directory = stamp if isinstance(stamp, str) else ""
+            model, encoders = load_flat_forest(self.forest_dir, version=directory)
+            table = build_soil_table(model, encoders, self.df)
+            self._check_forest_table(table, os.path.join(self.forest_dir, directory))
+        else:
+            model, encoders = self._load_pickle()
+            table = build_soil_table(model, encoders, self.df)
+            check_soil_table(table, model, encoders)
+        print(f"✅ Soil model loaded from {kind}")
+        return version, (model, encoders, table)
+
+    def _load_pickle(self):
+        with open(self.pickle_path, "rb") as f:
+            saved = pickle.load(f)
+        return saved["model"], saved["encoders"]
+
+    def _check_forest_table(self, table, path: str):
+        """Verifies a FlatForest-built table against sklearn: the export's reference, else the pickle."""
+        with open(os.path.join(path, "meta.json")) as f:
+            reference = json.load(f).get("reference")
+        if reference is not None:
+            if table and not check_soil_table(table, None, None, reference=reference):
+                print("⚠️ Soil table not verified: no reference address matches the serving dataset")
+        elif os.path.exists(self.pickle_path):
+            model, encoders = self._load_pickle()
+            check_soil_table(table, model, encoders)
+        else:
+            print("⚠️ Soil table not verified: forest has no reference predictions and there is no pickle")
+
+    def _reload(self, version):
+        try:
+            # One reference swap, so requests never mix an old table with a new model or version
+            self._current = self._load(version)
+        except Exception as e:
+            self._failed_version = version
+            print(f"❌ Soil model reload failed, keeping previous model: {e}")
+
+    @property
+    def version(self):
+        return self._current[0]
+
+    def get(self):
+        """Returns: (model, encoders, soil_table) — the newest successfully loaded artifact."""
+        now = time.monotonic()
+        if now >= self._next_check and self._lock.acquire(blocking=False):
+            try:
+                self._next_check = now + self.check_interval
+                busy = self._reload_thread is not None and self._reload_thread.is_alive()
+                if not busy:
+                    version = self._artifact_version()
+                    if version != self._current[0] and version != self._failed_version:
+                        self._reload_thread = threading.Thread(target=self._reload, args=(version,),
+                                                               name="soil-model-reload", daemon=True)
+                        self._reload_thread.start()
+            except Exception as e:
+                print(f"❌ Soil model check failed, keeping previous model: {e}")
+            finally:
+                self._lock.release()
+        return self._current[1]
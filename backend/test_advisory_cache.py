@@ -0,0 +1,50 @@
+# Run from the backend folder: python -m pytest test_advisory_cache.py
+import asyncio
+import threading
+
+from advisory_cache import AdvisoryCache, cache_key
+
+
+def _input(crop: str):
+    return {"pesticide": "Mancozeb", "crop": crop, "disease": "Leaf Spot"}
+
+
+def _put(cache, crop: str):
+    key = cache_key("Mancozeb", crop, "Leaf Spot", "1")
+    cache.put(key, _input(crop), "1", {"crop": crop}, "<p></p>")
+    return key
+
+
+def test_eviction_sees_hits_not_yet_flushed(tmp_path):
+    cache = AdvisoryCache(str(tmp_path / "advisories.db"), max_entries=2)
+    rice = _put(cache, "rice")
+    wheat = _put(cache, "wheat")
+    assert cache.get(rice) is not None  # batched: no write yet
+    _put(cache, "cotton")
+    assert cache.contains(rice)
+    assert not cache.contains(wheat)
+
+
+def test_async_lookups_run_off_the_event_loop(tmp_path):
+    cache = AdvisoryCache(str(tmp_path / "advisories.db"))
+    threads = []
+    get = cache.get
+
+    def tracking_get(key):
+        threads.append(threading.current_thread())
+        return get(key)
+
+    cache.get = tracking_get
+
+    async def generate():
+        return {"ai_response": {"crop": "rice"}, "html": "<p></p>"}
+
+    async def main():
+        first = await cache.aget_or_generate(_input("rice"), "1", generate)
+        second = await cache.aget_or_generate(_input("rice"), "1", generate)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second == {"ai_response": {"crop": "rice"}, "html": "<p></p>"}
+    assert cache.stats["generations"] == 1 and cache.stats["hits"] == 1
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,66 @@
+# Run from the backend folder: python -m pytest test_alerts_api.py
+import collections
+import datetime
+
+import pytest
+
+from ai_agent import weather
+from ai_agent.precip_store import PrecipStore
+from ai_agent.registry import registry
+
+LOCATIONS = ["Pune", "Nashik", "Satara", "Kolhapur", "Solapur"]
+
+
+class FakeResponse:
+    def __init__(self, days):
+        self._days = days
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"days": self._days}
+
+
+@pytest.fixture
+def upstream(monkeypatch, tmp_path):
+    """Fake Visual Crossing timeline on a fresh cache and precipitation store. Yields: calls per location"""
+    calls = collections.Counter()
+
+    def get(url, params=None, timeout=None):
+        location, start, end = url.rsplit("/", 3)[1:]
+        calls[location] += 1
+        day = datetime.date.fromisoformat(start)
+        days = []
+        while day <= datetime.date.fromisoformat(end):
+            days.append({"datetime": day.isoformat(), "precip": 0.0})
+            day += datetime.timedelta(days=1)
+        return FakeResponse(days)
+
+    monkeypatch.setattr(weather.session, "get", get)
+    monkeypatch.setattr(weather, "_cache", weather.TTLCache(ttl=weather.CACHE_TTL))
+    registry.register("precip_store", lambda: PrecipStore(str(tmp_path / "precip.db")))
+    registry.reset("precip_store")
+    yield calls
+    registry.reset("precip_store")
+    registry.register("precip_store", lambda: PrecipStore())
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("STARTUP_MODE", "lazy")
+    app = pytest.importorskip("app")
+    return app.app.test_client()
+
+
+def test_alerts_make_one_upstream_call_per_location(client, upstream):
+    for location in LOCATIONS:
+        response = client.post("/api/alerts", json={"location": location})
+        assert response.status_code == 200
+        assert [n["type"] for n in response.get_json()] == ["pesticide", "irrigation"]
+    assert upstream == {location.lower(): 1 for location in LOCATIONS}
+
+    # Warm: answered from the weather cache
+    for location in LOCATIONS:
+        client.post("/api/alerts", json={"location": location})
+    assert sum(upstream.values()) == len(LOCATIONS)
@@ -0,0 +1,75 @@
+# Run from the backend folder: python -m pytest test_chat_cache.py
+import pytest
+
+from chat_cache import ChatCache, guard_tokens
+
+# Similar wording, different agronomic answer
+DIFFERENT_ANSWER = [
+    ("dose of urea for 1 acre sugarcane", "dose of urea for 5 acre sugarcane"),
+    ("how much water does wheat need in winter", "how much water does rice need in winter"),
+    ("how much urea should I apply to my cotton field", "how much DAP should I apply to my cotton field"),
+    ("fertilizer dose for sugarcane per acre", "fertilizer dose for sugarcane per hectare"),
+    ("५ एकर ऊस साठी युरिया किती", "२ एकर ऊस साठी युरिया किती"),
+    ("can I spray pesticide before rain", "can I not spray pesticide before rain"),
+    ("can I spray pesticide before rain", "can I spray pesticide after rain"),
+    ("how much water does wheat need", "how much water does wheat need in summer"),
+    ("बारिश से पहले छिड़काव करें", "बारिश के बाद छिड़काव करें"),
+]
+
+# Same question, phrased slightly differently: must hit at the default threshold
+PARAPHRASES = [
+    ("Which fertilizer is good for tomato plants?", "What fertilizer is good for tomato plants?"),
+    ("Can I spray pesticide before rain?", "Can I spray pesticides before the rain?"),
+    ("How much urea should I apply for 5 acres of sugarcane?", "How much urea should be applied for 5 acres of sugarcane?"),
+    ("What is the best fertilizer for wheat in rabi season?", "Which is the best fertilizer for wheat in the rabi season?"),
+    ("उसाला किती पाणी द्यावे", "उसाला किती पाणी द्यायचे"),
+]
+
+
+@pytest.mark.parametrize("cached, asked", DIFFERENT_ANSWER)
+def test_guard_tokens_differ(cached, asked):
+    assert guard_tokens(cached) != guard_tokens(asked)
+
+
+@pytest.mark.parametrize("cached, asked", DIFFERENT_ANSWER)
+def test_no_hit_across_quantities_crops_and_inputs(cached, asked):
+    # Even with a threshold low enough for the n-gram similarity alone to match
+    cache = ChatCache(threshold=0.5, capacity=8)
+    cache.add(cached, "answer")
+    assert cache.lookup(asked) is None
+    assert cache.stats["guard_rejects"] == 1
+
+
+@pytest.mark.parametrize("cached, asked", PARAPHRASES)
+def test_paraphrase_hits_at_default_threshold(cached, asked):
+    cache = ChatCache(capacity=8)
+    cache.add(cached, "answer")
+    answer, similarity, matched = cache.lookup(asked)
+    assert (answer, matched) == ("answer", cached)
+    assert similarity < 1.0
+
+
+@pytest.mark.parametrize("cached, asked", DIFFERENT_ANSWER)
+def test_no_hit_across_guards_at_default_threshold(cached, asked):
+    cache = ChatCache(capacity=8)
+    cache.add(cached, "answer")
+    assert cache.lookup(asked) is None
+
+
+def test_same_question_hits():
+    cache = ChatCache(capacity=8)
+    cache.add("Dose of urea for 5 acres sugarcane?", "answer")
+    assert cache.lookup("dose of urea for 5 acres  sugarcane")[0] == "answer"
+
+
+def test_near_duplicate_with_same_guard_hits():
+    cache = ChatCache(threshold=0.8, capacity=8)
+    cache.add("dose of urea for 5 acres sugarcane", "answer")
+    assert cache.lookup("dose of urea for 5 acre sugarcane")[0] == "answer"
+
+
+def test_best_guarded_candidate_wins():
+    cache = ChatCache(threshold=0.5, capacity=8)
+    cache.add("dose of urea for 1 acre sugarcane", "one acre")
+    cache.add("dose of urea for 5 acre sugarcane", "five acres")
+    assert cache.lookup("dose of urea for 5 acre of sugarcane")[0] == "five acres"
@@ -0,0 +1,110 @@
+# Run from the backend folder: python -m pytest test_recommendations.py
+import base64
+import json
+
+import pandas as pd
+import pytest
+
+from recommendations import RecommendationIndex, _decode_cursor, _encode_cursor
+
+DOMAINS = ["Food", "Paper", "Energy"]
+
+
+def _index(geocoded: bool):
+    byproducts = pd.DataFrame({"Crop": ["Sugarcane", "Rice"], "Useful Domains": ["Food, Paper", "Energy"]})
+    n = 47
+    companies = pd.DataFrame({
+        "CompanyName": [f"Company {i}" for i in range(n)],
+        "Registered_Office_Address": [f"Plot {i}, Pune 411001" for i in range(n)],
+        "CompanyStatus": ["Active" if i % 3 else "Dormant" for i in range(n)],
+        "CompanyIndustrialClassification": [DOMAINS[i % 3] for i in range(n)],
+        "District": ["Pune" if i % 5 else "Satara" for i in range(n)],
+    })
+    if geocoded:
+        companies["Latitude"] = [18.52 + (i % 7) * 0.05 for i in range(n)]
+        companies["Longitude"] = [73.85 + (i % 11) * 0.05 for i in range(n)]
+    return RecommendationIndex(byproducts, companies, version="test")
+
+
+def _all_pages(index, **search):
+    names, cursor, pages = [], None, 0
+    while True:
+        records, _, cursor = index.search("sugarcane", "pune", limit=4, cursor=cursor, **search)
+        names += [r["company_name"] for r in records]
+        pages += 1
+        if cursor is None:
+            return names, pages
+
+
+@pytest.mark.parametrize("geocoded", [False, True])
+def test_pages_through_to_the_end(geocoded):
+    index = _index(geocoded)
+    names, pages = _all_pages(index, radius_km=500)
+    expected = {f"Company {i}" for i in range(47) if i % 5 and DOMAINS[i % 3] in ("Food", "Paper")}
+    if geocoded:  # nearest mode is not limited to the district
+        expected = {f"Company {i}" for i in range(47) if DOMAINS[i % 3] in ("Food", "Paper")}
+    assert len(names) == len(set(names)) == len(expected)
+    assert set(names) == expected
+    assert pages == -(-len(expected) // 4)
+
+
+def test_nearest_pages_ascend_by_distance():
+    index = _index(geocoded=True)
+    distances, cursor = [], None
+    while True:
+        records, _, cursor = index.search("sugarcane", "pune", 18.5, 73.8, limit=5, radius_km=500, cursor=cursor)
+        distances += [r["distance"] for r in records]
+        if cursor is None:
+            break
+    assert distances == sorted(distances)
+
+
+def _tamper(cursor, **changes):
+    state = _decode_cursor(cursor)
+    state.update(changes)
+    for key in [k for k, v in changes.items() if v is None]:
+        del state[key]
+    return _encode_cursor(state)
+
+
+@pytest.mark.parametrize("changes", [
+    {"lat": None},
+    {"lon": None, "r": None},
+    {"lat": "north"},
+    {"r": -5},
+    {"lat": 123.0},
+    {"o": -1},
+    {"o": "3"},
+    {"o": True},
+    {"m": "sideways"},
+    {"m": None},
+    {"v": "other"},
+    {"c": "rice"},
+])
+def test_tampered_cursor_is_rejected(changes):
+    index = _index(geocoded=True)
+    _, _, cursor = index.search("sugarcane", "pune", limit=4, radius_km=500)
+    assert _decode_cursor(cursor)["m"] == "nearest"
+    with pytest.raises(ValueError):
+        index.search("sugarcane", "pune", limit=4, radius_km=500, cursor=_tamper(cursor, **changes))
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 !",
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(json.dumps({"o": 4}).encode()).decode(),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        _index(geocoded=False).search("sugarcane", "pune", cursor=cursor)
+
+
+@pytest.mark.parametrize("geocoded", [False, True])
+def test_district_results_have_real_or_null_distance(geocoded):
+    records = _index(geocoded).page("sugarcane", "pune", 0, 50)[0]
+    assert all(r["rating"] is None for r in records)
+    if geocoded:  # km from the Pune centroid, not a placeholder
+        assert all(isinstance(r["distance"], float) and r["distance"] != 80 for r in records)
+        assert len({r["distance"] for r in records}) > 1
+    else:
+        assert all(r["distance"] is None for r in records)
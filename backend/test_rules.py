@@ -0,0 +1,51 @@
+# Run from the backend folder: python -m pytest test_rules.py
+from ai_agent import rules
+
+
+def _days(precips, start=1):
+    return [{"datetime": f"2026-10-{start + i:02d}", "precip": p} for i, p in enumerate(precips)]
+
+
+def test_day_lists_follow_each_locations_hits():
+    weathers = {
+        "Pune": {"past": _days([5.0] * 3), "forecast": _days([0.0, 2.5, None, 8.0], start=17)},
+        "Nashik": {"past": _days([5.0] * 3), "forecast": _days([1.0], start=17)},
+        "Satara": {"past": _days([5.0] * 3), "forecast": _days([0.0, 0.0, 0.0, 0.0], start=17)},
+        "Solapur": {"past": _days([5.0] * 3), "forecast": _days([20.0, 0.0], start=18)},
+    }
+    results = rules.evaluate(weathers, alert_types=["pesticide"])
+    assert results["Pune"]["pesticide"] == (
+        True, "🌧 Rain expected on 2 day(s): Oct 18 (2.5 mm), Oct 20 (8.0 mm).\n❌ Do NOT spray pesticides.")
+    assert results["Nashik"]["pesticide"] == (
+        True, "🌧 Rain expected on 1 day(s): Oct 17 (1.0 mm).\n❌ Do NOT spray pesticides.")
+    assert results["Satara"]["pesticide"][0] is False
+    assert results["Solapur"]["pesticide"] == (
+        True, "🌧 Rain expected on 1 day(s): Oct 18 (20.0 mm).\n❌ Do NOT spray pesticides.")
+
+
+def test_day_lists_on_right_aligned_past_series():
+    weathers = {
+        "Pune": {"past": _days([3.0, 0.0, 4.0]), "forecast": []},
+        "Nashik": {"past": _days([0.0, 0.0, 0.0, 0.0, 6.0]), "forecast": []},
+    }
+    overrides = {"pesticide": {"series": "past", "window": 2}}
+    results = rules.evaluate(weathers, alert_types=["pesticide"], rule_overrides=overrides)
+    assert results["Pune"]["pesticide"][1].startswith("🌧 Rain expected on 1 day(s): Oct 03 (4.0 mm).")
+    assert results["Nashik"]["pesticide"][1].startswith("🌧 Rain expected on 1 day(s): Oct 05 (6.0 mm).")
+
+
+def test_region_and_crop_overrides_match_case_insensitively(monkeypatch, tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text('{"region": {"Pune ": {"pesticide": {"threshold": 5.0}}},'
+                    ' "crop": {"Rice": {"pesticide": {"threshold": 1.0}}}}', encoding="utf-8")
+    monkeypatch.setattr(rules, "OVERRIDES", rules.load_overrides(str(path)))
+    monkeypatch.setattr(rules, "_resolved", {})
+    assert rules.rules_for(region="pune")["pesticide"]["threshold"] == 5.0
+    assert rules.rules_for(region="  PUNE")["pesticide"]["threshold"] == 5.0
+    assert rules.rules_for(crop="rice")["pesticide"]["threshold"] == 1.0
+
+    weathers = {"PUNE": {"past": [], "forecast": _days([2.5], start=17)},
+                "Nashik": {"past": [], "forecast": _days([2.5], start=17)}}
+    results = rules.evaluate(weathers, alert_types=["pesticide"])
+    assert results["PUNE"]["pesticide"][0] is False
+    assert results["Nashik"]["pesticide"][0] is True
@@ -0,0 +1,24 @@
+# Run from the backend folder: python -m pytest test_scheduler.py
+import logging
+import threading
+
+from ai_agent import scheduler
+
+
+def test_run_forever_survives_a_crashing_sweep(monkeypatch, caplog):
+    stop_event = threading.Event()
+    calls = []
+
+    def sweep(conn, send=True, scheduled_at=None):
+        calls.append(scheduled_at)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        stop_event.set()
+
+    monkeypatch.setattr(scheduler, "connect", lambda: None)
+    monkeypatch.setattr(scheduler, "sweep", sweep)
+    with caplog.at_level(logging.ERROR, logger=scheduler.__name__):
+        scheduler.run_forever(interval=0.01, send=False, stop_event=stop_event)
+
+    assert len(calls) == 2
+    assert "Sweep crashed" in caplog.text and "database is locked" in caplog.text
@@ -0,0 +1,54 @@
+# Run from the backend folder: python -m pytest test_warm_advisories.py
+import json
+
+import pytest
+
+import warm_advisories
+from advisory_cache import AdvisoryCache, cache_key
+from ai_agent.registry import registry
+
+COMBOS = [
+    {"pesticide": "Mancozeb", "crop": "Rice", "disease": "Leaf Spot"},
+    {"pesticide": "Imidacloprid", "crop": "Cotton", "disease": "Aphids"},
+]
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    """A scratch advisory cache; generate_advisory stores a canned advisory in it."""
+    cache = AdvisoryCache(str(tmp_path / "advisories.db"))
+    generated = []
+
+    def generate_advisory(combo):
+        generated.append(combo["crop"])
+        key = cache_key(combo["pesticide"], combo["crop"], combo["disease"], warm_advisories.PROMPT_VERSION)
+        cache.put(key, combo, warm_advisories.PROMPT_VERSION, {"crop": combo["crop"]}, "<p></p>")
+
+    monkeypatch.setattr(warm_advisories, "generate_advisory", generate_advisory)
+    monkeypatch.setitem(registry._factories, "advisory_cache", lambda: cache)
+    registry.reset("advisory_cache")
+    cache.generated = generated
+    yield cache
+    registry.reset("advisory_cache")
+
+
+def test_resume_skips_cached_combinations(cache, tmp_path):
+    checkpoint = str(tmp_path / "progress.jsonl")
+    assert warm_advisories.warm(COMBOS, checkpoint) == {"ok": 2, "failed": 0}
+    assert warm_advisories.warm(COMBOS, checkpoint) == {"ok": 0, "failed": 0}
+    assert sorted(cache.generated) == ["Cotton", "Rice"]
+
+
+def test_resume_after_cache_flush_regenerates(cache, tmp_path):
+    checkpoint = str(tmp_path / "progress.jsonl")
+    warm_advisories.warm(COMBOS, checkpoint)
+    with open(checkpoint, encoding="utf-8") as f:
+        assert [json.loads(line)["status"] for line in f] == ["ok", "ok"]
+
+    with cache._lock:
+        cache._conn.execute("DELETE FROM advisories")
+        cache._conn.commit()
+
+    assert warm_advisories.warm(COMBOS, checkpoint) == {"ok": 2, "failed": 0}
+    assert sorted(cache.generated) == ["Cotton", "Cotton", "Rice", "Rice"]
+    assert cache.info()["entries"] == 2
@@ -0,0 +1,149 @@
+"""
+Pre-generates pesticide advisories into the advisory cache.
+
+Run from the backend folder:
+    python warm_advisories.py --combos popular_combos.csv            # columns: pesticide,crop,disease
+    python warm_advisories.py --from-dataset --top-crops 20 \
+        --pesticides "Mancozeb,Imidacloprid" --diseases "Leaf Spot,Aphids"
+
+Progress is appended to a checkpoint file, so an interrupted run can simply be restarted.
+What is skipped is decided by the advisory cache alone: combinations the checkpoint marks "ok"
+are generated again once they left the cache (flush, TTL expiry or LRU eviction).
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from Report import PROMPT_VERSION, generate_advisory
+from advisory_cache import cache_key
+from ai_agent.llm import LLMUnavailable
+from ai_agent.registry import registry
+
+
+def read_combos(path: str):
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield {"pesticide": row["pesticide"].strip(), "crop": row["crop"].strip(),
+                   "disease": row["disease"].strip()}
+
+
+def dataset_combos(top_crops: int, pesticides, diseases):
+    import datasets
+    crops = datasets.load("soil")["Crop"].astype(str)
+    popular = [c for c in crops.value_counts().index if c.lower() not in ("nan", "unknown")][:top_crops]
+    for crop, pesticide, disease in itertools.product(popular, pesticides, diseases):
+        yield {"pesticide": pesticide, "crop": crop, "disease": disease}
+
+
+def split_list(value: str):
+    if value and os.path.exists(value):
+        with open(value, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+def load_checkpoint(path: str):
+    """Returns: the keys a previous run recorded as generated ("ok")."""
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # partially written last line of an interrupted run
+                if record.get("status") == "ok":
+                    done.add(record["key"])
+    return done
+
+
+def warm_one(combo, max_attempts: int):
+    """Generates one advisory, waiting out rate limits and outages (fine in a batch job, unlike a request)."""
+    for attempt in range(max_attempts):
+        try:
+            generate_advisory(combo)
+            return
+        except LLMUnavailable as e:
+            if attempt == max_attempts - 1:
+                raise
+            time.sleep(e.retry_after)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--combos", help="CSV with pesticide,crop,disease columns")
+    parser.add_argument("--from-dataset", action="store_true", help="Use the most common crops of the soil dataset")
+    parser.add_argument("--top-crops", type=int, default=20)
+    parser.add_argument("--pesticides", help="Comma separated list or file (one per line), with --from-dataset")
+    parser.add_argument("--diseases", help="Comma separated list or file (one per line), with --from-dataset")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent generations (quota is enforced by the LLM gateway)")
+    parser.add_argument("--checkpoint", default="warm_advisories.progress.jsonl")
+    parser.add_argument("--max-attempts", type=int, default=5)
+    args = parser.parse_args()
+
+    combos = []
+    if args.combos:
+        combos.extend(read_combos(args.combos))
+    if args.from_dataset:
+        pesticides, diseases = split_list(args.pesticides), split_list(args.diseases)
+        if not pesticides or not diseases:
+            parser.error("--from-dataset needs --pesticides and --diseases")
+        combos.extend(dataset_combos(args.top_crops, pesticides, diseases))
+    if not combos:
+        parser.error("nothing to warm: pass --combos and/or --from-dataset")
+
+    warm(combos, args.checkpoint, args.workers, args.max_attempts)
+
+
+def warm(combos, checkpoint_path: str, workers: int = 4, max_attempts: int = 5):
+    """
+    Generates every combination that is not in the advisory cache, appending each outcome to the
+    checkpoint file. Returns: {"ok": n, "failed": n}
+    """
+    advisory_cache = registry.get("advisory_cache")
+    done = load_checkpoint(checkpoint_path)
+    todo = {}
+    for combo in combos:
+        key = cache_key(combo["pesticide"], combo["crop"], combo["disease"], PROMPT_VERSION)
+        if key not in todo and not advisory_cache.contains(key):
+            todo[key] = combo
+    evicted = sum(1 for key in todo if key in done)
+    print(f"📋 {len(combos)} combinations, {len(combos) - len(todo)} already cached, {len(todo)} to generate"
+          + (f" ({evicted} warmed before but no longer cached)" if evicted else ""))
+
+    lock = threading.Lock()
+    counts = {"ok": 0, "failed": 0}
+    started = time.perf_counter()
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(warm_one, combo, max_attempts): key for key, combo in todo.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            combo = todo[key]
+            try:
+                future.result()
+                status, error = "ok", None
+            except Exception as e:
+                status, error = "failed", str(e)
+                print(f"❌ {combo['pesticide']} / {combo['crop']} / {combo['disease']}: {e}")
+            with lock:
+                counts[status] += 1
+                checkpoint.write(json.dumps({"key": key, "status": status, "error": error, **combo},
+                                            ensure_ascii=False) + "\n")
+                checkpoint.flush()
+                finished = counts["ok"] + counts["failed"]
+                if finished % 10 == 0 or finished == len(todo):
+                    rate = finished / (time.perf_counter() - started)
+                    print(f"⏳ {finished}/{len(todo)} done ({counts['failed']} failed, {rate:.2f}/s)")
+
+    print(f"✅ Warm-up finished: {counts['ok']} generated, {counts['failed']} failed. Cache: {advisory_cache.info()}")
+    return counts
+
+
+if __name__ == "__main__":
+    main()
@@ -22,8 +22,8 @@ interface CompanyOption {
   address: string;
   status: string;
   domain: string;
-  distance?: number;
-  rating?: number;
+  distance?: number | null;
+  rating?: number | null;
 }
 
 interface CompanyOptionInput {
@@ -31,8 +31,8 @@ interface CompanyOptionInput {
   address: string;
   status: string;
   domain: string;
-  distance?: number;
-  rating?: number;
+  distance?: number | null;
+  rating?: number | null;
 }
 
 interface ByproductProcess {
@@ -306,8 +306,8 @@ const ByproductUtilization = () => {
                 Status: <Badge variant={option.status === "Active" ? "default" : "secondary"}>{option.status}</Badge>
               </p>
               <p>Domain: {option.domain}</p>
-              {option.distance !== undefined && <p>Distance: {option.distance} km</p>}
-              {option.rating !== undefined && <p>Rating: {option.rating} ⭐</p>}
+              {option.distance != null && <p>Distance: {option.distance} km</p>}
+              {option.rating != null && <p>Rating: {option.rating} ⭐</p>}
               <Button size="sm" variant="outline" onClick={() => alert(`Contacting ${option.name}`)}>
                 <Phone className="h-4 w-4 mr-1" />
                 Contact